@@ -0,0 +1,93 @@
+"""The FastAPI application, served by main.py"""
+import asyncio
+from fastapi import Depends, FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+from routers import habits, completions, analytics, auth, chat
+from routers.async_routes import asyncify
+import langgraph_setup
+from database import engine, async_engine
+from config import (DB_MODE, CHECKPOINT_COMPACT_INTERVAL_SECONDS, PROFILE_SLOW_REQUESTS_MS,
+                    PROFILE_INTERVAL_MS, PROFILE_DIR, SNAPSHOT_INTERVAL_SECONDS)
+from services.password_hashing import hashing_pool
+from services import checkpoint_store, metrics, snapshot
+from services.profiler import SlowRequestProfiler
+import migrations
+
+# Create or upgrade the schema
+migrations.migrate(engine)
+
+app = FastAPI(title="Habit Tracker API", version="1.0.0")
+
+# CORS configuration
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+# Request metrics, served at /metrics
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+profiler = None
+if PROFILE_SLOW_REQUESTS_MS > 0:
+    profiler = SlowRequestProfiler(PROFILE_SLOW_REQUESTS_MS, PROFILE_INTERVAL_MS, PROFILE_DIR)
+# Added last so it wraps every other middleware
+app.add_middleware(metrics.MetricsMiddleware, profiler=profiler)
+
+def data_router(module):
+    """The module's router, or its AsyncSession variant when DB_MODE=async"""
+    if DB_MODE == "async":
+        return asyncify(module.router)
+    return module.router
+
+# Include routers
+app.include_router(data_router(habits), prefix="/api", tags=["habits"])
+app.include_router(data_router(completions), prefix="/api", tags=["completions"])
+app.include_router(data_router(analytics), prefix="/api", tags=["analytics"])
+app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
+app.include_router(chat.router, prefix="/api", tags=["chat"])
+
+@app.on_event("startup")
+async def start_checkpoint_compaction():
+    if CHECKPOINT_COMPACT_INTERVAL_SECONDS > 0:
+        app.state.checkpoint_compaction = asyncio.create_task(
+            checkpoint_store.compact_periodically(CHECKPOINT_COMPACT_INTERVAL_SECONDS)
+        )
+
+@app.on_event("shutdown")
+async def stop_checkpoint_compaction():
+    task = getattr(app.state, "checkpoint_compaction", None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("startup")
+async def start_snapshot_export():
+    if SNAPSHOT_INTERVAL_SECONDS > 0:
+        snapshot.resolve_format()  # Fail at startup rather than in the background task
+        app.state.snapshot_export = asyncio.create_task(snapshot.export_periodically(SNAPSHOT_INTERVAL_SECONDS))
+
+@app.on_event("shutdown")
+async def stop_snapshot_export():
+    task = getattr(app.state, "snapshot_export", None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("shutdown")
+def shutdown_hashing_pool():
+    hashing_pool.shutdown()
+
+@app.on_event("shutdown")
+async def close_agent_checkpoints():
+    await langgraph_setup.close_async_app()
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(auth.get_metrics_reader)])
+async def read_metrics():
+    # Async so the threadpool gauges are read on the event loop
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/")
+def read_root():
+    return {"message": "Habit Tracker API", "version": "1.0.0"}
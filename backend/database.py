@@ -1,20 +1,121 @@
-from sqlalchemy import create_engine
+import sqlite3
+from contextvars import ContextVar
+import aiosqlite
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.util import await_only
+from starlette.concurrency import run_in_threadpool
+from config import (DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                    SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./habits.db"
+# asyncio driver used for each backend when ASYNC_DATABASE_URL isn't set
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# WAL lets readers proceed while a writer commits, busy_timeout makes writers wait
+# for each other instead of failing with "database is locked", and NORMAL sync is
+# durable under WAL except for the last transactions on power loss.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": -SQLITE_CACHE_SIZE_KB,  # Negative values are KiB rather than pages
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open a standalone tuned connection, for stores that keep their own file (e.g. checkpoints)"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    apply_sqlite_pragmas(conn)
+    return conn
+
+async def connect_sqlite_async(path: str) -> aiosqlite.Connection:
+    """aiosqlite counterpart of connect_sqlite"""
+    conn = await aiosqlite.connect(path)
+    for name, value in SQLITE_PRAGMAS.items():
+        await conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+def async_url(url: URL) -> URL:
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No asyncio driver known for {url.drivername}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver)
+
+def engine_options(url: URL) -> dict:
+    pool = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+    if url.get_backend_name() != "sqlite":
+        return {**pool, "pool_pre_ping": True}
+    if url.get_driver_name() == "aiosqlite":
+        return {}  # Not pooled, each session opens its own connection
+    return {**pool, "connect_args": {"check_same_thread": False}}
+
+database_url = make_url(DATABASE_URL)
+is_sqlite = database_url.get_backend_name() == "sqlite"
+
+engine = create_engine(database_url, **engine_options(database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Used when config.DB_MODE is "async". Objects must stay readable after commit
+# because responses are serialized outside of the session's greenlet.
+async_database_url = make_url(ASYNC_DATABASE_URL) if ASYNC_DATABASE_URL else async_url(database_url)
+async_engine = create_async_engine(async_database_url, **engine_options(async_database_url))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if is_sqlite:
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection)
+
 Base = declarative_base()
 
+def dialect_insert(db: Session):
+    """The session backend's insert(), which supports ON CONFLICT clauses"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def insert_ignoring_conflicts(db: Session, model):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's backend"""
+    return dialect_insert(db)(model).on_conflict_do_nothing()
+
+# True while a sync endpoint runs on the event loop through AsyncSession.run_sync
+# (DB_MODE=async, see routers/async_routes.py)
+on_event_loop: ContextVar[bool] = ContextVar("on_event_loop", default=False)
+
+def off_loop(function, *args):
+    """Call function(*args), on a worker thread when running on the event loop, so
+    CPU-bound or blocking work between queries doesn't stall it. The function must
+    not use the session.
+    """
+    if not on_event_loop.get():
+        return function(*args)
+
+    def call():
+        on_event_loop.set(False)
+        return function(*args)
+    return await_only(run_in_threadpool(call))
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,26 +1,31 @@
-import os
-from typing import Annotated, List, Literal, TypedDict
-from langchain_core.messages import HumanMessage, SystemMessage
+import asyncio
+from typing import Annotated, Literal, Optional, TypedDict
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage
 from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
+from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.graph import END, StateGraph
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
-from tools.habit_tools import tools
-import sqlite3
-
-# Initialize LLM
-llm = ChatGroq(
-    model="llama3-8b-8192",
-    temperature=0,
-    api_key=os.getenv("GROQ_API_KEY")
-)
-llm = llm.bind_tools(tools)
+from tools.habit_tools import tools, get_user_id
+from tools.tool_node import HabitToolNode
+from services.habit_context import habit_context
+from services.llm_providers import get_llm
+from services.metrics import agent_metrics
+from database import connect_sqlite, connect_sqlite_async
+from config import CHECKPOINT_DB, AGENT_MAX_MESSAGES
+
+# Chat model override, e.g. a stub in benchmarks; otherwise LLM_PROVIDER's model is
+# built on first use (see services/llm_providers.py)
+llm = None
+
+def get_model():
+    return llm if llm is not None else get_llm(tools)
 
 class AppState(TypedDict):
     messages: Annotated[list, add_messages]
-    habits: List[dict]
+    habits: str  # Rendered habit list, see services/habit_context.py
 
 SYSTEM_TEMPLATE = PromptTemplate.from_template(
     """You are a helpful habit tracking assistant. You can help users manage their habits by:
@@ -36,28 +41,23 @@ Always be helpful and provide clear feedback about the actions you take.
 """
 )
 
-def get_habits_from_db():
-    """Get all habits from the database"""
-    conn = sqlite3.connect("habits.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, repeat_frequency, tags FROM habits")
-    habits = []
-    for row in cursor.fetchall():
-        habits.append({
-            "id": row[0],
-            "name": row[1],
-            "repeat_frequency": row[2],
-            "tags": row[3].split(",") if row[3] else []
-        })
-    conn.close()
-    return habits
-
-def update_habits(state: AppState):
-    """Update the habits in the state from the database"""
-    return {"habits": get_habits_from_db()}
-
-def call_model(state: AppState):
-    """Call the LLM with the current state"""
+def trim_history(state: AppState):
+    """Remove the oldest turns once the thread holds more than AGENT_MAX_MESSAGES messages,
+    so neither the checkpoints nor the prompt grow with the length of the conversation
+    """
+    messages = [message for message in state["messages"] if message.type != "system"]
+    excess = len(messages) - AGENT_MAX_MESSAGES
+    if excess <= 0:
+        return {"messages": []}
+    # Cut before a user message so no tool result loses the call it answers
+    cut = next((i for i in range(excess, len(messages)) if messages[i].type == "human"), len(messages) - 1)
+    return {"messages": [RemoveMessage(id=message.id) for message in messages[:cut]]}
+
+def update_habits(state: AppState, config: RunnableConfig):
+    """Update the habits in the state, reading the database only when they have changed"""
+    return {"habits": habit_context.get(get_user_id(config))}
+
+def _prompt(state: AppState) -> list:
     messages = state["messages"]
     system_message = SystemMessage(SYSTEM_TEMPLATE.format(habits=state["habits"]))
     
@@ -66,8 +66,16 @@ def call_model(state: AppState):
         messages.insert(0, system_message)
     else:
         messages[0] = system_message
-    
-    response = llm.invoke(messages)
+    return messages
+
+def call_model(state: AppState):
+    """Call the LLM with the current state"""
+    response = get_model().invoke(_prompt(state))
+    return {"messages": [response]}
+
+async def acall_model(state: AppState, config: RunnableConfig):
+    """Call the LLM with the current state; under astream_events its tokens are streamed"""
+    response = await get_model().ainvoke(_prompt(state), config)
     return {"messages": [response]}
 
 def should_continue(state: AppState) -> Literal["tools", END]:
@@ -78,35 +86,94 @@ def should_continue(state: AppState) -> Literal["tools", END]:
         return "tools"
     return END
 
-# Create the graph
-graph = StateGraph(AppState)
+def build_graph(agent, tool_node: Optional[ToolNode] = None) -> StateGraph:
+    """The agent graph, with `agent` as the node that calls the LLM"""
+    graph = StateGraph(AppState)
 
-# Add nodes
-graph.add_node("update_habits", update_habits)
-graph.add_node("agent", call_model)
-graph.add_node("tools", ToolNode(tools))
+    # Add nodes
+    graph.add_node("trim_history", trim_history)
+    graph.add_node("update_habits", update_habits)
+    graph.add_node("agent", agent)
+    graph.add_node("tools", tool_node or HabitToolNode(tools))
 
-# Add edges
-graph.add_edge("update_habits", "agent")
-graph.add_conditional_edges("agent", should_continue)
-graph.add_edge("tools", "update_habits")
+    # Add edges
+    graph.add_edge("trim_history", "update_habits")
+    graph.add_edge("update_habits", "agent")
+    graph.add_conditional_edges("agent", should_continue)
+    graph.add_edge("tools", "update_habits")
 
-# Set entry point
-graph.set_entry_point("update_habits")
+    # Set entry point
+    graph.set_entry_point("trim_history")
+    return graph
 
 # Create checkpointer for persistence
-checkpointer = SqliteSaver.from_conn_string("checkpoints.db")
+checkpointer = SqliteSaver(connect_sqlite(CHECKPOINT_DB))
 
 # Compile the graph
-app = graph.compile(checkpointer=checkpointer)
-
-def process_message(message: str, thread_id: str = "default"):
-    """Process a message through the LangGraph agent"""
-    config = {"configurable": {"thread_id": thread_id}}
+app = build_graph(call_model).compile(checkpointer=checkpointer)
+
+# The asyncio variant shares the checkpoint file; its aiosqlite connection has to be
+# opened on the running event loop, so it is built on first use
+_async_app = None
+_async_app_lock = asyncio.Lock()
+_async_checkpoint_conn = None
+
+async def get_async_app():
+    global _async_app, _async_checkpoint_conn
+    async with _async_app_lock:
+        if _async_app is None:
+            _async_checkpoint_conn = await connect_sqlite_async(CHECKPOINT_DB)
+            _async_app = build_graph(acall_model).compile(checkpointer=AsyncSqliteSaver(_async_checkpoint_conn))
+    return _async_app
+
+async def close_async_app():
+    global _async_app, _async_checkpoint_conn
+    async with _async_app_lock:
+        if _async_checkpoint_conn is not None:
+            await _async_checkpoint_conn.close()
+        _async_app = _async_checkpoint_conn = None
+
+def thread_config(user_id: int, thread_id: str) -> dict:
+    # Threads are namespaced per user so conversations never cross accounts
+    return {
+        "configurable": {"thread_id": f"{user_id}:{thread_id}", "user_id": user_id},
+        "callbacks": [agent_metrics],
+    }
+
+def process_message(message: str, user_id: int, thread_id: str = "default"):
+    """Process a message through the LangGraph agent on behalf of a user"""
+    config = thread_config(user_id, thread_id)
     
     state = app.invoke(
         {"messages": [HumanMessage(content=message)]},
         config=config
     )
     
-    return state["messages"][-1].content
\ No newline at end of file
+    return state["messages"][-1].content
+
+async def stream_message(message: str, user_id: int, thread_id: str = "default"):
+    """Run a message through the agent on the event loop, yielding (event, data) pairs:
+    "token" for each piece of the reply, "tool_start"/"tool_end" around tool calls,
+    and finally "done" with the full reply.
+    """
+    agent = await get_async_app()
+    config = thread_config(user_id, thread_id)
+    async for event in agent.astream_events(
+        {"messages": [HumanMessage(content=message)]}, config=config, version="v2"
+    ):
+        kind = event["event"]
+        if kind == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "agent":
+            content = event["data"]["chunk"].content
+            if content:
+                yield "token", {"content": content}
+        elif kind in ("on_chain_start", "on_chain_end") and event["name"] == "tools":
+            # Reported per tools step rather than per tool run: batched writes
+            # don't run the tool objects (see tools/tool_node.py)
+            if kind == "on_chain_start":
+                for call in event["data"]["input"]["messages"][-1].tool_calls:
+                    yield "tool_start", {"name": call["name"], "input": call["args"]}
+            else:
+                for tool_message in event["data"]["output"]["messages"]:
+                    yield "tool_end", {"name": tool_message.name, "output": tool_message.content}
+    state = await agent.aget_state(config)
+    yield "done", {"content": state.values["messages"][-1].content}
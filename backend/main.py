@@ -1,34 +1,13 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routers import habits, completions, analytics, auth
-from database import engine
-from models import habit, user
+"""Entry point: `uvicorn main:app` from the backend directory, or `python main.py`.
 
-# Create tables
-habit.Base.metadata.create_all(bind=engine)
-user.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Habit Tracker API", version="1.0.0")
-
-# CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(habits.router, prefix="/api", tags=["habits"])
-app.include_router(completions.router, prefix="/api", tags=["completions"])
-app.include_router(analytics.router, prefix="/api", tags=["analytics"])
-app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
-
-@app.get("/")
-def read_root():
-    return {"message": "Habit Tracker API", "version": "1.0.0"}
+The password hashing pool's spawned workers re-import the script the process was
+started from as __mp_main__. When that is this file they must not build the app,
+which would load every router, the agent and the database engines just to run
+bcrypt, so the app lives in api.py and is only imported here.
+"""
+if __name__ != "__mp_main__":
+    from api import app
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,319 @@
+"""Versioned schema migrations, the only place that creates or alters tables.
+
+Applied versions are recorded in the schema_migrations table, which works the same
+on every backend. Each step checks the live schema first, so steps are safe to run
+against databases that were built by older versions of the app. Steps that rewrite
+legacy SQLite files are no-ops elsewhere.
+
+    python migrations.py            # Apply pending migrations
+    python migrations.py status     # Show the current and latest versions
+
+Run it from the backend directory; DATABASE_URL selects the database.
+"""
+import sys
+from sqlalchemy import (Boolean, Column, Index, Integer, MetaData, PrimaryKeyConstraint,
+                        String, Table, UniqueConstraint, inspect, select)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from services import habit_stats
+from services.schedule import WEEKDAYS
+from services.tags import parse_tags
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+)
+
+# julianday('0001-01-01') is 1721425.5 and date(1, 1, 1).toordinal() is 1
+JULIAN_DAY_OFFSET = 1721424.5
+
+def _columns(conn: Connection, table: str) -> set:
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return set()
+    return {column["name"] for column in inspector.get_columns(table)}
+
+def _replace_table(conn: Connection, table: str, create_sql: str, copy_sql: str):
+    """Rebuild a table with a new definition, as SQLite's ALTER TABLE can't change column types"""
+    conn.exec_driver_sql(create_sql.format(table=f"{table}_new"))
+    conn.exec_driver_sql(copy_sql.format(table=f"{table}_new"))
+    conn.exec_driver_sql(f"DROP TABLE {table}")
+    conn.exec_driver_sql(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+def _day_number(column: str) -> str:
+    return f"CAST(julianday({column}) - {JULIAN_DAY_OFFSET} AS INTEGER)"
+
+def compact_encoding(conn: Connection):
+    """Store schedules as a weekday bitmask and completion dates as day numbers"""
+    if "repeat_frequency" in _columns(conn, "habits"):
+        mask = " + ".join(
+            f"((instr(upper(repeat_frequency), '{day}') > 0) << {i})" for i, day in enumerate(WEEKDAYS)
+        )
+        _replace_table(conn, "habits", """
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name VARCHAR NOT NULL,
+                schedule_mask INTEGER NOT NULL DEFAULT 0,
+                tags VARCHAR,
+                user_id INTEGER DEFAULT 1
+            )
+        """, f"""
+            INSERT INTO {{table}} (id, name, schedule_mask, tags, user_id)
+            SELECT id, name, {mask}, tags, user_id FROM habits
+        """)
+        conn.exec_driver_sql("CREATE INDEX ix_habits_id ON habits (id)")
+        conn.exec_driver_sql("CREATE INDEX ix_habits_name ON habits (name)")
+        conn.exec_driver_sql("CREATE INDEX ix_habits_user_id ON habits (user_id)")
+
+    if "completion_date" in _columns(conn, "completions"):
+        _replace_table(conn, "completions", """
+            CREATE TABLE {table} (
+                habit_id INTEGER NOT NULL,
+                day_number INTEGER NOT NULL,
+                PRIMARY KEY (habit_id, day_number)
+            ) WITHOUT ROWID
+        """, f"""
+            INSERT OR IGNORE INTO {{table}} (habit_id, day_number)
+            SELECT habit_id, {_day_number("completion_date")} FROM completions
+            WHERE habit_id IS NOT NULL AND julianday(completion_date) IS NOT NULL
+        """)
+
+    if "last_completion_date" in _columns(conn, "habit_stats"):
+        _replace_table(conn, "habit_stats", """
+            CREATE TABLE {table} (
+                habit_id INTEGER NOT NULL PRIMARY KEY,
+                current_streak INTEGER NOT NULL,
+                longest_streak INTEGER NOT NULL,
+                last_completion_day INTEGER,
+                total_completions INTEGER NOT NULL
+            )
+        """, f"""
+            INSERT INTO {{table}}
+            SELECT habit_id, current_streak, longest_streak, {_day_number("last_completion_date")}, total_completions
+            FROM habit_stats
+        """)
+        _replace_table(conn, "habit_monthly_counts", """
+            CREATE TABLE {table} (
+                habit_id INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (habit_id, month)
+            )
+        """, """
+            INSERT INTO {table}
+            SELECT habit_id, CAST(substr(month, 1, 4) || substr(month, 6, 2) AS INTEGER), count
+            FROM habit_monthly_counts
+        """)
+
+def schedule_index(conn: Connection):
+    """Index habits by user and weekday schedule for the daily view queries"""
+    if _columns(conn, "habits"):
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_habits_user_schedule ON habits (user_id, schedule_mask)")
+
+def initial_schema(conn: Connection):
+    """Create every table that doesn't exist yet, as of schema version 3.
+
+    The definitions are frozen here rather than taken from the models, so later
+    model changes must come with their own migration.
+    """
+    metadata = MetaData()
+    Table(
+        "habits", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, index=True, nullable=False),
+        Column("schedule_mask", Integer, nullable=False, default=0),
+        Column("tags", String),
+        Column("user_id", Integer, index=True, default=1),
+        Index("ix_habits_user_schedule", "user_id", "schedule_mask"),
+    )
+    Table(
+        "completions", metadata,
+        Column("habit_id", Integer, nullable=False),
+        Column("day_number", Integer, nullable=False),
+        PrimaryKeyConstraint("habit_id", "day_number"),
+        sqlite_with_rowid=False,
+    )
+    Table(
+        "habit_stats", metadata,
+        Column("habit_id", Integer, primary_key=True, autoincrement=False),
+        Column("current_streak", Integer, nullable=False),
+        Column("longest_streak", Integer, nullable=False),
+        Column("last_completion_day", Integer),
+        Column("total_completions", Integer, nullable=False),
+    )
+    Table(
+        "habit_monthly_counts", metadata,
+        Column("habit_id", Integer, nullable=False),
+        Column("month", Integer, nullable=False),
+        Column("count", Integer, nullable=False),
+        PrimaryKeyConstraint("habit_id", "month"),
+    )
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email", String, unique=True, index=True, nullable=False),
+        Column("hashed_password", String, nullable=False),
+        Column("is_active", Boolean),
+        Column("full_name", String),
+    )
+    metadata.create_all(conn)
+
+def user_scoping(conn: Connection):
+    """Copy each habit's owner onto its completions and index both tables by user"""
+    if "user_id" not in _columns(conn, "completions"):
+        conn.exec_driver_sql("ALTER TABLE completions ADD COLUMN user_id INTEGER")
+        conn.exec_driver_sql(
+            "UPDATE completions SET user_id = (SELECT habits.user_id FROM habits WHERE habits.id = completions.habit_id)"
+        )
+    # Covered by the (user_id, id) index
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_habits_user_id")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_habits_user_id_id ON habits (user_id, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_completions_user_day ON completions (user_id, day_number)")
+
+def user_counters(conn: Connection):
+    """Add per-user habit/completion totals and per-day completion counts, filled from the raw tables"""
+    metadata = MetaData()
+    user_stats = Table(
+        "user_stats", metadata,
+        Column("user_id", Integer, primary_key=True, autoincrement=False),
+        Column("total_habits", Integer, nullable=False),
+        Column("total_completions", Integer, nullable=False),
+    )
+    user_daily_counts = Table(
+        "user_daily_counts", metadata,
+        Column("user_id", Integer, nullable=False),
+        Column("day_number", Integer, nullable=False),
+        Column("count", Integer, nullable=False),
+        PrimaryKeyConstraint("user_id", "day_number"),
+    )
+    inspector = inspect(conn)
+    if not inspector.has_table("user_stats"):
+        user_stats.create(conn)
+        conn.exec_driver_sql("""
+            INSERT INTO user_stats (user_id, total_habits, total_completions)
+            SELECT user_id, SUM(habits), SUM(completions) FROM (
+                SELECT user_id, COUNT(*) AS habits, 0 AS completions FROM habits GROUP BY user_id
+                UNION ALL
+                SELECT user_id, 0, COUNT(*) FROM completions GROUP BY user_id
+            ) counts
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        """)
+    if not inspector.has_table("user_daily_counts"):
+        user_daily_counts.create(conn)
+        conn.exec_driver_sql("""
+            INSERT INTO user_daily_counts (user_id, day_number, count)
+            SELECT user_id, day_number, COUNT(*) FROM completions
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id, day_number
+        """)
+
+def habit_tags(conn: Connection):
+    """Add per-user tags and the habit-tag join table, filled from the habits' tag strings"""
+    metadata = MetaData()
+    tags = Table(
+        "tags", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, nullable=False),
+        Column("name", String, nullable=False),
+        UniqueConstraint("user_id", "name", name="uq_tags_user_name"),
+    )
+    habit_tags = Table(
+        "habit_tags", metadata,
+        Column("habit_id", Integer, nullable=False),
+        Column("tag_id", Integer, nullable=False),
+        PrimaryKeyConstraint("habit_id", "tag_id"),
+        Index("ix_habit_tags_tag_habit", "tag_id", "habit_id"),
+        sqlite_with_rowid=False,
+    )
+    inspector = inspect(conn)
+    if inspector.has_table("habit_tags"):
+        return
+    if not inspector.has_table("tags"):
+        tags.create(conn)
+    habit_tags.create(conn)
+
+    habits = [
+        (habit_id, user_id, parse_tags(value))
+        for habit_id, user_id, value in conn.exec_driver_sql(
+            "SELECT id, user_id, tags FROM habits WHERE tags IS NOT NULL AND tags != '' AND user_id IS NOT NULL"
+        )
+    ]
+    names = sorted({(user_id, name) for _, user_id, habit_names in habits for name in habit_names})
+    if names:
+        conn.execute(tags.insert(), [{"user_id": user_id, "name": name} for user_id, name in names])
+        tag_ids = {(user_id, name): tag_id for tag_id, user_id, name in conn.execute(
+            select(tags.c.id, tags.c.user_id, tags.c.name)
+        )}
+        conn.execute(habit_tags.insert(), [
+            {"habit_id": habit_id, "tag_id": tag_ids[user_id, name]}
+            for habit_id, user_id, habit_names in habits for name in habit_names
+        ])
+
+def stats_backfill(conn: Connection):
+    """Fill the stats tables of databases whose completions predate them.
+
+    initial_schema creates habit_stats and habit_monthly_counts empty, so completions
+    written before the app maintained them have no stats. Rebuilding also recomputes
+    the per-user counters; a database where every completed habit has stats is left as is.
+    Unlike the other steps this one writes through the current models, so a later
+    migration changing those tables must adapt it.
+    """
+    missing = conn.exec_driver_sql(
+        "SELECT 1 FROM completions WHERE habit_id NOT IN (SELECT habit_id FROM habit_stats) LIMIT 1"
+    ).first()
+    if missing:
+        # The session joins the migration's transaction, so its commit only releases a savepoint
+        with Session(bind=conn, join_transaction_mode="create_savepoint") as db:
+            habit_stats.rebuild(db)
+
+# (version, step) pairs, applied in order
+MIGRATIONS = [
+    (1, compact_encoding),
+    (2, schedule_index),
+    (3, initial_schema),
+    (4, user_scoping),
+    (5, user_counters),
+    (6, habit_tags),
+    (7, stats_backfill),
+]
+
+def current_version(conn: Connection) -> int:
+    schema_migrations.create(conn, checkfirst=True)
+    version = conn.execute(select(schema_migrations.c.version).order_by(
+        schema_migrations.c.version.desc()
+    )).scalar()
+    if version is None and conn.dialect.name == "sqlite":
+        # Databases from before this table tracked their version in the SQLite header
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar() or None
+        if version:
+            conn.execute(schema_migrations.insert(), [{"version": number} for number in range(1, version + 1)])
+    return version or 0
+
+def migrate(engine: Engine) -> int:
+    """Apply pending migrations, each in its own transaction. Returns the new version."""
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for number, step in MIGRATIONS:
+        if number > version:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(schema_migrations.insert().values(version=number))
+            version = number
+    return version
+
+def main(argv) -> int:
+    from database import engine
+    if argv[:1] == ["status"]:
+        with engine.begin() as conn:
+            version = current_version(conn)
+        print(f"{engine.url.render_as_string(hide_password=True)}: version {version} of {MIGRATIONS[-1][0]}")
+    elif argv[:1] in ([], ["upgrade"]):
+        print(f"Migrated to version {migrate(engine)}")
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,18 +1,101 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean, Text
+from datetime import date
+from sqlalchemy import Column, Integer, String, Date, Boolean, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
+from services.schedule import weekday_mask, schedule_string
 
 class Habit(Base):
     __tablename__ = "habits"
+    __table_args__ = (
+        # Every habit query is scoped to one user
+        Index("ix_habits_user_id_id", "user_id", "id"),
+        # Serves "habits of a user scheduled on weekday X" without touching the table
+        Index("ix_habits_user_schedule", "user_id", "schedule_mask"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
-    repeat_frequency = Column(String, nullable=False)  # "MONDAY,TUESDAY,..."
-    tags = Column(String, nullable=True)  # "tag1,tag2,..."
-    user_id = Column(Integer, index=True, default=1)  # For user association
+    schedule_mask = Column(Integer, nullable=False, default=0)  # Bit 0 = MONDAY ... bit 6 = SUNDAY
+    tags = Column(String, nullable=True)  # "tag1,tag2,...", as sent by clients; normalized in habit_tags
+    user_id = Column(Integer)  # Owning user
+
+    @property
+    def repeat_frequency(self) -> str:
+        """Schedule as a "MONDAY,TUESDAY,..." string, kept for API compatibility"""
+        return schedule_string(self.schedule_mask or 0)
+
+    @repeat_frequency.setter
+    def repeat_frequency(self, value: str):
+        self.schedule_mask = weekday_mask(value)
+
+class Tag(Base):
+    __tablename__ = "tags"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_tags_user_name"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)  # Normalized, see services/tags.py
+
+class HabitTag(Base):
+    __tablename__ = "habit_tags"
+    __table_args__ = (
+        # Habits carrying a tag, for filters and per-tag aggregates
+        Index("ix_habit_tags_tag_habit", "tag_id", "habit_id"),
+        {"sqlite_with_rowid": False},
+    )
+    
+    habit_id = Column(Integer, primary_key=True)
+    tag_id = Column(Integer, primary_key=True)
 
 class Completion(Base):
     __tablename__ = "completions"
+    __table_args__ = (
+        # Per-user listings and counts by day; habit_id rides along as part of the key
+        Index("ix_completions_user_day", "user_id", "day_number"),
+        {"sqlite_with_rowid": False},
+    )
     
     habit_id = Column(Integer, primary_key=True)
-    completion_date = Column(String, primary_key=True)  # ISO format date string
\ No newline at end of file
+    day_number = Column(Integer, primary_key=True)  # date.toordinal() of the completion date
+    user_id = Column(Integer)  # Copy of habits.user_id so per-user queries skip the join
+
+    @property
+    def completion_date(self) -> str:
+        """Completion date as an ISO format string, kept for API compatibility"""
+        return date.fromordinal(self.day_number).isoformat()
+
+    @completion_date.setter
+    def completion_date(self, value: str):
+        self.day_number = date.fromisoformat(value).toordinal()
+
+class HabitStats(Base):
+    __tablename__ = "habit_stats"
+    
+    habit_id = Column(Integer, primary_key=True)
+    current_streak = Column(Integer, nullable=False, default=0)  # Run ending at last_completion_day
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_completion_day = Column(Integer, nullable=True)  # date.toordinal()
+    total_completions = Column(Integer, nullable=False, default=0)
+
+class HabitMonthlyCount(Base):
+    __tablename__ = "habit_monthly_counts"
+    
+    habit_id = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)  # year * 100 + month, e.g. 202403
+    count = Column(Integer, nullable=False, default=0)
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    total_habits = Column(Integer, nullable=False, default=0)
+    total_completions = Column(Integer, nullable=False, default=0)
+
+class UserDailyCount(Base):
+    __tablename__ = "user_daily_counts"
+    
+    user_id = Column(Integer, primary_key=True)
+    day_number = Column(Integer, primary_key=True)  # date.toordinal()
+    count = Column(Integer, nullable=False, default=0)
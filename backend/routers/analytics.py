@@ -1,49 +1,61 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from models.habit import Habit, Completion
+from sqlalchemy import func, select
+from models.habit import Habit, Completion, HabitTag, Tag
 from database import get_db
+from routers.auth import get_current_user
+from services.token_cache import Principal
 from datetime import date, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
+from services import bitmaps, habit_stats, tags as habit_tags
+from services.analytics_cache import analytics_cache
+from services.schedule import weekday_histogram, expected_days
 
 router = APIRouter()
 
+# Longest range served by the calendar, five years
+MAX_CALENDAR_DAYS = 5 * 366
+
+# Results are cached per user and query string until the user's data changes,
+# see services/analytics_cache.py
+
 @router.get("/analytics/completion-rate")
-def get_completion_rate(habit_id: int = None, days: int = 30, db: Session = Depends(get_db)):
-    """Get completion rate for habits over the last N days"""
+def get_completion_rate(request: Request, habit_id: int = None, days: int = 30, tag: Optional[List[str]] = Query(None),
+                        current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get completion rate for the user's habits (those with every `tag`, if given) over the last N days"""
+    return analytics_cache.response(request, current_user.id, lambda: _completion_rate(db, current_user.id, habit_id, days, tag))
+
+def _completion_rate(db: Session, user_id: int, habit_id: int, days: int, tags: Optional[List[str]] = None) -> List[dict]:
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
     
-    query = db.query(Habit)
+    query = db.query(Habit.id, Habit.name, Habit.schedule_mask).filter(Habit.user_id == user_id)
     if habit_id:
         query = query.filter(Habit.id == habit_id)
+    query = habit_tags.filter_by_tags(query, user_id, tags)
     
     habits = query.all()
+    actual_counts = habit_stats.completion_counts(db, [habit.id for habit in habits], start_date, end_date)
+    
+    # Expected completions only depend on the schedule, so count each weekday in the
+    # window once and reuse the result for every habit sharing a schedule
+    histogram = weekday_histogram(start_date.toordinal(), end_date.toordinal())
+    expected_by_schedule = {}
     analytics = []
     
     for habit in habits:
-        # Count expected completions based on repeat frequency
-        expected_days = []
-        current_date = start_date
-        while current_date <= end_date:
-            weekday = current_date.strftime("%A").upper()
-            if weekday in habit.repeat_frequency:
-                expected_days.append(current_date.isoformat())
-            current_date += timedelta(days=1)
-        
-        # Count actual completions
-        completions = db.query(Completion).filter(
-            Completion.habit_id == habit.id,
-            Completion.completion_date >= start_date.isoformat(),
-            Completion.completion_date <= end_date.isoformat()
-        ).count()
+        expected = expected_by_schedule.get(habit.schedule_mask)
+        if expected is None:
+            expected = expected_days(histogram, habit.schedule_mask)
+            expected_by_schedule[habit.schedule_mask] = expected
         
-        completion_rate = (completions / len(expected_days)) * 100 if expected_days else 0
+        completions = actual_counts[habit.id]
+        completion_rate = (completions / expected) * 100 if expected else 0
         
         analytics.append({
             "habit_id": habit.id,
             "habit_name": habit.name,
-            "expected_completions": len(expected_days),
+            "expected_completions": expected,
             "actual_completions": completions,
             "completion_rate": round(completion_rate, 2)
         })
@@ -51,68 +63,72 @@ def get_completion_rate(habit_id: int = None, days: int = 30, db: Session = Depe
     return analytics
 
 @router.get("/analytics/streaks")
-def get_streaks(habit_id: int = None, db: Session = Depends(get_db)):
-    """Get current streak for habits"""
-    query = db.query(Habit)
-    if habit_id:
-        query = query.filter(Habit.id == habit_id)
+def get_streaks(request: Request, habit_id: int = None, tag: Optional[List[str]] = Query(None),
+                current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get current and longest streak for the user's habits (those with every `tag`, if given)"""
+    return analytics_cache.response(request, current_user.id, lambda: habit_stats.load_streaks(db, current_user.id, habit_id, tags=tag))
+
+@router.get("/analytics/tags")
+def get_tag_completion_rate(request: Request, days: int = 30,
+                            current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get the completion rate of each of the user's tags over the last N days"""
+    return analytics_cache.response(request, current_user.id, lambda: _tag_completion_rate(db, current_user.id, days))
+
+def _tag_completion_rate(db: Session, user_id: int, days: int) -> List[dict]:
+    """Expected and actual completions summed over each tag's habits, aggregated in SQL"""
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+    first, last = start_date.toordinal(), end_date.toordinal()
     
-    habits = query.all()
-    streaks = []
+    # A habit's expected completions are the window's count of each weekday it is scheduled on
+    histogram = weekday_histogram(first, last)
+    expected = sum(Habit.schedule_mask.op(">>")(weekday).op("&")(1) * count for weekday, count in enumerate(histogram))
+    expected_by_tag = select(
+        HabitTag.tag_id, func.count().label("habits"), func.sum(expected).label("expected")
+    ).join(Habit, Habit.id == HabitTag.habit_id).where(Habit.user_id == user_id).group_by(HabitTag.tag_id).subquery()
+    actual_by_tag = select(HabitTag.tag_id, func.count().label("actual")).join(
+        Completion, Completion.habit_id == HabitTag.habit_id
+    ).where(
+        Completion.user_id == user_id, Completion.day_number.between(first, last)
+    ).group_by(HabitTag.tag_id).subquery()
     
-    for habit in habits:
-        # Get all completions for this habit, ordered by date descending
-        completions = db.query(Completion).filter(
-            Completion.habit_id == habit.id
-        ).order_by(Completion.completion_date.desc()).all()
-        
-        if not completions:
-            streaks.append({
-                "habit_id": habit.id,
-                "habit_name": habit.name,
-                "current_streak": 0,
-                "longest_streak": 0
-            })
-            continue
-        
-        # Calculate current streak
-        current_streak = 0
-        current_date = date.today()
-        
-        for completion in completions:
-            completion_date = date.fromisoformat(completion.completion_date)
-            if completion_date == current_date:
-                current_streak += 1
-                current_date -= timedelta(days=1)
-            else:
-                break
-        
-        # Calculate longest streak (simplified version)
-        longest_streak = current_streak  # This could be more sophisticated
-        
-        streaks.append({
-            "habit_id": habit.id,
-            "habit_name": habit.name,
-            "current_streak": current_streak,
-            "longest_streak": longest_streak
-        })
+    rows = db.query(
+        Tag.name, expected_by_tag.c.habits, expected_by_tag.c.expected, func.coalesce(actual_by_tag.c.actual, 0)
+    ).join(expected_by_tag, expected_by_tag.c.tag_id == Tag.id).outerjoin(
+        actual_by_tag, actual_by_tag.c.tag_id == Tag.id
+    ).filter(Tag.user_id == user_id).order_by(Tag.name)
     
-    return streaks
+    return [{
+        "tag": name,
+        "habits": habits,
+        "expected_completions": expected or 0,
+        "actual_completions": actual,
+        "completion_rate": round(actual / expected * 100, 2) if expected else 0
+    } for name, habits, expected, actual in rows]
 
 @router.get("/analytics/summary")
-def get_analytics_summary(db: Session = Depends(get_db)):
-    """Get overall analytics summary"""
-    total_habits = db.query(Habit).count()
-    total_completions = db.query(Completion).count()
-    
-    # Habits completed today
-    today = date.today().isoformat()
-    completed_today = db.query(Completion).filter(
-        Completion.completion_date == today
-    ).count()
-    
-    return {
-        "total_habits": total_habits,
-        "total_completions": total_completions,
-        "completed_today": completed_today
-    }
\ No newline at end of file
+def get_analytics_summary(request: Request, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get the user's analytics summary"""
+    return analytics_cache.response(request, current_user.id, lambda: habit_stats.load_summary(db, current_user.id))
+
+@router.get("/analytics/calendar")
+def get_calendar(request: Request, start: Optional[str] = None, end: Optional[str] = None, habit_id: int = None,
+                 tag: Optional[List[str]] = Query(None), per_habit: bool = True,
+                 current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get day-level completion state from `start` to `end` (default: the current year) as base64 bitsets:
+    per habit with its rate and streaks (unless per_habit=false), and for the user the days on which
+    all scheduled habits and any habit were done. Bit i of a bitset is the day `start` + i.
+    """
+    today = date.today()
+    try:
+        first = date.fromisoformat(start).toordinal() if start else date(today.year, 1, 1).toordinal()
+        last = date.fromisoformat(end).toordinal() if end else date(today.year, 12, 31).toordinal()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if last < first:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if last - first + 1 > MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_CALENDAR_DAYS} days")
+    return analytics_cache.response(request, current_user.id, lambda: bitmaps.load_calendar(
+        db, current_user.id, first, last, habit_id, tag, per_habit
+    ))
@@ -0,0 +1,60 @@
+"""Async variants of the sync routers, selected with DB_MODE=async.
+
+Each sync endpoint that takes a `db: Session` is re-registered as an async endpoint
+taking an AsyncSession, and its body runs through AsyncSession.run_sync. The query
+code is shared with the sync routers, but database I/O is awaited on the event loop
+instead of holding a threadpool worker for the whole request.
+
+run_sync executes the endpoint's own Python code on the event loop thread, so work
+between queries that is CPU-bound (building calendars, date grids, JSON bodies) or
+blocking (the Redis analytics cache) goes through database.off_loop, which hands
+it to the threadpool in this mode. FastAPI still validates the responses of async
+endpoints on the loop.
+"""
+import inspect
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, on_event_loop
+
+def _async_endpoint(endpoint):
+    signature = inspect.signature(endpoint)
+    parameters = [
+        parameter.replace(default=Depends(get_async_db), annotation=AsyncSession) if name == "db" else parameter
+        for name, parameter in signature.parameters.items()
+    ]
+
+    async def run(**kwargs):
+        db = kwargs.pop("db")
+        on_event_loop.set(True)  # Scoped to this request's task
+        return await db.run_sync(lambda session: endpoint(db=session, **kwargs))
+
+    run.__signature__ = signature.replace(parameters=parameters)
+    run.__name__ = endpoint.__name__
+    run.__doc__ = endpoint.__doc__
+    return run
+
+def asyncify(router: APIRouter) -> APIRouter:
+    """Copy a router, converting its sync database endpoints to AsyncSession ones.
+    Endpoints that are already async or don't use the database are kept as they are.
+    """
+    async_router = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            async_router.routes.append(route)
+            continue
+        endpoint = route.endpoint
+        if not inspect.iscoroutinefunction(endpoint) and "db" in inspect.signature(endpoint).parameters:
+            endpoint = _async_endpoint(endpoint)
+        async_router.add_api_route(
+            route.path,
+            endpoint,
+            methods=list(route.methods),
+            response_model=route.response_model,
+            status_code=route.status_code,
+            dependencies=route.dependencies,
+            summary=route.summary,
+            description=route.description,
+            name=route.name,
+        )
+    return async_router
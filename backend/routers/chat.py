@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from routers.auth import get_current_user
+from services.token_cache import Principal
+from services import checkpoint_store
+import langgraph_setup
+from pydantic import BaseModel
+import json
+
+router = APIRouter()
+
+class ChatRequest(BaseModel):
+    message: str
+    thread_id: str = "default"
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _chat_events(request: ChatRequest, user_id: int):
+    try:
+        async for event, data in langgraph_setup.stream_message(request.message, user_id, request.thread_id):
+            yield _sse(event, data)
+    except Exception as exc:
+        # The 200 and earlier events are already sent, so report failures in-stream
+        yield _sse("error", {"detail": str(exc)})
+
+@router.post("/chat")
+async def chat(request: ChatRequest, current_user: Principal = Depends(get_current_user)):
+    """Stream the agent's reply as server-sent events: token, tool_start and tool_end
+    while it runs, then done (or error) with the full reply.
+    """
+    return StreamingResponse(
+        _chat_events(request, current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/chat/checkpoint-metrics")
+async def read_checkpoint_metrics(current_user: Principal = Depends(get_current_user)):
+    """Get the size of the conversation checkpoint store and the last compaction's results"""
+    return await run_in_threadpool(checkpoint_store.read_metrics)
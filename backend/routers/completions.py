@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 from models.habit import Habit, Completion
-from database import get_db
+from database import get_db, SessionLocal
+from routers.auth import get_current_user
+from routers.habits import get_user_habit
+from services.token_cache import Principal
+from services import habit_stats
+from services.analytics_cache import analytics_cache
+from services.pagination import decode_cursor, page_limit, set_next_cursor
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import date
+import json
+import time
 
 router = APIRouter()
 
+# Rows written per transaction by the bulk ingest endpoint
+BULK_CHUNK_SIZE = 5000
+# Per-row errors beyond this are counted but not echoed back
+MAX_REPORTED_ERRORS = 1000
+# Rows fetched per round trip while streaming an export
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 class CompletionCreate(BaseModel):
     habit_id: int
     completion_date: str  # ISO format date string
@@ -19,52 +38,231 @@ class CompletionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+    failed: int
+    errors: List[BulkRowError]
+    rows_per_second: float
+
 @router.post("/completions/", response_model=CompletionResponse)
-def complete_habit(completion: CompletionCreate, db: Session = Depends(get_db)):
+def complete_habit(completion: CompletionCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     # Check if habit exists
-    habit = db.query(Habit).filter(Habit.id == completion.habit_id).first()
-    if not habit:
-        raise HTTPException(status_code=404, detail="Habit not found")
+    habit = get_user_habit(db, completion.habit_id, current_user.id)
     
     # Validate date format
     try:
-        date.fromisoformat(completion.completion_date)
+        day_number = date.fromisoformat(completion.completion_date).toordinal()
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     
     # Create or update completion
-    db_completion = db.query(Completion).filter(
-        Completion.habit_id == completion.habit_id,
-        Completion.completion_date == completion.completion_date
-    ).first()
+    db_completion = db.get(Completion, (completion.habit_id, day_number))
     
     if not db_completion:
-        db_completion = Completion(**completion.dict())
+        db_completion = Completion(habit_id=completion.habit_id, day_number=day_number, user_id=current_user.id)
         db.add(db_completion)
+        habit_stats.record_completion(db, current_user.id, habit.id, habit.schedule_mask, day_number)
         db.commit()
+        analytics_cache.invalidate_user(current_user.id)
         db.refresh(db_completion)
     
     return db_completion
 
 @router.get("/completions/", response_model=List[CompletionResponse])
-def read_completions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(Completion).offset(skip).limit(limit).all()
+def read_completions(response: Response, cursor: Optional[str] = None, skip: int = 0, limit: int = 100,
+                     current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """List the user's completions in (date, habit_id) order, which ix_completions_user_day serves.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one; `skip` is kept for
+    older clients but gets slower on deep pages.
+    """
+    limit = page_limit(limit)
+    query = db.query(Completion).filter(Completion.user_id == current_user.id).order_by(
+        Completion.day_number, Completion.habit_id
+    )
+    after = decode_cursor(cursor, 2)
+    if after:
+        query = query.filter(tuple_(Completion.day_number, Completion.habit_id) > after)
+    elif skip:
+        query = query.offset(skip)
+    completions = query.limit(limit).all()
+    set_next_cursor(response, completions, limit, lambda c: (c.day_number, c.habit_id))
+    return completions
+
+@router.get("/completions/export")
+def export_completions(format: str = "ndjson", habit_id: Optional[int] = None, current_user: Principal = Depends(get_current_user)):
+    """Stream the user's completions as NDJSON or CSV without materializing them, whatever the row count"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        _export_rows(format, current_user.id, habit_id),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=completions.{format}"}
+    )
 
-@router.get("/completions/habit/{habit_id}")
-def get_habit_completions(habit_id: int, db: Session = Depends(get_db)):
-    completions = db.query(Completion).filter(Completion.habit_id == habit_id).all()
+@router.get("/completions/habit/{habit_id}", response_model=List[CompletionResponse])
+def get_habit_completions(habit_id: int, response: Response, cursor: Optional[str] = None, limit: int = 100,
+                          current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """One page of a habit's completions in date order; use /completions/export for the full history"""
+    get_user_habit(db, habit_id, current_user.id)
+    limit = page_limit(limit)
+    query = db.query(Completion).filter(Completion.habit_id == habit_id).order_by(Completion.day_number)
+    after = decode_cursor(cursor, 1)
+    if after:
+        query = query.filter(Completion.day_number > after[0])
+    completions = query.limit(limit).all()
+    set_next_cursor(response, completions, limit, lambda c: (c.day_number,))
     return completions
 
+def _export_rows(format: str, user_id: int, habit_id: Optional[int]):
+    """Generate export lines from a streamed cursor, fetching EXPORT_BATCH_SIZE rows at a time"""
+    if format == "csv":
+        yield "habit_id,completion_date\n"
+    with SessionLocal() as db:
+        query = select(Completion.habit_id, Completion.day_number).where(
+            Completion.user_id == user_id
+        ).order_by(
+            Completion.day_number, Completion.habit_id
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        if habit_id is not None:
+            query = query.where(Completion.habit_id == habit_id)
+        for rows in db.execute(query).partitions():
+            if format == "csv":
+                yield "".join(f"{row.habit_id},{date.fromordinal(row.day_number).isoformat()}\n" for row in rows)
+            else:
+                yield "".join(
+                    json.dumps({"habit_id": row.habit_id, "completion_date": date.fromordinal(row.day_number).isoformat()}) + "\n"
+                    for row in rows
+                )
+
 @router.delete("/completions/")
-def uncomplete_habit(habit_id: int, completion_date: str, db: Session = Depends(get_db)):
-    completion = db.query(Completion).filter(
-        Completion.habit_id == habit_id,
-        Completion.completion_date == completion_date
-    ).first()
+def uncomplete_habit(habit_id: int, completion_date: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    habit = get_user_habit(db, habit_id, current_user.id)
+    try:
+        day_number = date.fromisoformat(completion_date).toordinal()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     
+    completion = db.get(Completion, (habit_id, day_number))
     if not completion:
         raise HTTPException(status_code=404, detail="Completion not found")
     
     db.delete(completion)
+    habit_stats.record_uncompletion(db, current_user.id, habit_id, habit.schedule_mask, day_number)
     db.commit()
-    return {"message": "Completion removed successfully"}
\ No newline at end of file
+    analytics_cache.invalidate_user(current_user.id)
+    return {"message": "Completion removed successfully"}
+
+async def _bulk_items(request: Request):
+    """Yield (row number, item) from a JSON array body or a streamed NDJSON body.
+    NDJSON lines are yielded undecoded so a bad line only fails that row.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        buffer = b""
+        row = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                row += 1
+                if line.strip():
+                    yield row, line
+        if buffer.strip():
+            yield row + 1, buffer
+        return
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    for row, item in enumerate(items, start=1):
+        yield row, item
+
+def _parse_bulk_item(item) -> Tuple[int, int]:
+    """Return (habit_id, day_number) or raise ValueError describing the problem"""
+    if isinstance(item, bytes):
+        item = json.loads(item)
+    if not isinstance(item, dict):
+        raise ValueError("Expected an object with habit_id and completion_date")
+    habit_id = item.get("habit_id")
+    if not isinstance(habit_id, int) or isinstance(habit_id, bool):
+        raise ValueError("habit_id must be an integer")
+    try:
+        day_number = date.fromisoformat(item.get("completion_date")).toordinal()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+    return habit_id, day_number
+
+def _write_bulk_chunk(db: Session, rows: Set[Tuple[int, int]], masks: Dict[int, int], user_id: int) -> int:
+    """Insert one chunk of a user's (habit_id, day_number) rows in a single transaction.
+    Returns how many of them were new.
+    """
+    inserted = habit_stats.add_completions(db, user_id, rows, masks)
+    db.commit()
+    return len(inserted)
+
+@router.post("/completions/bulk", response_model=BulkIngestResponse)
+async def bulk_complete_habits(request: Request, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Ingest many completions from a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson) of {"habit_id", "completion_date"} objects.
+    Existing completions are skipped, and invalid rows are reported without failing the batch.
+    """
+    started = time.perf_counter()
+    masks = dict(await run_in_threadpool(
+        lambda: db.query(Habit.id, Habit.schedule_mask).filter(Habit.user_id == current_user.id).all()
+    ))
+
+    received = inserted = duplicates = failed = 0
+    errors = []
+    chunk = set()
+
+    def fail(row: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row, "error": message})
+
+    async def flush():
+        nonlocal inserted, duplicates
+        written = await run_in_threadpool(_write_bulk_chunk, db, chunk, masks, current_user.id)
+        if written:
+            analytics_cache.invalidate_user(current_user.id)
+        inserted += written
+        duplicates += len(chunk) - written
+        chunk.clear()
+
+    async for row, item in _bulk_items(request):
+        received += 1
+        try:
+            key = _parse_bulk_item(item)
+        except ValueError as e:
+            fail(row, str(e))
+            continue
+        if key[0] not in masks:
+            fail(row, "Habit not found")
+        elif key in chunk:
+            duplicates += 1
+        else:
+            chunk.add(key)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await flush()
+    if chunk:
+        await flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "received": received,
+        "inserted": inserted,
+        "duplicates": duplicates,
+        "failed": failed,
+        "errors": errors,
+        "rows_per_second": round(received / elapsed, 1) if elapsed > 0 else 0.0
+    }
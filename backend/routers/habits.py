@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
-from models.habit import Habit
-from database import get_db
+from models.habit import Habit, Completion
+from database import get_db, off_loop
+from routers.auth import get_current_user
+from services.token_cache import Principal
+from services import habit_stats, tags as habit_tags
+from services.analytics_cache import analytics_cache
+from services.pagination import decode_cursor, page_limit, set_next_cursor
+from services.schedule import weekday_bit, weekday_of, schedule_string
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import date
 
 router = APIRouter()
 
+# Longest range served by the date-range grid
+MAX_RANGE_DAYS = 366
+
 class HabitCreate(BaseModel):
     name: str
     repeat_frequency: str  # "MONDAY,TUESDAY,..."
     tags: Optional[str] = None
-    user_id: int = 1
 
 class HabitResponse(BaseModel):
     id: int
@@ -24,67 +33,171 @@ class HabitResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class HabitForDateResponse(HabitResponse):
+    completed: bool
+
+class HabitsForDateResponse(BaseModel):
+    date: str
+    habits: List[HabitForDateResponse]
+
+class TagCount(BaseModel):
+    tag: str
+    habits: int
+
 class HabitUpdate(BaseModel):
     name: Optional[str] = None
     repeat_frequency: Optional[str] = None
     tags: Optional[str] = None
 
+def get_user_habit(db: Session, habit_id: int, user_id: int) -> Habit:
+    """The user's habit, or a 404 (also for other users' habits)"""
+    habit = db.query(Habit).filter(Habit.id == habit_id, Habit.user_id == user_id).first()
+    if habit is None:
+        raise HTTPException(status_code=404, detail="Habit not found")
+    return habit
+
 @router.post("/habits/", response_model=HabitResponse)
-def create_habit(habit: HabitCreate, db: Session = Depends(get_db)):
-    db_habit = Habit(**habit.dict())
+def create_habit(habit: HabitCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    db_habit = Habit(**habit.dict(), user_id=current_user.id)
     db.add(db_habit)
+    habit_stats.record_habit(db, current_user.id)
+    db.flush()
+    habit_tags.set_habit_tags(db, current_user.id, db_habit.id, db_habit.tags)
     db.commit()
+    analytics_cache.invalidate_user(current_user.id)
     db.refresh(db_habit)
     return db_habit
 
 @router.get("/habits/", response_model=List[HabitResponse])
-def read_habits(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(Habit).offset(skip).limit(limit).all()
+def read_habits(response: Response, cursor: Optional[str] = None, skip: int = 0, limit: int = 100,
+                tag: Optional[List[str]] = Query(None),
+                current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """List the user's habits by id, only those carrying every `tag` when given. Pass the X-Next-Cursor
+    header of a page as `cursor` to get the next one; `skip` is kept for older clients but gets slower on deep pages.
+    """
+    limit = page_limit(limit)
+    query = db.query(Habit).filter(Habit.user_id == current_user.id).order_by(Habit.id)
+    query = habit_tags.filter_by_tags(query, current_user.id, tag)
+    after = decode_cursor(cursor, 1)
+    if after:
+        query = query.filter(Habit.id > after[0])
+    elif skip:
+        query = query.offset(skip)
+    habits = query.limit(limit).all()
+    set_next_cursor(response, habits, limit, lambda habit: (habit.id,))
+    return habits
+
+@router.get("/habits/tags", response_model=List[TagCount])
+def read_tags(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """The user's tags with the number of habits carrying each"""
+    return habit_tags.tag_counts(db, current_user.id)
 
 @router.get("/habits/{habit_id}", response_model=HabitResponse)
-def read_habit(habit_id: int, db: Session = Depends(get_db)):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
-    if habit is None:
-        raise HTTPException(status_code=404, detail="Habit not found")
-    return habit
+def read_habit(habit_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    return get_user_habit(db, habit_id, current_user.id)
 
 @router.put("/habits/{habit_id}", response_model=HabitResponse)
-def update_habit(habit_id: int, habit_update: HabitUpdate, db: Session = Depends(get_db)):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
-    if habit is None:
-        raise HTTPException(status_code=404, detail="Habit not found")
+def update_habit(habit_id: int, habit_update: HabitUpdate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    habit = get_user_habit(db, habit_id, current_user.id)
     
-    for field, value in habit_update.dict(exclude_unset=True).items():
+    changes = habit_update.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(habit, field, value)
     
+    if "repeat_frequency" in changes:
+        # Streaks depend on which days are scheduled
+        habit_stats.refresh_streaks(db, habit.id, habit.schedule_mask)
+    if "tags" in changes:
+        habit_tags.set_habit_tags(db, current_user.id, habit.id, habit.tags)
     db.commit()
+    analytics_cache.invalidate_user(current_user.id)
     db.refresh(habit)
     return habit
 
 @router.delete("/habits/{habit_id}")
-def delete_habit(habit_id: int, db: Session = Depends(get_db)):
-    habit = db.query(Habit).filter(Habit.id == habit_id).first()
-    if habit is None:
-        raise HTTPException(status_code=404, detail="Habit not found")
+def delete_habit(habit_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    habit = get_user_habit(db, habit_id, current_user.id)
     
+    habit_stats.remove_habit(db, current_user.id, habit_id)
+    habit_tags.remove_habit_tags(db, habit_id)
     db.delete(habit)
     db.commit()
+    analytics_cache.invalidate_user(current_user.id)
     return {"message": "Habit deleted successfully"}
 
-@router.get("/habits/date/{target_date}")
-def get_habits_for_date(target_date: str, db: Session = Depends(get_db)):
-    """Get habits scheduled for a specific date"""
+def _scheduled_habits(db: Session, weekday_bits: int, user_id: int, tags: Optional[List[str]] = None):
+    """A user's habits scheduled on any of the weekdays in `weekday_bits`, served by ix_habits_user_schedule,
+    and carrying all of `tags` if given
+    """
+    query = db.query(Habit.id, Habit.name, Habit.schedule_mask, Habit.tags, Habit.user_id).filter(
+        Habit.user_id == user_id,
+        Habit.schedule_mask.op("&")(weekday_bits) != 0
+    )
+    return habit_tags.filter_by_tags(query, user_id, tags)
+
+def _habit_for_date(habit, completed: bool) -> dict:
+    return {
+        "id": habit.id,
+        "name": habit.name,
+        "repeat_frequency": schedule_string(habit.schedule_mask),
+        "tags": habit.tags,
+        "user_id": habit.user_id,
+        "completed": completed
+    }
+
+@router.get("/habits/date/{target_date}", response_model=List[HabitForDateResponse])
+def get_habits_for_date(target_date: str, tag: Optional[List[str]] = Query(None),
+                        current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get habits scheduled for a specific date along with their completion status"""
     try:
         date_obj = date.fromisoformat(target_date)
-        weekday = date_obj.strftime("%A").upper()
-        
-        habits = db.query(Habit).all()
-        habits_for_date = []
-        
-        for habit in habits:
-            if weekday in habit.repeat_frequency:
-                habits_for_date.append(habit)
-        
-        return habits_for_date
     except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    
+    query = _scheduled_habits(db, weekday_bit(date_obj), current_user.id, tag).add_columns(
+        Completion.day_number.isnot(None).label("completed")
+    ).outerjoin(
+        Completion,
+        and_(Completion.habit_id == Habit.id, Completion.day_number == date_obj.toordinal())
+    )
+    return [_habit_for_date(row, bool(row.completed)) for row in query]
+
+@router.get("/habits/date/{start_date}/{end_date}", response_model=List[HabitsForDateResponse])
+def get_habits_for_date_range(start_date: str, end_date: str, tag: Optional[List[str]] = Query(None),
+                              current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get the scheduled habits and completion status for every date in an inclusive range"""
+    try:
+        first = date.fromisoformat(start_date).toordinal()
+        last = date.fromisoformat(end_date).toordinal()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if last < first:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if last - first + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days")
+    
+    weekday_bits = 0
+    for day_number in range(first, min(last, first + 6) + 1):
+        weekday_bits |= 1 << weekday_of(day_number)
+    habits = _scheduled_habits(db, weekday_bits, current_user.id, tag).order_by(Habit.id).all()
+    
+    completed = set()
+    if habits:
+        completed = set(db.query(Completion.habit_id, Completion.day_number).filter(
+            Completion.user_id == current_user.id,
+            Completion.day_number.between(first, last)
+        ).all())
+    return off_loop(_date_grid, habits, completed, first, last)
+
+def _date_grid(habits: list, completed: set, first: int, last: int) -> List[dict]:
+    grid = []
+    for day_number in range(first, last + 1):
+        bit = 1 << weekday_of(day_number)
+        grid.append({
+            "date": date.fromordinal(day_number).isoformat(),
+            "habits": [
+                _habit_for_date(habit, (habit.id, day_number) in completed)
+                for habit in habits if habit.schedule_mask & bit
+            ]
+        })
+    return grid
@@ -0,0 +1,179 @@
+"""Cache for analytics responses, invalidated by per-user data versions.
+
+Every write to a user's habits or completions calls invalidate_user() after its
+commit, which bumps that user's version. Cache keys and ETags include the version
+(and today's date, which the streak and rate calculations depend on), so a bump
+makes every cached response of the user unreachable without deleting anything. A
+client that still holds the current ETag gets a 304 while its entry is cached, so
+nothing is computed or sent.
+
+The cache lives in process memory unless ANALYTICS_CACHE_URL points at a
+Redis-compatible server (requires the `redis` package), which lets several workers
+share entries and invalidations. With the memory cache and several workers, a worker
+doesn't see writes handled by the others, so its responses and 304s can be up to
+ANALYTICS_CACHE_TTL_SECONDS out of date.
+"""
+import hashlib
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from database import off_loop
+from config import ANALYTICS_CACHE_URL, ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL_SECONDS
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+KEY_PREFIX = "analytics"
+# Version scope bumped by invalidate_all(), e.g. after rebuilding the stats tables
+ALL_USERS = "all"
+
+class MemoryBackend:
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Per-user versions, least recently used first and as many as there are entries.
+        # Versions come from one counter and a user without one reads the counter value
+        # taken at the last eviction, so a user's version never repeats and evicting it
+        # only costs cache misses.
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._counter = itertools.count(1)
+        self._evicted_at = 0
+        # A random epoch keeps ETags from an earlier process from matching after a restart
+        self._epoch = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+
+    def version(self, scope: str) -> str:
+        if scope == ALL_USERS:
+            return self._epoch
+        with self._lock:
+            version = self._versions.get(scope)
+            if version is None:
+                return str(self._evicted_at)
+            self._versions.move_to_end(scope)
+            return str(version)
+
+    def bump(self, scope: str):
+        if scope == ALL_USERS:
+            self._epoch = uuid.uuid4().hex[:12]
+            return
+        with self._lock:
+            self._versions[scope] = next(self._counter)
+            self._versions.move_to_end(scope)
+            while len(self._versions) > max(self.max_entries, 1):
+                self._versions.popitem(last=False)
+                self._evicted_at = next(self._counter)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, body: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisBackend:
+    def __init__(self, url: str, ttl: int):
+        if redis is None:
+            raise RuntimeError("ANALYTICS_CACHE_URL is set but the redis package is not installed")
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url)
+
+    def version(self, scope: str) -> str:
+        key = f"{KEY_PREFIX}:version:{scope}"
+        value = self._redis.get(key)
+        if value is None and scope == ALL_USERS:
+            # Fresh or flushed server: start from a random epoch so old ETags can't match
+            self._redis.set(key, uuid.uuid4().hex[:12], nx=True)
+            value = self._redis.get(key)
+        return value.decode() if value is not None else "0"
+
+    def bump(self, scope: str):
+        key = f"{KEY_PREFIX}:version:{scope}"
+        if scope == ALL_USERS:
+            self._redis.set(key, uuid.uuid4().hex[:12])
+        else:
+            self._redis.incr(key)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._redis.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, body: str):
+        self._redis.set(key, body, ex=self.ttl)
+
+class AnalyticsCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def invalidate_user(self, user_id: int):
+        self.backend.bump(str(user_id))
+
+    def invalidate_all(self):
+        self.backend.bump(ALL_USERS)
+
+    def response(self, request: Request, user_id: int, compute: Callable[[], Any]) -> Response:
+        """Serve compute()'s result as JSON from the cache, or a 304 if the client's ETag matches a cached entry"""
+        params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+        # Cache I/O and encoding stay off the event loop in DB_MODE=async; compute() runs the queries
+        key, body = off_loop(self._lookup, user_id, f"{request.url.path}?{params}")
+        etag = '"' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + '"'
+        # no-cache lets browsers keep the body but revalidate it with If-None-Match every time
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        # A 304 needs a live entry, so writes this worker never heard of (see above)
+        # can't keep a client on an old response beyond the TTL
+        if body is not None and etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        if body is None:
+            self.misses += 1
+            # The key holds the version read before computing, so a write that lands
+            # meanwhile can only leave behind an entry that is already unreachable
+            body = off_loop(self._store, key, compute())
+        else:
+            self.hits += 1
+        return Response(body, media_type="application/json", headers=headers)
+
+    def _lookup(self, user_id: int, path: str) -> Tuple[str, Optional[str]]:
+        """The cache key for the user's current version, and its cached body if any"""
+        version = f"{self.backend.version(ALL_USERS)}.{self.backend.version(str(user_id))}"
+        key = f"{KEY_PREFIX}:{user_id}:{version}:{date.today().isoformat()}:{path}"
+        return key, self.backend.get(key)
+
+    def _store(self, key: str, result: Any) -> str:
+        body = json.dumps(jsonable_encoder(result))
+        self.backend.set(key, body)
+        return body
+
+def _backend():
+    if ANALYTICS_CACHE_URL:
+        return RedisBackend(ANALYTICS_CACHE_URL, ANALYTICS_CACHE_TTL_SECONDS)
+    return MemoryBackend(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL_SECONDS)
+
+analytics_cache = AnalyticsCache(_backend())
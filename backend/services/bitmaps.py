@@ -0,0 +1,129 @@
+"""Completion calendars as day bitmaps.
+
+A bitmap covers the days of a range [first, last]: bit i is day first + i. Python
+ints act as the bitsets, so a year of one habit is a single 366-bit number. It is
+built in one pass over the user's completions in the range (a scan of
+ix_completions_user_day), and the calendar questions become bitwise operations:
+
+    completion rate     popcount(completed) / popcount(scheduled)
+    streaks             popcount of completed between scheduled-but-missed days
+    all habits done     AND over habits of (completed | ~scheduled)
+
+Bitmaps travel as base64 of the little-endian bytes: day i is bit i % 8 of byte i // 8.
+"""
+import base64
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from database import off_loop
+from models.habit import Habit, Completion
+from services.schedule import weekday_of
+from services.tags import filter_by_tags
+
+def encode(bits: int, days: int) -> str:
+    return base64.b64encode(bits.to_bytes((days + 7) // 8, "little")).decode()
+
+def decode(value: str) -> int:
+    return int.from_bytes(base64.b64decode(value), "little")
+
+def popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+def schedule_bitmap(mask: int, first: int, days: int) -> int:
+    """Days of the range falling on the schedule's weekdays; the week pattern is doubled up to `days`"""
+    start = weekday_of(first)
+    bits = sum(1 << offset for offset in range(7) if mask >> ((start + offset) % 7) & 1)
+    width = 7
+    while width < days:
+        bits |= bits << width
+        width *= 2
+    return bits & ((1 << days) - 1)
+
+def runs(completed: int, misses: int, days: int) -> Tuple[int, int]:
+    """(last_run, longest_run) of completions not interrupted by a missed day, as in
+    services/streaks.py: unscheduled days never break a run
+    """
+    last = longest = 0
+    start = 0
+    while True:
+        lowest = misses & -misses
+        end = lowest.bit_length() - 1 if misses else days
+        last = popcount((completed >> start) & ((1 << (end - start)) - 1))
+        longest = max(longest, last)
+        if not misses:
+            return last, longest
+        misses ^= lowest
+        start = end + 1
+
+def load_calendar(db: Session, user_id: int, first: int, last: int, habit_id: Optional[int] = None,
+                  tags: Optional[List[str]] = None, per_habit: bool = True, today: Optional[date] = None) -> dict:
+    """Day-level completion state of a user's habits over [first, last] as bitmaps, with
+    each habit's rate and streaks and the days on which every scheduled habit was done.
+    Days after today are never counted as missed, and completions on them don't count
+    toward streaks.
+    """
+    today_number = (today or date.today()).toordinal()
+    query = db.query(Habit.id, Habit.name, Habit.schedule_mask).filter(Habit.user_id == user_id)
+    if habit_id:
+        query = query.filter(Habit.id == habit_id)
+    habits = filter_by_tags(query, user_id, tags).order_by(Habit.id).all()
+    rows = db.query(Completion.habit_id, Completion.day_number).filter(
+        Completion.user_id == user_id, Completion.day_number.between(first, last)
+    ).all()
+    return off_loop(_build_calendar, habits, rows, first, last, per_habit, today_number)
+
+def _build_calendar(habits: list, rows: list, first: int, last: int, per_habit: bool, today_number: int) -> dict:
+    days = last - first + 1
+    full = (1 << days) - 1
+    # Days up to and including today; today itself is still open, so it is never a miss
+    elapsed = full if today_number > last else (1 << max(today_number - first + 1, 0)) - 1
+    past = elapsed >> 1 if first <= today_number <= last else elapsed
+
+    completed: Dict[int, int] = {habit.id: 0 for habit in habits}
+    for row_habit_id, day_number in rows:
+        if row_habit_id in completed:
+            completed[row_habit_id] |= 1 << (day_number - first)
+
+    any_scheduled = any_done = 0
+    all_done = full
+    results = []
+    for habit in habits:
+        scheduled = schedule_bitmap(habit.schedule_mask, first, days)
+        # As in services/streaks.py, a habit without a schedule breaks its runs on any missed day
+        breaking = scheduled if habit.schedule_mask else full
+        done = completed[habit.id]
+        # Completions after today don't count toward streaks yet, as in /analytics/streaks
+        current, longest = runs(done & elapsed, breaking & ~done & past, days)
+        expected = popcount(scheduled & elapsed)
+        actual = popcount(done & elapsed)
+        any_scheduled |= scheduled
+        any_done |= done
+        all_done &= done | ~scheduled
+        if per_habit:
+            results.append({
+                "habit_id": habit.id,
+                "habit_name": habit.name,
+                "completed": encode(done, days),
+                "scheduled": encode(scheduled, days),
+                "completed_days": actual,
+                "scheduled_days": expected,
+                "completion_rate": round(actual / expected * 100, 2) if expected else 0,
+                # As of the end of the range, or today if that is earlier
+                "current_streak": current,
+                "longest_streak": longest,
+            })
+    # Only days on which something was scheduled, up to today, can count as all done
+    all_done &= any_scheduled & elapsed
+
+    calendar = {
+        "start": date.fromordinal(first).isoformat(),
+        "end": date.fromordinal(last).isoformat(),
+        "days": days,
+        "all_done": encode(all_done, days),
+        "any_done": encode(any_done, days),
+        "all_done_days": popcount(all_done),
+        "any_done_days": popcount(any_done),
+    }
+    if per_habit:
+        calendar["habits"] = results
+    return calendar
@@ -0,0 +1,189 @@
+"""Retention and metrics for the agent's SQLite checkpoint store.
+
+LangGraph's SqliteSaver writes a checkpoint for every step of every thread and never
+deletes one. Each checkpoint holds the thread's full state, so only the newest are
+needed to resume a conversation: compact() keeps the last CHECKPOINT_KEEP_LAST per
+thread, drops threads idle for CHECKPOINT_IDLE_TTL_DAYS and removes the pending
+writes left without a checkpoint. Freed pages are reused by later checkpoints, so
+the file stops growing; pass --vacuum to also shrink it.
+
+Every API worker schedules the compaction, but a row in compaction_runs lets only
+one of them run it per interval and keeps the last report for all of them.
+
+Run `python -m services.checkpoint_store` from the backend directory to compact once,
+or `--stats` to only print the metrics.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import Iterable, Optional
+from langgraph.checkpoint.base.id import UUID
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from database import connect_sqlite
+from config import CHECKPOINT_DB, CHECKPOINT_KEEP_LAST, CHECKPOINT_IDLE_TTL_DAYS
+
+# 100 ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+# Result of the last compact() in this process, served with the live metrics when
+# the store has no compaction_runs row yet
+last_report: Optional[dict] = None
+
+def checkpoint_id_at(timestamp: float) -> str:
+    """Smallest uuid6 checkpoint id LangGraph could have created at `timestamp`.
+    Ids are time-ordered strings, so comparing against this finds older checkpoints.
+    """
+    ticks = int(timestamp * 10_000_000) + UUID_EPOCH_OFFSET
+    return str(UUID(int=((ticks >> 12) & 0xFFFFFFFFFFFF) << 80 | (ticks & 0x0FFF) << 64, version=6))
+
+def _has_tables(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('checkpoints', 'writes')"
+    ).fetchone()[0] == 2
+
+def message_counts(conn: sqlite3.Connection) -> dict:
+    """Messages held by the newest checkpoint of each thread"""
+    serde = JsonPlusSerializer()
+    rows = conn.execute("""
+        SELECT c.type, c.checkpoint FROM checkpoints c
+        JOIN (
+            SELECT thread_id, MAX(checkpoint_id) AS checkpoint_id FROM checkpoints
+            WHERE checkpoint_ns = '' GROUP BY thread_id
+        ) latest USING (thread_id, checkpoint_id)
+        WHERE c.checkpoint_ns = ''
+    """)
+    counts = sorted(
+        len(serde.loads_typed((type_, blob))["channel_values"].get("messages", []))
+        for type_, blob in rows
+    )
+    if not counts:
+        return {"threads": 0, "mean": None, "p95": None, "max": None}
+    return {
+        "threads": len(counts),
+        "mean": sum(counts) / len(counts),
+        "p95": counts[min(int(0.95 * len(counts)), len(counts) - 1)],
+        "max": counts[-1],
+    }
+
+def _compaction_runs(conn: sqlite3.Connection):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS compaction_runs (id INTEGER PRIMARY KEY CHECK (id = 1), started_at REAL NOT NULL, report TEXT)"
+    )
+    conn.execute("INSERT OR IGNORE INTO compaction_runs (id, started_at) VALUES (1, 0)")
+
+def claim_compaction(conn: sqlite3.Connection, interval: float) -> bool:
+    """Record that this process compacts now, unless another one started within the interval"""
+    now = time.time()
+    with conn:
+        _compaction_runs(conn)
+        # A single UPDATE, so of several workers waking together only one matches
+        return conn.execute(
+            "UPDATE compaction_runs SET started_at = ? WHERE id = 1 AND started_at <= ?",
+            (now, now - 0.9 * interval)
+        ).rowcount == 1
+
+def compact(conn: sqlite3.Connection, keep_last: int = CHECKPOINT_KEEP_LAST,
+            idle_ttl_days: float = CHECKPOINT_IDLE_TTL_DAYS, vacuum: bool = False) -> dict:
+    """Apply the retention policy and return what was removed along with per-thread message counts"""
+    global last_report
+    report = {"idle_threads": 0, "checkpoints_deleted": 0, "writes_deleted": 0}
+    if _has_tables(conn):
+        started = time.perf_counter()
+        cutoff = checkpoint_id_at(time.time() - idle_ttl_days * 86400)
+        with conn:
+            report["idle_threads"] = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(checkpoint_id) < ?)",
+                (cutoff,)
+            ).fetchone()[0]
+            report["checkpoints_deleted"] += conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id IN "
+                "(SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(checkpoint_id) < ?)",
+                (cutoff,)
+            ).rowcount
+            report["checkpoints_deleted"] += conn.execute("""
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                        ) AS position FROM checkpoints
+                    ) WHERE position > ?
+                )
+            """, (keep_last,)).rowcount
+            report["writes_deleted"] = conn.execute("""
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id
+                    AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id
+                )
+            """).rowcount
+        if vacuum:
+            conn.execute("VACUUM")
+        report["seconds"] = time.perf_counter() - started
+        report["messages_per_thread"] = message_counts(conn)
+    report["finished_at"] = time.time()
+    last_report = report
+    with conn:
+        _compaction_runs(conn)
+        conn.execute("UPDATE compaction_runs SET report = ? WHERE id = 1", (json.dumps(report),))
+    return report
+
+def metrics(conn: sqlite3.Connection, path: str = CHECKPOINT_DB) -> dict:
+    """Current size of the checkpoint store"""
+    size = sum(os.path.getsize(file) for file in (path, path + "-wal") if os.path.exists(file))
+    result = {
+        "file_bytes": size,
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0],
+        "threads": 0,
+        "checkpoints": 0,
+        "writes": 0,
+    }
+    if _has_tables(conn):
+        result["threads"] = conn.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints").fetchone()[0]
+        result["checkpoints"] = conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        result["writes"] = conn.execute("SELECT COUNT(*) FROM writes").fetchone()[0]
+    stored = None
+    if conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'compaction_runs'").fetchone()[0]:
+        stored = conn.execute("SELECT report FROM compaction_runs WHERE id = 1").fetchone()
+    result["last_compaction"] = json.loads(stored[0]) if stored and stored[0] else last_report
+    return result
+
+def compact_file(path: str = CHECKPOINT_DB, vacuum: bool = False, interval: Optional[float] = None) -> Optional[dict]:
+    """Compact the store; with an `interval`, only if no other process did within it (None if skipped)"""
+    conn = connect_sqlite(path)
+    try:
+        if interval is not None and not claim_compaction(conn, interval):
+            return None
+        return compact(conn, vacuum=vacuum)
+    finally:
+        conn.close()
+
+def read_metrics(path: str = CHECKPOINT_DB) -> dict:
+    conn = connect_sqlite(path)
+    try:
+        return metrics(conn, path)
+    finally:
+        conn.close()
+
+async def compact_periodically(interval: float):
+    """Run compact_file() every `interval` seconds on a worker thread, in one process at a time"""
+    while True:
+        try:
+            await asyncio.to_thread(compact_file, CHECKPOINT_DB, False, interval)
+        except Exception:
+            logging.getLogger(__name__).exception("Checkpoint compaction failed")
+        await asyncio.sleep(interval)
+
+def main(argv: Iterable[str]) -> int:
+    if "--stats" not in argv:
+        report = compact_file(vacuum="--vacuum" in argv)
+        print(f"Removed {report['checkpoints_deleted']} checkpoints ({report['idle_threads']} idle threads) "
+              f"and {report['writes_deleted']} writes")
+    for name, value in read_metrics().items():
+        print(f"{name}: {value}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+"""Per-user cache of the habit list rendered into the agent's system prompt.
+
+The graph refreshes the habit context at entry and after every tool call, so without
+a cache each agent step would read all of the user's habits again. Entries carry the
+user's habit version, which is bumped after this process commits an insert, update
+or delete of one of their habits; other worker processes pick such changes up once
+HABIT_CONTEXT_TTL_SECONDS have passed.
+
+The rendering is one short line per habit, and only the HABIT_CONTEXT_MAX_HABITS most
+recently added habits are listed, so prompt size stays bounded for large accounts.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+from database import SessionLocal
+from models.habit import Habit
+from services.schedule import ALL_DAYS_MASK, WEEKDAYS
+from config import HABIT_CONTEXT_CACHE_SIZE, HABIT_CONTEXT_TTL_SECONDS, HABIT_CONTEXT_MAX_HABITS
+
+# Longer names are cut when rendered
+MAX_NAME_LENGTH = 80
+
+def _days(mask: int) -> str:
+    if mask == ALL_DAYS_MASK:
+        return "daily"
+    if not mask:
+        return "no days"
+    return ",".join(day[:3].title() for i, day in enumerate(WEEKDAYS) if mask >> i & 1)
+
+def render_habits(db: Session, user_id: int, max_habits: int = HABIT_CONTEXT_MAX_HABITS) -> str:
+    """List a user's habits for the system prompt, e.g. "#3 Read: Mon,Wed,Fri [books]" per line"""
+    rows = db.query(Habit.id, Habit.name, Habit.schedule_mask, Habit.tags).filter(
+        Habit.user_id == user_id
+    ).order_by(Habit.id.desc()).limit(max_habits).all()
+    if not rows:
+        return "No habits yet."
+
+    lines = []
+    for row in reversed(rows):
+        name = row.name if len(row.name) <= MAX_NAME_LENGTH else row.name[:MAX_NAME_LENGTH - 3] + "..."
+        line = f"#{row.id} {name}: {_days(row.schedule_mask or 0)}"
+        if row.tags:
+            line += f" [{row.tags}]"
+        lines.append(line)
+    if len(rows) == max_habits:
+        total = db.query(func.count(Habit.id)).filter(Habit.user_id == user_id).scalar()
+        if total > max_habits:
+            lines.append(f"({total - max_habits} older habits not listed)")
+    return "\n".join(lines)
+
+class HabitContextCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[int, float, str]]" = OrderedDict()
+        # Per-user versions, bounded like the analytics cache's: least recently used first,
+        # from one counter, and users without one read the counter value taken at the last
+        # eviction, so an evicted user never gets back a version it had before
+        self._versions: "OrderedDict[int, int]" = OrderedDict()
+        self._counter = itertools.count(1)
+        self._evicted_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> str:
+        """The user's rendered habit list, read from the database only when it may have changed"""
+        with self._lock:
+            version = self._versions.get(user_id)
+            if version is None:
+                version = self._evicted_at
+            else:
+                self._versions.move_to_end(user_id)
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Stored under the version read above, so a commit that lands meanwhile
+        # leaves behind an entry that is already stale
+        with SessionLocal() as db:
+            text = render_habits(db, user_id)
+        if self.max_size > 0:
+            with self._lock:
+                self._entries[user_id] = (version, time.monotonic() + self.ttl, text)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return text
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._versions[user_id] = next(self._counter)
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > max(self.max_size, 1):
+                self._versions.popitem(last=False)
+                self._evicted_at = next(self._counter)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+habit_context = HabitContextCache(HABIT_CONTEXT_CACHE_SIZE, HABIT_CONTEXT_TTL_SECONDS)
+
+@event.listens_for(Habit, "after_insert")
+@event.listens_for(Habit, "after_update")
+@event.listens_for(Habit, "after_delete")
+def _habit_changed(mapper, connection, target: Habit):
+    session = object_session(target)
+    if session is not None and target.user_id is not None:
+        session.info.setdefault("changed_habit_user_ids", set()).add(target.user_id)
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    for user_id in session.info.pop("changed_habit_user_ids", ()):
+        habit_context.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("changed_habit_user_ids", None)
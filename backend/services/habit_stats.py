@@ -0,0 +1,366 @@
+"""Materialized per-habit and per-user statistics kept in step with the raw tables.
+
+Writers call record_habit/record_completion/record_uncompletion/remove_habit (or
+add_completions, which also inserts the rows) inside their own transaction so the
+stats commit (or roll back) together with the raw rows.
+Run `python -m services.habit_stats` from the backend directory to rebuild the
+tables from scratch, or `python -m services.habit_stats --check` to only verify them.
+"""
+import sys
+from datetime import date, timedelta
+from collections import Counter
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from database import dialect_insert, insert_ignoring_conflicts
+from models.habit import Habit, Completion, HabitStats, HabitMonthlyCount, UserStats, UserDailyCount
+from services.schedule import month_key, count_scheduled_days, ALL_DAYS_MASK
+from services.streaks import run_lengths, current_streak
+from services.tags import filter_by_tags
+
+def _get_or_create(db: Session, habit_id: int) -> HabitStats:
+    stats = db.get(HabitStats, habit_id)
+    if stats is None:
+        stats = HabitStats(habit_id=habit_id, current_streak=0, longest_streak=0, total_completions=0)
+        db.add(stats)
+        db.flush()
+    return stats
+
+def _bump_month(db: Session, habit_id: int, month: int, delta: int):
+    row = db.get(HabitMonthlyCount, (habit_id, month))
+    if row is None:
+        if delta > 0:
+            db.add(HabitMonthlyCount(habit_id=habit_id, month=month, count=delta))
+            db.flush()
+        return
+    row.count += delta
+    if row.count <= 0:
+        db.delete(row)
+
+def _add_user_totals(db: Session, user_id: int, habits: int = 0, completions: int = 0):
+    # Added in SQL rather than read-modify-write, as every write of a user touches this row
+    insert = dialect_insert(db)(UserStats)
+    db.execute(insert.values(user_id=user_id, total_habits=habits, total_completions=completions).on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            "total_habits": UserStats.total_habits + insert.excluded.total_habits,
+            "total_completions": UserStats.total_completions + insert.excluded.total_completions,
+        }
+    ))
+
+def _add_user_days(db: Session, user_id: int, deltas: Dict[int, int]):
+    if not deltas:
+        return
+    insert = dialect_insert(db)(UserDailyCount)
+    db.execute(
+        insert.on_conflict_do_update(
+            index_elements=[UserDailyCount.user_id, UserDailyCount.day_number],
+            set_={"count": UserDailyCount.count + insert.excluded.count}
+        ),
+        [{"user_id": user_id, "day_number": day_number, "count": delta} for day_number, delta in deltas.items()]
+    )
+    if min(deltas.values()) < 0:
+        db.query(UserDailyCount).filter(
+            UserDailyCount.user_id == user_id,
+            UserDailyCount.day_number.in_(list(deltas)),
+            UserDailyCount.count <= 0
+        ).delete(synchronize_session=False)
+
+def refresh_streaks(db: Session, habit_id: int, schedule_mask: int):
+    """Recompute the streak columns of one habit from its raw completions"""
+    db.flush()
+    stats = _get_or_create(db, habit_id)
+    days = [
+        row.day_number for row in
+        db.query(Completion.day_number)
+        .filter(Completion.habit_id == habit_id)
+        .order_by(Completion.day_number)
+    ]
+    last_run, longest = run_lengths(days, schedule_mask)
+    stats.current_streak = last_run
+    stats.longest_streak = longest
+    stats.last_completion_day = days[-1] if days else None
+
+def record_habit(db: Session, user_id: int):
+    """Account for a newly created habit"""
+    _add_user_totals(db, user_id, habits=1)
+
+def record_completion(db: Session, user_id: int, habit_id: int, schedule_mask: int, day_number: int):
+    """Account for a newly inserted completion row"""
+    record_completions(db, user_id, habit_id, schedule_mask, [day_number])
+
+def record_completions(db: Session, user_id: int, habit_id: int, schedule_mask: int, day_numbers: List[int]):
+    """Account for newly inserted completion rows of one habit"""
+    if not day_numbers:
+        return
+    day_numbers = sorted(day_numbers)
+    _add_user_totals(db, user_id, completions=len(day_numbers))
+    _add_user_days(db, user_id, Counter(day_numbers))
+    stats = _get_or_create(db, habit_id)
+    stats.total_completions += len(day_numbers)
+    for month, days in groupby(day_numbers, key=month_key):
+        _bump_month(db, habit_id, month, len(list(days)))
+
+    last = stats.last_completion_day
+    if last is not None and day_numbers[0] < last:
+        # Backfilled history can merge or split earlier runs
+        refresh_streaks(db, habit_id, schedule_mask)
+        return
+
+    mask = schedule_mask or ALL_DAYS_MASK
+    for day_number in day_numbers:
+        if last is not None and count_scheduled_days(mask, last + 1, day_number - 1) == 0:
+            stats.current_streak += 1
+        else:
+            stats.current_streak = 1
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        last = day_number
+    stats.last_completion_day = last
+
+def add_completions(db: Session, user_id: int, keys: Iterable[Tuple[int, int]], masks: Dict[int, int]) -> List[Tuple[int, int]]:
+    """Insert (habit_id, day_number) completions of a user's habits, skipping existing ones, and
+    account for them. Returns the rows actually inserted: RETURNING only yields rows that
+    ON CONFLICT DO NOTHING kept, so a row a concurrent writer added is never counted twice.
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+    inserted = sorted(db.execute(
+        insert_ignoring_conflicts(db, Completion).returning(Completion.habit_id, Completion.day_number),
+        [{"habit_id": habit_id, "day_number": day_number, "user_id": user_id} for habit_id, day_number in keys]
+    ).tuples())
+    for habit_id, rows in groupby(inserted, key=lambda key: key[0]):
+        record_completions(db, user_id, habit_id, masks[habit_id], [day_number for _, day_number in rows])
+    return inserted
+
+def record_uncompletion(db: Session, user_id: int, habit_id: int, schedule_mask: int, day_number: int):
+    """Account for a deleted completion row"""
+    _add_user_totals(db, user_id, completions=-1)
+    _add_user_days(db, user_id, {day_number: -1})
+    stats = _get_or_create(db, habit_id)
+    stats.total_completions = max(stats.total_completions - 1, 0)
+    _bump_month(db, habit_id, month_key(day_number), -1)
+    refresh_streaks(db, habit_id, schedule_mask)
+
+def remove_habit(db: Session, user_id: int, habit_id: int):
+    """Delete a habit's completions and stats and take them out of the user's counters"""
+    day_numbers = [row.day_number for row in db.query(Completion.day_number).filter(Completion.habit_id == habit_id)]
+    _add_user_totals(db, user_id, habits=-1, completions=-len(day_numbers))
+    _add_user_days(db, user_id, {day_number: -1 for day_number in day_numbers})
+    db.query(Completion).filter(Completion.habit_id == habit_id).delete(synchronize_session=False)
+    db.query(HabitStats).filter(HabitStats.habit_id == habit_id).delete(synchronize_session=False)
+    db.query(HabitMonthlyCount).filter(HabitMonthlyCount.habit_id == habit_id).delete(synchronize_session=False)
+
+def load_streaks(db: Session, user_id: int, habit_id: Optional[int] = None, today: Optional[date] = None,
+                 tags: Optional[List[str]] = None) -> List[dict]:
+    """Read current and longest streaks for a user's habits (those with all of `tags`, if given)
+    in a single pass over habit_stats. Completions dated after today don't count yet.
+    """
+    today_number = (today or date.today()).toordinal()
+    query = db.query(
+        Habit.id, Habit.name, Habit.schedule_mask,
+        HabitStats.current_streak, HabitStats.longest_streak, HabitStats.last_completion_day
+    ).outerjoin(HabitStats, HabitStats.habit_id == Habit.id).filter(Habit.user_id == user_id)
+    if habit_id:
+        query = query.filter(Habit.id == habit_id)
+    query = filter_by_tags(query, user_id, tags)
+
+    rows = query.all()
+    # The stored runs include completions dated after today, so those habits are
+    # recomputed from their completions up to today
+    future = {row.id: row.schedule_mask for row in rows if (row.last_completion_day or 0) > today_number}
+    recomputed = {}
+    if future:
+        completions = db.query(Completion.habit_id, Completion.day_number).filter(
+            Completion.habit_id.in_(list(future)), Completion.day_number <= today_number
+        ).order_by(Completion.habit_id, Completion.day_number)
+        for habit_id, group in groupby(completions, key=lambda row: row.habit_id):
+            days = [row.day_number for row in group]
+            last_run, longest = run_lengths(days, future[habit_id])
+            recomputed[habit_id] = (current_streak(last_run, days[-1], future[habit_id], today_number), longest)
+
+    streaks = []
+    for row in rows:
+        if row.id in future:
+            current, longest = recomputed.get(row.id, (0, 0))
+        else:
+            current = current_streak(row.current_streak or 0, row.last_completion_day, row.schedule_mask, today_number)
+            longest = row.longest_streak or 0
+        streaks.append({
+            "habit_id": row.id,
+            "habit_name": row.name,
+            "current_streak": current,
+            "longest_streak": longest
+        })
+    return streaks
+
+def completion_counts(db: Session, habit_ids: List[int], start_date: date, end_date: date) -> Dict[int, int]:
+    """Count completions per habit in [start_date, end_date] with one GROUP BY habit_id query.
+
+    Whole months inside the window are read from habit_monthly_counts, so only the
+    partial months at either edge touch the raw completions table.
+    """
+    counts = {habit_id: 0 for habit_id in habit_ids}
+    if not habit_ids or end_date < start_date:
+        return counts
+
+    # Whole months covered by the window are [first_full, after_last_full)
+    first_full = start_date if start_date.day == 1 else _next_month(start_date)
+    after_last_full = end_date + timedelta(days=1)
+    if after_last_full.day != 1:
+        after_last_full = end_date.replace(day=1)
+
+    parts = []
+    edges = [(start_date, end_date)]
+    if first_full < after_last_full:
+        parts.append(select(HabitMonthlyCount.habit_id, HabitMonthlyCount.count.label("n")).where(
+            HabitMonthlyCount.habit_id.in_(habit_ids),
+            HabitMonthlyCount.month >= month_key(first_full.toordinal()),
+            HabitMonthlyCount.month < month_key(after_last_full.toordinal())
+        ))
+        edges = [(start_date, first_full - timedelta(days=1)), (after_last_full, end_date)]
+
+    for edge_start, edge_end in edges:
+        if edge_end >= edge_start:
+            parts.append(select(Completion.habit_id, literal(1).label("n")).where(
+                Completion.habit_id.in_(habit_ids),
+                Completion.day_number.between(edge_start.toordinal(), edge_end.toordinal())
+            ))
+
+    combined = union_all(*parts).subquery()
+    for habit_id, count in db.query(combined.c.habit_id, func.sum(combined.c.n)).group_by(combined.c.habit_id):
+        counts[habit_id] += count
+    return counts
+
+def load_summary(db: Session, user_id: int, today: Optional[date] = None) -> dict:
+    """Read a user's habit and completion totals and today's completions from one user_stats row"""
+    row = db.query(
+        UserStats.total_habits, UserStats.total_completions, UserDailyCount.count
+    ).outerjoin(UserDailyCount, and_(
+        UserDailyCount.user_id == UserStats.user_id,
+        UserDailyCount.day_number == (today or date.today()).toordinal()
+    )).filter(UserStats.user_id == user_id).first()
+    return {
+        "total_habits": row.total_habits if row else 0,
+        "total_completions": row.total_completions if row else 0,
+        "completed_today": row.count or 0 if row else 0
+    }
+
+def _next_month(value: date) -> date:
+    if value.month == 12:
+        return date(value.year + 1, 1, 1)
+    return date(value.year, value.month + 1, 1)
+
+def _expected_stats(db: Session) -> Tuple[Dict[int, tuple], Dict[Tuple[int, int], int]]:
+    """Compute the contents of both stats tables from the raw completions"""
+    masks = dict(db.query(Habit.id, Habit.schedule_mask))
+    rows = db.query(Completion.habit_id, Completion.day_number).order_by(
+        Completion.habit_id, Completion.day_number
+    )
+    stats = {}
+    months = {}
+    for habit_id, group in groupby(rows, key=lambda row: row.habit_id):
+        days = [row.day_number for row in group]
+        for day_number in days:
+            key = (habit_id, month_key(day_number))
+            months[key] = months.get(key, 0) + 1
+        last_run, longest = run_lengths(days, masks.get(habit_id, 0))
+        stats[habit_id] = (last_run, longest, days[-1], len(days))
+    return stats, months
+
+def _expected_user_counters(db: Session) -> Tuple[Dict[int, tuple], Dict[Tuple[int, int], int]]:
+    """Compute the contents of both per-user counter tables from the raw tables"""
+    totals = {}
+    for user_id, count in db.query(Habit.user_id, func.count()).filter(Habit.user_id.isnot(None)).group_by(Habit.user_id):
+        totals[user_id] = (count, 0)
+    for user_id, count in db.query(Completion.user_id, func.count()).filter(Completion.user_id.isnot(None)).group_by(Completion.user_id):
+        totals[user_id] = (totals.get(user_id, (0, 0))[0], count)
+    days = {
+        (row.user_id, row.day_number): row.count for row in
+        db.query(Completion.user_id, Completion.day_number, func.count().label("count"))
+        .filter(Completion.user_id.isnot(None))
+        .group_by(Completion.user_id, Completion.day_number)
+    }
+    return totals, days
+
+def rebuild(db: Session):
+    """Recompute all stats tables from scratch"""
+    stats, months = _expected_stats(db)
+    totals, days = _expected_user_counters(db)
+    db.query(HabitStats).delete(synchronize_session=False)
+    db.query(HabitMonthlyCount).delete(synchronize_session=False)
+    db.query(UserStats).delete(synchronize_session=False)
+    db.query(UserDailyCount).delete(synchronize_session=False)
+    db.add_all(
+        HabitStats(habit_id=habit_id, current_streak=run, longest_streak=longest,
+                   last_completion_day=last, total_completions=total)
+        for habit_id, (run, longest, last, total) in stats.items()
+    )
+    db.add_all(
+        HabitMonthlyCount(habit_id=habit_id, month=month, count=count)
+        for (habit_id, month), count in months.items()
+    )
+    db.add_all(
+        UserStats(user_id=user_id, total_habits=habits, total_completions=completions)
+        for user_id, (habits, completions) in totals.items()
+    )
+    db.add_all(
+        UserDailyCount(user_id=user_id, day_number=day_number, count=count)
+        for (user_id, day_number), count in days.items()
+    )
+    db.commit()
+
+def check(db: Session) -> List[str]:
+    """Compare the stats tables against the raw data and describe every mismatch"""
+    expected_stats, expected_months = _expected_stats(db)
+    problems = []
+
+    actual_stats = {
+        row.habit_id: (row.current_streak, row.longest_streak, row.last_completion_day, row.total_completions)
+        for row in db.query(HabitStats) if row.total_completions
+    }
+    for habit_id in sorted(set(expected_stats) | set(actual_stats)):
+        if expected_stats.get(habit_id) != actual_stats.get(habit_id):
+            problems.append(f"habit {habit_id}: expected {expected_stats.get(habit_id)}, found {actual_stats.get(habit_id)}")
+
+    actual_months = {(row.habit_id, row.month): row.count for row in db.query(HabitMonthlyCount)}
+    for key in sorted(set(expected_months) | set(actual_months)):
+        if expected_months.get(key) != actual_months.get(key):
+            problems.append(f"habit {key[0]} month {key[1]}: expected {expected_months.get(key)}, found {actual_months.get(key)}")
+
+    expected_totals, expected_days = _expected_user_counters(db)
+    actual_totals = {
+        row.user_id: (row.total_habits, row.total_completions)
+        for row in db.query(UserStats) if row.total_habits or row.total_completions
+    }
+    for user_id in sorted(set(expected_totals) | set(actual_totals)):
+        if expected_totals.get(user_id) != actual_totals.get(user_id):
+            problems.append(f"user {user_id}: expected {expected_totals.get(user_id)}, found {actual_totals.get(user_id)}")
+
+    actual_days = {(row.user_id, row.day_number): row.count for row in db.query(UserDailyCount)}
+    for key in sorted(set(expected_days) | set(actual_days)):
+        if expected_days.get(key) != actual_days.get(key):
+            problems.append(f"user {key[0]} day {key[1]}: expected {expected_days.get(key)}, found {actual_days.get(key)}")
+    return problems
+
+def main(argv: Iterable[str]) -> int:
+    from database import SessionLocal, engine
+    import migrations
+    migrations.migrate(engine)
+
+    with SessionLocal() as db:
+        if "--check" not in argv:
+            rebuild(db)
+            # Reaches running servers only when they share the cache through ANALYTICS_CACHE_URL
+            from services.analytics_cache import analytics_cache
+            analytics_cache.invalidate_all()
+            print("Rebuilt habit stats")
+        problems = check(db)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} mismatches")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,24 @@
+"""Code run in the password hashing pool's worker processes (see password_hashing.py).
+
+Workers unpickle their tasks by importing this module, so it imports passlib and
+nothing from the app. The cost is passed in by configure(), the pool's initializer,
+rather than read from config.
+"""
+import time
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+
+pwd_context: Optional[CryptContext] = None
+
+def configure(rounds: int):
+    """Set up the bcrypt context; hashes made with other rounds still verify and are flagged for a rehash"""
+    global pwd_context
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+def hash_password(password: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - started
+
+def verify_and_update(password: str, hashed: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    started = time.perf_counter()
+    return pwd_context.verify_and_update(password, hashed), time.perf_counter() - started
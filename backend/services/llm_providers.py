@@ -0,0 +1,119 @@
+"""Chat model behind the agent, chosen by LLM_PROVIDER and built on first use.
+
+Building the model at import time needed GROQ_API_KEY (and the network) just to start
+the API. Providers are now factories in PROVIDERS, so another backend is a
+register_provider() away, and "scripted" runs the agent fully offline.
+
+With LLM_CACHE_SIZE > 0 the model is wrapped in a CachedChatModel: a conversation
+that was answered before (same provider, model, day and normalized messages, which
+include the habit list in the system prompt) gets the stored reply without a round
+trip. Cached tool calls are replayed with fresh ids, so the tools still run.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage
+from config import LLM_PROVIDER, LLM_MODEL, LLM_CACHE_SIZE
+
+PROVIDERS: Dict[str, Callable[[], object]] = {}
+
+def register_provider(name: str):
+    """Decorator registering a factory that returns a LangChain chat model"""
+    def register(factory):
+        PROVIDERS[name] = factory
+        return factory
+    return register
+
+@register_provider("groq")
+def _groq():
+    from langchain_groq import ChatGroq
+    return ChatGroq(model=LLM_MODEL, temperature=0, api_key=os.getenv("GROQ_API_KEY"))
+
+@register_provider("scripted")
+def _scripted():
+    from services.scripted_model import ScriptedChatModel
+    return ScriptedChatModel()
+
+class ResponseCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, AIMessage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(messages: List[BaseMessage]) -> str:
+        """Digest of what the model sees: message types, whitespace-normalized text and tool calls"""
+        normalized = [LLM_PROVIDER, LLM_MODEL, date.today().isoformat()]
+        for message in messages:
+            content = message.content if isinstance(message.content, str) else json.dumps(message.content, sort_keys=True)
+            calls = [[call["name"], call["args"]] for call in getattr(message, "tool_calls", None) or []]
+            normalized.append([message.type, " ".join(content.split()), calls])
+        return hashlib.blake2b(json.dumps(normalized, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        with self._lock:
+            message = self._entries.get(key)
+            if message is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # New message and tool call ids: the graph merges messages by id, and each
+        # tool result has to answer a call of the current turn
+        return AIMessage(message.content, tool_calls=[
+            {**call, "id": f"call_{uuid.uuid4().hex[:12]}"} for call in message.tool_calls
+        ])
+
+    def put(self, key: str, message: AIMessage):
+        with self._lock:
+            self._entries[key] = message
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CachedChatModel:
+    """Chat model wrapper answering repeated conversations from a ResponseCache"""
+
+    def __init__(self, model, cache: ResponseCache):
+        self.model = model
+        self.cache = cache
+
+    def invoke(self, messages: List[BaseMessage], config=None) -> AIMessage:
+        key = self.cache.key(messages)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.model.invoke(messages, config)
+            self.cache.put(key, response)
+        return response
+
+    async def ainvoke(self, messages: List[BaseMessage], config=None) -> AIMessage:
+        key = self.cache.key(messages)
+        response = self.cache.get(key)
+        if response is None:
+            response = await self.model.ainvoke(messages, config)
+            self.cache.put(key, response)
+        return response
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm(tools: list):
+    """The configured chat model with `tools` bound, built on the first call"""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            if LLM_PROVIDER not in PROVIDERS:
+                raise ValueError(f"Unknown LLM_PROVIDER {LLM_PROVIDER!r}; choose one of {', '.join(PROVIDERS)}")
+            model = PROVIDERS[LLM_PROVIDER]().bind_tools(tools)
+            _llm = CachedChatModel(model, ResponseCache(LLM_CACHE_SIZE)) if LLM_CACHE_SIZE > 0 else model
+    return _llm
@@ -0,0 +1,271 @@
+"""Prometheus metrics for the API, served in the text exposition format at /metrics.
+
+MetricsMiddleware times every request by route template and counts the SQL
+statements it ran: instrument_engine() hooks the engine's cursor events, which add
+to a per-request tally kept in a context variable (it reaches the threadpool, the
+async engine's greenlets and streamed responses). Password hashing, the agent's
+graph nodes and its tools record into the histograms below as well.
+
+Metrics are kept per process and every sample is labelled with the process's pid.
+With several workers behind one port a scrape reaches one of them at random, so
+either scrape each worker or run the API with a single worker.
+
+prometheus_client isn't a dependency, so the few metric types needed are kept here.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import anyio.to_thread
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    # Each worker process counts on its own, so its samples carry its pid
+    pairs.append(f'pid="{os.getpid()}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # Per label set: count per bucket (not cumulative), sum, count
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][next(i for i, bound in enumerate(self.buckets) if value <= bound)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, [list(counts), total, count]) for labels, (counts, total, count) in self._values.items())
+        lines = []
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Gauge(Metric):
+    """Gauge read from a callback at scrape time; None leaves it out"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        value = self.read()
+        return [] if value is None else [f"{self.name}{_labels((), ())} {_number(value)}"]
+
+REGISTRY: List[Metric] = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+def _threadpool(attribute: str) -> Callable[[], Optional[float]]:
+    def read():
+        # The limiter belongs to the event loop, so this only works on a scrape from it
+        try:
+            limiter = anyio.to_thread.current_default_thread_limiter()
+        except Exception:
+            return None
+        if attribute == "waiting":
+            return limiter.statistics().tasks_waiting
+        return getattr(limiter, attribute)
+    return read
+
+_in_flight = 0
+
+requests = register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, including streamed bodies",
+    ("method", "route", "status")))
+in_flight = register(Gauge("http_requests_in_flight", "Requests being served", lambda: _in_flight))
+request_statements = register(Histogram(
+    "http_request_db_statements", "SQL statements executed per request", ("route",), COUNT_BUCKETS))
+request_db_seconds = register(Histogram(
+    "http_request_db_seconds", "Time per request spent executing SQL", ("route",)))
+statements = register(Histogram(
+    "db_statement_duration_seconds", "Execution time of single SQL statements", buckets=STATEMENT_BUCKETS))
+register(Gauge("threadpool_threads_busy", "Threadpool threads running sync routes and blocking calls",
+               _threadpool("borrowed_tokens")))
+register(Gauge("threadpool_threads_limit", "Size of the threadpool", _threadpool("total_tokens")))
+register(Gauge("threadpool_tasks_waiting", "Calls queued for a threadpool thread", _threadpool("waiting")))
+password_hashing = register(Histogram(
+    "password_hash_duration_seconds", "bcrypt CPU time per call in the hashing pool", ("operation",)))
+password_hash_wait = register(Histogram(
+    "password_hash_wait_seconds", "Time a bcrypt call waited for a hashing worker", ("operation",)))
+password_hash_rejected = register(Counter(
+    "password_hash_rejected_total", "Password checks refused because the hashing queue was full"))
+agent_nodes = register(Histogram(
+    "agent_node_duration_seconds", "Time spent in each node of the agent graph", ("node",)))
+agent_tools = register(Histogram(
+    "agent_tool_duration_seconds",
+    "Time per tool run; batched writes of one agent step count as one run", ("tool",)))
+agent_tool_calls = register(Counter("agent_tool_calls_total", "Tool calls made by the agent", ("tool",)))
+
+# [statement count, seconds] of the request being served, None outside of requests
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+def instrument_engine(engine: Engine):
+    """Time every statement run through `engine` (for an AsyncEngine pass its sync_engine)"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["statement_started"].pop()
+        statements.observe(elapsed)
+        tally = _request_db.get()
+        if tally is not None:
+            tally[0] += 1
+            tally[1] += elapsed
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and SQL use by route template.
+    Routes are labelled by template ("/api/habits/{habit_id}"), unknown paths as "unmatched".
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        status = 500
+        tally = [0, 0.0]
+        token = _request_db.set(tally)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight += 1
+        sampled = self.profiler.start() if self.profiler else None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _in_flight -= 1
+            _request_db.reset(token)
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            requests.observe(elapsed, scope["method"], route, str(status))
+            request_statements.observe(tally[0], route)
+            request_db_seconds.observe(tally[1], route)
+            if sampled is not None:
+                self.profiler.finish(sampled, elapsed, scope["method"], route)
+
+class AgentMetricsHandler(BaseCallbackHandler):
+    """Callback timing the agent graph's nodes and tool runs; pass it in the run's callbacks"""
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[Histogram, str, float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata=None, **kwargs):
+        # Each node runs as a chain named after it; runnables inside it share the metadata.
+        # LangGraph's own "__start__" step only writes the input.
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node and not node.startswith("__"):
+            self._started[run_id] = (agent_nodes, node, time.perf_counter())
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        agent_tool_calls.inc(name)
+        self._started[run_id] = (agent_tools, name, time.perf_counter())
+
+    def _finish(self, run_id: UUID):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            histogram, label, at = started
+            histogram.observe(time.perf_counter() - at, label)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+agent_metrics = AgentMetricsHandler()
@@ -0,0 +1,273 @@
+"""Analytics over a columnar snapshot (services/snapshot.py) instead of the live tables.
+
+Answers the /analytics/* questions for one user with the same results as the API,
+as of the snapshot, plus aggregates across all users that would be full scans of
+the transactional tables: weekday patterns, per-tag completion rates and cohort
+activity curves. Every question is a handful of numpy kernels over whole columns
+(searchsorted, bincount, cumsum), with no Python loop per row or per habit:
+
+    completion rate   bincount of completions by habit, schedule bits @ weekday histogram
+    streaks           runs of completions split where scheduled days were missed
+    per tag           per-habit sums gathered through habit_tags and summed per tag
+    cohorts           unique (user, week since first completion) pairs counted per cohort
+
+    python -m services.offline_analytics cohorts --weeks 12
+"""
+import argparse
+import json
+import sys
+from datetime import date
+from typing import List, Optional
+import numpy as np
+from services.schedule import ALL_DAYS_MASK, WEEKDAYS, weekday_histogram
+from services.snapshot import Snapshot, open_snapshot
+
+# _BITS[mask, weekday] is 1 when the schedule includes the weekday, and
+# _PARTIAL[mask, weekday, n] counts scheduled days among n days starting on weekday
+_BITS = (np.arange(ALL_DAYS_MASK + 1)[:, None] >> np.arange(7)) & 1
+_POPCOUNT = _BITS.sum(axis=1)
+_PARTIAL = np.concatenate([
+    np.zeros((ALL_DAYS_MASK + 1, 7, 1), dtype=np.int64),
+    np.cumsum(np.stack([np.roll(_BITS, -weekday, axis=1) for weekday in range(7)], axis=1), axis=2),
+], axis=2)
+
+# date.toordinal() of 1970-01-01, the epoch of numpy's datetime64
+_EPOCH_ORDINAL = 719163
+
+def scheduled_days(masks: np.ndarray, first: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """Vectorized services.schedule.count_scheduled_days over arrays of masks and ranges"""
+    full_weeks, remainder = np.divmod(np.maximum(last - first + 1, 0), 7)
+    return full_weeks * _POPCOUNT[masks] + _PARTIAL[masks, (first - 1) % 7, remainder]
+
+def _rate(actual, expected) -> float:
+    return round(float(actual) / float(expected) * 100, 2) if expected else 0
+
+class OfflineAnalytics:
+    def __init__(self, snapshot: Snapshot):
+        self.snapshot = snapshot
+        self.as_of = date.fromisoformat(snapshot.manifest["as_of"])
+        habits = snapshot.table("habits")
+        self.habit_ids = habits["id"]
+        self.habit_users = habits["user_id"]
+        self.habit_names = habits["name"]
+        self.masks = habits["schedule_mask"].astype(np.int64)
+
+        # Completions are sorted by user and day; the habit of each one is kept as a
+        # position in the habit columns
+        completions = snapshot.table("completions")
+        users, days = completions["user_id"], completions["day_number"]
+        positions = np.minimum(np.searchsorted(self.habit_ids, completions["habit_id"]), max(len(self.habit_ids) - 1, 0))
+        known = self.habit_ids[positions] == completions["habit_id"] if len(self.habit_ids) else np.zeros(len(days), bool)
+        if not known.all():
+            # Tables are exported one after the other, so a habit deleted in between leaves orphans
+            users, days, positions = users[known], days[known], positions[known]
+        self.users, self.days, self.positions = users, days, positions
+
+    def _today(self, today: Optional[date]) -> int:
+        return (today or self.as_of).toordinal()
+
+    def _user_range(self, user_id: int) -> slice:
+        lo, hi = np.searchsorted(self.users, [user_id, user_id + 1])
+        return slice(lo, hi)
+
+    def _user_habits(self, user_id: int, habit_id: Optional[int] = None) -> np.ndarray:
+        selected = self.habit_users == user_id
+        if habit_id:
+            selected &= self.habit_ids == habit_id
+        return np.flatnonzero(selected)
+
+    def _expected(self, first: int, last: int) -> np.ndarray:
+        """Scheduled days of every habit in [first, last]"""
+        return _BITS[self.masks] @ np.array(weekday_histogram(first, last))
+
+    def _actual(self, first: int, last: int, user_id: Optional[int] = None) -> np.ndarray:
+        """Completions of every habit in [first, last], of one user or of everyone"""
+        if user_id is None:
+            positions = self.positions[(self.days >= first) & (self.days <= last)]
+        else:
+            # Within one user the completions are sorted by day
+            span = self._user_range(user_id)
+            lo, hi = np.searchsorted(self.days[span], [first, last + 1])
+            positions = self.positions[span][lo:hi]
+        return np.bincount(positions, minlength=len(self.habit_ids))
+
+    def _streaks(self, span: slice, today: int):
+        """(current, longest) streak of every habit from the completions in `span`, as
+        services/streaks.py computes them: only a missed scheduled day ends a run
+        """
+        current = np.zeros(len(self.habit_ids), dtype=np.int64)
+        longest = np.zeros(len(self.habit_ids), dtype=np.int64)
+        order = np.lexsort((self.days[span], self.positions[span]))
+        positions, days = self.positions[span][order], self.days[span][order].astype(np.int64)
+        if not len(days):
+            return current, longest
+        masks = np.where(self.masks[positions] == 0, ALL_DAYS_MASK, self.masks[positions])
+
+        new_habit = np.ones(len(days), dtype=bool)
+        new_habit[1:] = positions[1:] != positions[:-1]
+        starts = new_habit.copy()
+        starts[1:] |= scheduled_days(masks[1:], days[:-1] + 1, days[1:] - 1) > 0
+        run = np.cumsum(starts) - 1
+        lengths = np.bincount(run)
+        np.maximum.at(longest, positions[starts], lengths)
+
+        # A habit's last run is current unless a scheduled day before today was missed
+        last = np.flatnonzero(np.append(new_habit[1:], True))
+        still_open = scheduled_days(masks[last], days[last] + 1, np.full(len(last), today - 1)) == 0
+        current[positions[last]] = np.where(still_open, lengths[run[last]], 0)
+        return current, longest
+
+    def completion_rate(self, user_id: int, habit_id: Optional[int] = None, days: int = 30,
+                        today: Optional[date] = None) -> List[dict]:
+        """As GET /analytics/completion-rate"""
+        last = self._today(today)
+        first = last - days
+        habits = self._user_habits(user_id, habit_id)
+        expected = self._expected(first, last)[habits]
+        actual = self._actual(first, last, user_id)[habits]
+        return [{
+            "habit_id": int(self.habit_ids[position]),
+            "habit_name": str(self.habit_names[position]),
+            "expected_completions": int(expected[i]),
+            "actual_completions": int(actual[i]),
+            "completion_rate": _rate(actual[i], expected[i]),
+        } for i, position in enumerate(habits)]
+
+    def streaks(self, user_id: int, habit_id: Optional[int] = None, today: Optional[date] = None) -> List[dict]:
+        """As GET /analytics/streaks"""
+        current, longest = self._streaks(self._user_range(user_id), self._today(today))
+        return [{
+            "habit_id": int(self.habit_ids[position]),
+            "habit_name": str(self.habit_names[position]),
+            "current_streak": int(current[position]),
+            "longest_streak": int(longest[position]),
+        } for position in self._user_habits(user_id, habit_id)]
+
+    def summary(self, user_id: int, today: Optional[date] = None) -> dict:
+        """As GET /analytics/summary"""
+        span = self._user_range(user_id)
+        days = self.days[span]
+        today_number = self._today(today)
+        lo, hi = np.searchsorted(days, [today_number, today_number + 1])
+        return {
+            "total_habits": int(np.count_nonzero(self.habit_users == user_id)),
+            "total_completions": len(days),
+            "completed_today": int(hi - lo),
+        }
+
+    def tag_rates(self, user_id: Optional[int] = None, days: int = 30, today: Optional[date] = None) -> List[dict]:
+        """As GET /analytics/tags for one user, or summed by tag name over all users"""
+        last = self._today(today)
+        first = last - days
+        tags = self.snapshot.table("tags")
+        habit_tags = self.snapshot.table("habit_tags")
+        tag_positions = np.searchsorted(tags["id"], habit_tags["tag_id"])
+        habit_positions = np.searchsorted(self.habit_ids, habit_tags["habit_id"])
+        valid = (tag_positions < len(tags["id"])) & (habit_positions < len(self.habit_ids))
+        valid[valid] &= (tags["id"][tag_positions[valid]] == habit_tags["tag_id"][valid]) & (
+            self.habit_ids[habit_positions[valid]] == habit_tags["habit_id"][valid]
+        )
+        if user_id is not None:
+            valid[valid] &= tags["user_id"][tag_positions[valid]] == user_id
+        tag_positions, habit_positions = tag_positions[valid], habit_positions[valid]
+
+        expected = self._expected(first, last)[habit_positions]
+        actual = self._actual(first, last, user_id)[habit_positions]
+        names, groups = np.unique(tags["name"][tag_positions], return_inverse=True)
+        habits = np.bincount(groups, minlength=len(names))
+        expected = np.bincount(groups, weights=expected, minlength=len(names))
+        actual = np.bincount(groups, weights=actual, minlength=len(names))
+        return [{
+            "tag": str(name),
+            "habits": int(habits[i]),
+            "expected_completions": int(expected[i]),
+            "actual_completions": int(actual[i]),
+            "completion_rate": _rate(actual[i], expected[i]),
+        } for i, name in enumerate(names)]
+
+    def weekday_pattern(self, days: int = 90, today: Optional[date] = None) -> List[dict]:
+        """Completions per weekday over the last N days across all users, and the share of
+        the habits scheduled on that weekday which were done
+        """
+        last = self._today(today)
+        first = last - days
+        in_window = (self.days >= first) & (self.days <= last)
+        weekdays = (self.days[in_window] - 1) % 7
+        on_schedule = _BITS[self.masks[self.positions[in_window]], weekdays] == 1
+        completions = np.bincount(weekdays, minlength=7)
+        done = np.bincount(weekdays[on_schedule], minlength=7)
+        scheduled = _BITS[self.masks].sum(axis=0) * np.array(weekday_histogram(first, last))
+        return [{
+            "weekday": WEEKDAYS[weekday],
+            "completions": int(completions[weekday]),
+            "scheduled": int(scheduled[weekday]),
+            "scheduled_done": int(done[weekday]),
+            "completion_rate": _rate(done[weekday], scheduled[weekday]),
+        } for weekday in range(7)]
+
+    def cohort_curves(self, weeks: int = 12, today: Optional[date] = None) -> List[dict]:
+        """Users grouped by the month of their first completion, with the share of each
+        cohort completing anything in week 0, 1, ... after it. Weeks that have not
+        begun for every member count only the members who reached them; weeks nobody
+        reached are None.
+        """
+        today_number = self._today(today)
+        if not len(self.days):
+            return []
+        new_user = np.ones(len(self.users), dtype=bool)
+        new_user[1:] = self.users[1:] != self.users[:-1]
+        user_index = np.cumsum(new_user) - 1
+        first = self.days[new_user].astype(np.int64)  # Days are sorted within each user
+
+        week = (self.days - first[user_index]) // 7
+        kept = week < weeks
+        active = np.unique(user_index[kept] * weeks + week[kept])
+        months = (first - _EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+        cohorts, cohort_of_user = np.unique(months, return_inverse=True)
+
+        size = len(cohorts) * weeks
+        active_counts = np.bincount(cohort_of_user[active // weeks] * weeks + active % weeks, minlength=size)
+        reached = first[:, None] + 7 * np.arange(weeks) <= today_number
+        reached_counts = np.bincount((cohort_of_user[:, None] * weeks + np.arange(weeks))[reached], minlength=size)
+        active_counts = active_counts.reshape(-1, weeks)
+        reached_counts = reached_counts.reshape(-1, weeks)
+        return [{
+            "cohort": str(cohort),
+            "users": int(np.count_nonzero(cohort_of_user == i)),
+            "active": [_rate(active_counts[i, k], reached_counts[i, k]) if reached_counts[i, k] else None
+                       for k in range(weeks)],
+        } for i, cohort in enumerate(cohorts)]
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(prog="python -m services.offline_analytics",
+                                     description="Analytics over the current snapshot, printed as JSON")
+    parser.add_argument("report", choices=["weekdays", "tags", "cohorts", "user"])
+    parser.add_argument("--user", type=int, help="User id, required by the user report and narrowing tags")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--snapshot", help="Snapshot root directory (default: SNAPSHOT_DIR)")
+    args = parser.parse_args(argv)
+    snapshot = open_snapshot(args.snapshot) if args.snapshot else open_snapshot()
+    if snapshot is None:
+        parser.error("no snapshot found; run `python -m services.snapshot` first")
+    analytics = OfflineAnalytics(snapshot)
+
+    if args.report == "weekdays":
+        result = analytics.weekday_pattern(args.days)
+    elif args.report == "tags":
+        result = analytics.tag_rates(args.user, args.days)
+    elif args.report == "cohorts":
+        result = analytics.cohort_curves(args.weeks)
+    else:
+        if args.user is None:
+            parser.error("the user report needs --user")
+        result = {
+            "summary": analytics.summary(args.user),
+            "completion_rate": analytics.completion_rate(args.user, days=args.days),
+            "streaks": analytics.streaks(args.user),
+        }
+    print(json.dumps({"snapshot": snapshot.manifest["name"], "as_of": analytics.as_of.isoformat(), "result": result}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
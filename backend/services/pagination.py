@@ -0,0 +1,35 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row on a page, so the next page is a seek
+on the primary key rather than an OFFSET scan over every earlier row.
+"""
+from fastapi import HTTPException, Response
+from typing import Optional, Tuple
+
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(*values: int) -> str:
+    return ".".join(str(value) for value in values)
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[Tuple[int, ...]]:
+    if cursor is None:
+        return None
+    try:
+        values = tuple(int(part) for part in cursor.split("."))
+    except ValueError:
+        values = ()
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def page_limit(limit: int) -> int:
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+def set_next_cursor(response: Response, rows: list, limit: int, key):
+    """Advertise the next page when this one came back full"""
+    if len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
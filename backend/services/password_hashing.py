@@ -0,0 +1,109 @@
+"""bcrypt hashing in a dedicated, size-limited process pool.
+
+bcrypt burns 100-300 ms of CPU per call on purpose. Running it in worker processes
+keeps that work off the event loop, the request threadpool and the GIL; the workers
+only load services/hashing_worker.py. At most HASH_QUEUE_LIMIT calls may be running
+or queued at once; further calls fail fast with a 503 instead of queueing behind a
+login burst.
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from config import BCRYPT_ROUNDS, HASH_WORKERS, HASH_QUEUE_LIMIT
+from services import hashing_worker, metrics
+
+# Latencies kept for the percentiles reported by metrics()
+LATENCY_WINDOW = 1000
+
+class HashingPool:
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn rather than fork: the API process holds threads and pooled connections
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=hashing_worker.configure, initargs=(BCRYPT_ROUNDS,)
+            )
+        return self._executor
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in a worker; fn returns (result, seconds spent hashing)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_limit)
+        if self._slots.locked():
+            self.rejected += 1
+            metrics.password_hash_rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password checks in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        async with self._slots:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            started = time.perf_counter()
+            try:
+                result, hash_time = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+            finally:
+                self.in_flight -= 1
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self.hash_seconds += hash_time
+        self.wait_seconds += max(elapsed - hash_time, 0.0)
+        self._latencies.append(elapsed)
+        operation = fn.__name__.split("_")[0]  # "hash" or "verify"
+        metrics.password_hashing.observe(hash_time, operation)
+        metrics.password_hash_wait.observe(max(elapsed - hash_time, 0.0), operation)
+        return result
+
+    def metrics(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000
+
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queue_depth": self.in_flight,
+            "max_queue_depth": self.max_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_hash_ms": self.hash_seconds / self.completed * 1000 if self.completed else None,
+            "avg_wait_ms": self.wait_seconds / self.completed * 1000 if self.completed else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_QUEUE_LIMIT)
+
+async def hash_password(password: str) -> str:
+    return await hashing_pool.run(hashing_worker.hash_password, password)
+
+async def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; the second value is a replacement hash when the stored one is outdated"""
+    return await hashing_pool.run(hashing_worker.verify_and_update, password, hashed)
@@ -0,0 +1,95 @@
+"""Sampling profiler for slow requests (PROFILE_SLOW_REQUESTS_MS > 0).
+
+While requests are in flight a background thread samples the stacks of all busy
+threads every PROFILE_INTERVAL_MS and adds them to each in-flight request. When a
+request took longer than the threshold its samples are written to PROFILE_DIR in
+the collapsed format ("frame;frame;frame count" per line), ready for flamegraph.pl
+or speedscope. Threads blocked waiting for work are skipped. The sampler can't tell
+which request a thread is working for, so requests that overlap share samples:
+profile a quiet instance, or read the stacks of a busy one with that in mind.
+"""
+import linecache
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# Innermost frames of threads that are idle rather than working for a request
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("runners.py", "run"),
+    ("base_events.py", "run_until_complete"),
+    ("base_events.py", "run_forever"),
+}
+# Lines blocking on a C-level queue, e.g. in concurrent.futures and aiosqlite workers
+IDLE_LINE = re.compile(r"\b(?:\w*queue|_tx)\.get\(")
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame) -> Optional[str]:
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+        return None
+    if IDLE_LINE.search(linecache.getline(code.co_filename, frame.f_lineno)):
+        return None
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms: float, interval_ms: float, directory: str):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.written = 0
+        self._active: Dict[int, Counter] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """Begin collecting samples for a request; returns the handle for finish()"""
+        with self._lock:
+            self._next_id += 1
+            self._active[self._next_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return self._next_id
+
+    def finish(self, handle: int, elapsed: float, method: str, route: str) -> Optional[str]:
+        """Stop collecting; for a slow request write its stacks and return the file's path"""
+        with self._lock:
+            stacks = self._active.pop(handle)
+            if not self._active:
+                self._wake.clear()
+        if elapsed < self.threshold or not stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{handle}-{method}-{slug}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        self.written += 1
+        return path
+
+    def _sample(self):
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            stacks = [stack for ident, frame in sys._current_frames().items()
+                      if ident != own and (stack := _collapse(frame)) is not None]
+            with self._lock:
+                for collected in self._active.values():
+                    collected.update(stacks)
+            time.sleep(self.interval)
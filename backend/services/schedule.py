@@ -0,0 +1,70 @@
+from datetime import date
+
+# Weekday names in date.weekday() order; bit N of a schedule mask is WEEKDAYS[N]
+WEEKDAYS = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+ALL_DAYS_MASK = (1 << len(WEEKDAYS)) - 1
+
+def weekday_mask(repeat_frequency: str) -> int:
+    """Convert a "MONDAY,TUESDAY,..." string into a 7-bit weekday mask"""
+    mask = 0
+    if repeat_frequency:
+        value = repeat_frequency.upper()
+        for i, day in enumerate(WEEKDAYS):
+            if day in value:
+                mask |= 1 << i
+    return mask
+
+def schedule_string(mask: int) -> str:
+    """Convert a weekday mask back into a "MONDAY,TUESDAY,..." string"""
+    return ",".join(day for i, day in enumerate(WEEKDAYS) if mask >> i & 1)
+
+def weekday_bit(value: date) -> int:
+    """Mask bit for the weekday of a date"""
+    return 1 << value.weekday()
+
+def month_key(day_number: int) -> int:
+    """Calendar month of a day number as year * 100 + month, e.g. 202403"""
+    value = date.fromordinal(day_number)
+    return value.year * 100 + value.month
+
+def weekday_of(day_number: int) -> int:
+    """Weekday (0 = Monday) of a proleptic Gregorian ordinal, as returned by date.toordinal()"""
+    # date.fromordinal(1) is Monday, 0001-01-01
+    return (day_number - 1) % 7
+
+def is_scheduled(mask: int, day_number: int) -> bool:
+    return bool(mask >> weekday_of(day_number) & 1)
+
+def count_scheduled_days(mask: int, first: int, last: int) -> int:
+    """Count days in the inclusive ordinal range [first, last] that fall on a scheduled weekday"""
+    if last < first or not mask:
+        return 0
+    total = last - first + 1
+    full_weeks, remainder = divmod(total, 7)
+    count = full_weeks * bin(mask).count("1")
+    weekday = weekday_of(first)
+    for offset in range(remainder):
+        if mask >> ((weekday + offset) % 7) & 1:
+            count += 1
+    return count
+
+def to_day_number(value) -> int:
+    """Accept a date or ISO date string and return its ordinal"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+def weekday_histogram(first: int, last: int) -> list:
+    """Number of Mondays, Tuesdays, ... in the inclusive ordinal range [first, last]"""
+    if last < first:
+        return [0] * 7
+    full_weeks, remainder = divmod(last - first + 1, 7)
+    histogram = [full_weeks] * 7
+    weekday = weekday_of(first)
+    for offset in range(remainder):
+        histogram[(weekday + offset) % 7] += 1
+    return histogram
+
+def expected_days(histogram: list, mask: int) -> int:
+    """Scheduled days in a window, given that window's weekday histogram"""
+    return sum(count for i, count in enumerate(histogram) if mask >> i & 1)
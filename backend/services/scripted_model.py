@@ -0,0 +1,169 @@
+"""Deterministic, rule-based chat model for running the agent offline.
+
+It understands the handful of requests the habit tools cover ("add a habit for
+reading on weekdays #books", "mark read and run done yesterday", "delete habit 3",
+"what habits do I have tomorrow?") and answers them with the same tool calls a real
+model would make, resolving habit names through the habit list in the system
+prompt. After the tools ran it reports their results. No network, no API key, and
+the same conversation always produces the same reply, which makes it suitable for
+demos, load tests and benchmarks (LLM_PROVIDER=scripted).
+"""
+import json
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from services.schedule import WEEKDAYS
+
+HELP = ("I can add habits (\"add a habit for reading on weekdays #books\"), complete them "
+        "(\"mark reading done today\"), delete them (\"delete habit 3\") and show what is "
+        "scheduled (\"what habits do I have tomorrow?\").")
+
+# Lines of the rendered habit list, see services/habit_context.py
+HABIT_LINE = re.compile(r"^#(\d+) (.+?): ", re.MULTILINE)
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+HABIT_ID = re.compile(r"(?:#|\bhabit\s+)(\d+)\b")
+QUOTED = re.compile(r"[\"']([^\"']+)[\"']")
+# Schedule words that end the habit name in "add a habit for <name> on/every ..."
+NAME_END = re.compile(r"\s+(?:on|every|each|daily|weekdays?|weekends?)\b|\s+#|$")
+
+def _target_date(text: str) -> date:
+    today = date.today()
+    if match := ISO_DATE.search(text):
+        try:
+            return date(*map(int, match.groups()))
+        except ValueError:
+            pass  # Not a real date, e.g. 2024-02-30; fall back to the words or today
+    if "yesterday" in text:
+        return today - timedelta(days=1)
+    if "tomorrow" in text:
+        return today + timedelta(days=1)
+    return today
+
+def _weekdays(text: str) -> List[int]:
+    """DayOfWeek values (1 = Monday) mentioned in the text, every day if none are"""
+    if "weekday" in text:
+        return [1, 2, 3, 4, 5]
+    if "weekend" in text:
+        return [6, 7]
+    days = [i + 1 for i, day in enumerate(WEEKDAYS) if re.search(rf"\b{day.lower()[:3]}", text)]
+    return days or [1, 2, 3, 4, 5, 6, 7]
+
+def _habits(messages: List[BaseMessage]) -> Dict[int, str]:
+    system = next((message.content for message in messages if message.type == "system"), "")
+    return {int(habit_id): name.lower() for habit_id, name in HABIT_LINE.findall(system)}
+
+def _mentioned_habits(text: str, habits: Dict[int, str]) -> List[int]:
+    ids = [int(habit_id) for habit_id in HABIT_ID.findall(text)]
+    # Longest names first, so "evening run" wins over "run"
+    for habit_id, name in sorted(habits.items(), key=lambda item: -len(item[1])):
+        if habit_id not in ids and re.search(rf"\b{re.escape(name)}\b", text):
+            ids.append(habit_id)
+            text = text.replace(name, " ")
+    return ids
+
+def _call(tool: str, **args) -> dict:
+    return {"name": tool, "args": args, "id": ""}
+
+def _respond(messages: List[BaseMessage]) -> AIMessage:
+    message = _decide(messages)
+    # Deterministic ids, distinct between the model turns of one run
+    for i, call in enumerate(message.tool_calls):
+        call["id"] = f"call_{len(messages)}_{i}"
+    return message
+
+def _decide(messages: List[BaseMessage]) -> AIMessage:
+    if messages and messages[-1].type == "tool":
+        return AIMessage(_report(messages))
+
+    request = next((message for message in reversed(messages) if message.type == "human"), None)
+    original = request.content.strip() if request else ""
+    text = original.lower()
+    habits = _habits(messages)
+    day = _target_date(text)
+    date_args = {"day": day.day, "month": day.month, "year": day.year}
+
+    if re.search(r"\b(add|create|new|start)\b", text):
+        if match := QUOTED.search(original):
+            name = match.group(1)
+        else:
+            after = re.split(r"\bhabits?\b(?:\s+(?:for|of|to|called|named))?\s*", original, maxsplit=1, flags=re.IGNORECASE)
+            rest = after[1] if len(after) > 1 else original
+            name = rest[:NAME_END.search(rest).start()].strip(" .,!")
+        if name:
+            tags = re.findall(r"#(\w+)", original)
+            return AIMessage("", tool_calls=[_call("add_habit_tool", name=name, repeat_frequency=_weekdays(text), tags=tags)])
+    if re.search(r"\b(delete|remove)\b", text):
+        calls = [_call("delete_habit_tool", habit_id=habit_id) for habit_id in _mentioned_habits(text, habits)]
+        if calls:
+            return AIMessage("", tool_calls=calls)
+        return AIMessage("Which habit should I delete? Tell me its name or number.")
+    if re.search(r"\b(complete|completed|done|did|mark|finished|check off)\b", text):
+        calls = [_call("complete_habit_tool", habit_id=habit_id, **date_args) for habit_id in _mentioned_habits(text, habits)]
+        if calls:
+            return AIMessage("", tool_calls=calls)
+        return AIMessage("Which habit did you complete? Tell me its name or number.")
+    if re.search(r"\b(what|which|show|list|scheduled|today|tomorrow)\b", text):
+        return AIMessage("", tool_calls=[_call("habits_for_date_tool", **date_args)])
+    return AIMessage(HELP)
+
+def _report(messages: List[BaseMessage]) -> str:
+    """Summarize the tool results that followed the last model turn"""
+    results = []
+    for message in reversed(messages):
+        if message.type != "tool":
+            break
+        results.append(message)
+    lines = []
+    for message in reversed(results):
+        if message.name == "habits_for_date_tool":
+            habits = message.content
+            if isinstance(habits, str):
+                try:
+                    habits = json.loads(habits)
+                except ValueError:
+                    habits = None
+            if isinstance(habits, list):
+                if not habits:
+                    lines.append("Nothing is scheduled for that day.")
+                for habit in habits:
+                    lines.append(f"- {habit['name']} (#{habit['id']}){' - done' if habit.get('completed') else ''}")
+                continue
+        if message.name == "add_habit_tool":
+            lines.append(f"Added habit #{message.content}.")
+            continue
+        lines.append(str(message.content))
+    return "\n".join(lines) or "Done."
+
+class ScriptedChatModel(BaseChatModel):
+    """Rule-based chat model that issues the habit tools' calls, see the module docstring"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        # The rules already target the habit tools by name
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=_respond(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = _respond(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ]))
+            return
+        for token in re.split(r"(\s+)", message.content):
+            if token:
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
@@ -0,0 +1,214 @@
+"""Columnar snapshots of the habit tables for offline analytics.
+
+export() reads completions, habits, tags and habit_tags in one transaction and copies
+them column by column into a new directory under SNAPSHOT_DIR, then points
+SNAPSHOT_DIR/CURRENT at it, so readers only ever see complete snapshots. With pyarrow installed each table is an Arrow IPC file
+(memory-mapped when read) or, with SNAPSHOT_FORMAT=parquet, a Parquet file. Without
+it every column is a .npy file, which numpy memory-maps as well. Completions are
+stored sorted by user and day, the order of ix_completions_user_day, so reading them
+is an index scan and per-user ranges in the snapshot are a binary search.
+
+Run `python -m services.snapshot` from the backend directory to export once, or set
+SNAPSHOT_INTERVAL_SECONDS to export periodically from the API process. Every worker
+schedules the export, and a lock file under SNAPSHOT_DIR lets one of them run it per
+interval.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import date, datetime
+from typing import Dict, Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from database import engine as default_engine
+from models.habit import Completion, Habit, HabitTag, Tag
+from config import SNAPSHOT_DIR, SNAPSHOT_FORMAT, SNAPSHOT_KEEP
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every worker exports
+    fcntl = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows fetched per round trip while exporting
+EXPORT_BATCH_SIZE = 50000
+
+# Table name -> (query, column dtypes); "str" columns become numpy unicode arrays.
+# Rows without an owner (orphans from before migration 4, user_scoping) are left out.
+TABLES = {
+    "completions": (
+        select(Completion.user_id, Completion.habit_id, Completion.day_number).where(
+            Completion.user_id.isnot(None)
+        ).order_by(Completion.user_id, Completion.day_number),
+        {"user_id": "int32", "habit_id": "int32", "day_number": "int32"},
+    ),
+    "habits": (
+        select(Habit.id, Habit.user_id, Habit.schedule_mask, Habit.name).where(
+            Habit.user_id.isnot(None)
+        ).order_by(Habit.id),
+        {"id": "int32", "user_id": "int32", "schedule_mask": "int8", "name": "str"},
+    ),
+    "tags": (
+        select(Tag.id, Tag.user_id, Tag.name).order_by(Tag.id),
+        {"id": "int32", "user_id": "int32", "name": "str"},
+    ),
+    "habit_tags": (
+        select(HabitTag.habit_id, HabitTag.tag_id).order_by(HabitTag.habit_id),
+        {"habit_id": "int32", "tag_id": "int32"},
+    ),
+}
+FORMATS = ("arrow", "parquet", "npy")
+EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+def resolve_format(name: str = SNAPSHOT_FORMAT) -> str:
+    """The snapshot format for a SNAPSHOT_FORMAT value; "auto" is arrow when pyarrow is installed"""
+    if name == "auto":
+        return "arrow" if pyarrow is not None else "npy"
+    if name not in FORMATS:
+        raise ValueError(f"Unknown SNAPSHOT_FORMAT {name!r}; choose auto, {', '.join(FORMATS)}")
+    if name != "npy" and pyarrow is None:
+        raise RuntimeError(f"SNAPSHOT_FORMAT={name} needs the pyarrow package")
+    return name
+
+def _read_columns(conn, query, dtypes: Dict[str, str]) -> Dict[str, np.ndarray]:
+    chunks = {name: [] for name in dtypes}
+    result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(query)
+    for rows in result.partitions():
+        for (name, dtype), values in zip(dtypes.items(), zip(*rows)):
+            chunks[name].append(np.array(values, dtype=str) if dtype == "str" else np.array(values, dtype=dtype))
+    return {
+        name: np.concatenate(parts) if parts else np.array([], dtype=str if dtype == "str" else dtype)
+        for (name, dtype), parts in zip(dtypes.items(), chunks.values())
+    }
+
+def _write_table(directory: str, name: str, columns: Dict[str, np.ndarray], format: str):
+    if format == "npy":
+        os.makedirs(os.path.join(directory, name))
+        for column, values in columns.items():
+            np.save(os.path.join(directory, name, f"{column}.npy"), values)
+        return
+    table = pyarrow.table(columns)
+    path = os.path.join(directory, name + EXTENSIONS[format])
+    if format == "parquet":
+        pyarrow.parquet.write_table(table, path)
+    else:
+        with pyarrow.OSFile(path, "wb") as sink, pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def export(engine: Engine = default_engine, root: str = SNAPSHOT_DIR, format: str = SNAPSHOT_FORMAT, keep: int = SNAPSHOT_KEEP) -> dict:
+    """Write a new snapshot, make it current and drop all but the newest `keep`. Returns its manifest."""
+    format = resolve_format(format)
+    started = time.perf_counter()
+    name = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    manifest = {"name": name, "format": format, "as_of": date.today().isoformat(), "rows": {}}
+    # One transaction for all tables, so a snapshot never holds completions of habits
+    # it lacks. pysqlite only opens transactions before writes, hence the explicit
+    # BEGIN: under WAL it reads one state of the database without blocking writers.
+    isolation = {} if engine.dialect.name == "sqlite" else {"isolation_level": "REPEATABLE READ"}
+    with engine.connect().execution_options(**isolation) as conn, conn.begin():
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN")
+        for table, (query, dtypes) in TABLES.items():
+            columns = _read_columns(conn, query, dtypes)
+            _write_table(directory, table, columns, format)
+            manifest["rows"][table] = len(next(iter(columns.values())))
+    manifest["seconds"] = round(time.perf_counter() - started, 3)
+    with open(os.path.join(directory, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    # Switch readers over atomically, then remove the oldest snapshots
+    pointer = os.path.join(root, "CURRENT")
+    with open(pointer + ".tmp", "w") as file:
+        file.write(name)
+    os.replace(pointer + ".tmp", pointer)
+    snapshots = sorted(entry for entry in os.listdir(root) if os.path.isfile(os.path.join(root, entry, "manifest.json")))
+    for old in snapshots[:-max(keep, 1)]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return manifest
+
+class Snapshot:
+    """A snapshot directory; tables are loaded (memory-mapped where the format allows) on first use"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as file:
+            self.manifest = json.load(file)
+        self._tables: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def table(self, name: str) -> Dict[str, np.ndarray]:
+        if name not in self._tables:
+            self._tables[name] = self._load(name)
+        return self._tables[name]
+
+    def _load(self, name: str) -> Dict[str, np.ndarray]:
+        format = self.manifest["format"]
+        if format == "npy":
+            return {
+                column: np.load(os.path.join(self.directory, name, f"{column}.npy"), mmap_mode="r")
+                for column in TABLES[name][1]
+            }
+        if pyarrow is None:
+            raise RuntimeError(f"Reading a {format} snapshot needs the pyarrow package")
+        path = os.path.join(self.directory, name + EXTENSIONS[format])
+        if format == "parquet":
+            table = pyarrow.parquet.read_table(path, memory_map=True)
+        else:
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+        return {column: table.column(column).to_numpy() for column in table.column_names}
+
+def open_snapshot(root: str = SNAPSHOT_DIR) -> Optional[Snapshot]:
+    """The current snapshot under `root`, or None if nothing was exported yet"""
+    try:
+        with open(os.path.join(root, "CURRENT")) as file:
+            return Snapshot(os.path.join(root, file.read().strip()))
+    except FileNotFoundError:
+        return None
+
+def export_if_due(interval: float, root: str = SNAPSHOT_DIR, **options) -> Optional[dict]:
+    """export() unless another process is exporting or made the current snapshot within the interval"""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".export.lock"), "a") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        try:
+            age = time.time() - os.path.getmtime(os.path.join(root, "CURRENT"))
+        except FileNotFoundError:
+            age = None
+        if age is not None and age < 0.9 * interval:
+            return None
+        return export(root=root, **options)
+
+async def export_periodically(interval: float):
+    """Run export_if_due() every `interval` seconds on a worker thread"""
+    while True:
+        try:
+            await asyncio.to_thread(export_if_due, interval)
+        except Exception:
+            logging.getLogger(__name__).exception("Snapshot export failed")
+        await asyncio.sleep(interval)
+
+def main(argv) -> int:
+    manifest = export(format=argv[0] if argv else SNAPSHOT_FORMAT)
+    rows = ", ".join(f"{count} {table}" for table, count in manifest["rows"].items())
+    print(f"Exported {rows} to {os.path.join(SNAPSHOT_DIR, manifest['name'])} ({manifest['format']}) "
+          f"in {manifest['seconds']}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
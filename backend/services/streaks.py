@@ -0,0 +1,33 @@
+from typing import List, Optional, Tuple
+from services.schedule import ALL_DAYS_MASK, count_scheduled_days
+
+def run_lengths(day_numbers: List[int], mask: int) -> Tuple[int, int]:
+    """Return (last_run, longest_run) for ascending completion day numbers.
+
+    Only scheduled days can break a streak: two completions belong to the same run
+    when no scheduled day falls strictly between them.
+    """
+    if not mask:
+        mask = ALL_DAYS_MASK
+
+    longest = 0
+    run = 0
+    previous = None
+    for day in day_numbers:
+        if previous is not None and count_scheduled_days(mask, previous + 1, day - 1) == 0:
+            run += 1
+        else:
+            run = 1
+        longest = max(longest, run)
+        previous = day
+    return run, longest
+
+def current_streak(last_run: int, last_day: Optional[int], mask: int, today: int) -> int:
+    """The run ending at last_day is still current unless a scheduled day before today was missed.
+    Today itself is still open, so it never breaks a streak. last_day must not be after today.
+    """
+    if not last_run or last_day is None:
+        return 0
+    if count_scheduled_days(mask or ALL_DAYS_MASK, last_day + 1, today - 1) > 0:
+        return 0
+    return last_run
@@ -0,0 +1,68 @@
+"""Normalized habit tags.
+
+Habit.tags keeps the "tag1,tag2" string API clients send and get back. Every write
+of it also stores the habit's tags as habit_tags rows pointing at the user's tags,
+so habits are filtered and grouped by tag in SQL instead of by splitting the string
+of every row. Tag names are matched trimmed and case-insensitively.
+"""
+from typing import Dict, Iterable, List, Optional, Union
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Query, Session
+from database import insert_ignoring_conflicts
+from models.habit import Habit, HabitTag, Tag
+
+def parse_tags(value: Union[str, Iterable[str], None]) -> List[str]:
+    """Normalized, de-duplicated tag names from a "tag1,tag2" string or a list of names"""
+    if not value:
+        return []
+    parts = value.split(",") if isinstance(value, str) else value
+    names = []
+    for part in parts:
+        name = part.strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def set_habit_tags(db: Session, user_id: int, habit_id: int, value: Union[str, Iterable[str], None]):
+    """Replace a habit's habit_tags rows in the caller's transaction, creating missing tags"""
+    names = parse_tags(value)
+    db.execute(delete(HabitTag).where(HabitTag.habit_id == habit_id))
+    if not names:
+        return
+    db.execute(insert_ignoring_conflicts(db, Tag), [{"user_id": user_id, "name": name} for name in names])
+    tag_ids = db.scalars(select(Tag.id).where(Tag.user_id == user_id, Tag.name.in_(names))).all()
+    db.execute(insert(HabitTag), [{"habit_id": habit_id, "tag_id": tag_id} for tag_id in tag_ids])
+
+def remove_habit_tags(db: Session, habit_id: int):
+    db.execute(delete(HabitTag).where(HabitTag.habit_id == habit_id))
+
+def tagged_habit_ids(user_id: int, tags: Iterable[str]):
+    """Subquery of the user's habits carrying every one of `tags`, served by ix_habit_tags_tag_habit"""
+    names = parse_tags(tags)
+    return select(HabitTag.habit_id).join(Tag, Tag.id == HabitTag.tag_id).where(
+        Tag.user_id == user_id, Tag.name.in_(names)
+    ).group_by(HabitTag.habit_id).having(func.count() == len(names))
+
+def filter_by_tags(query: Query, user_id: int, tags: Optional[List[str]]) -> Query:
+    """Narrow a query over Habit to habits with all of `tags`; no tags leaves it as is"""
+    if not parse_tags(tags):
+        return query
+    return query.filter(Habit.id.in_(tagged_habit_ids(user_id, tags)))
+
+def tags_by_habit(db: Session, habit_ids: List[int]) -> Dict[int, List[str]]:
+    """Tag names of each habit, read from habit_tags in one query"""
+    result = {habit_id: [] for habit_id in habit_ids}
+    if habit_ids:
+        rows = db.execute(select(HabitTag.habit_id, Tag.name).join(Tag, Tag.id == HabitTag.tag_id).where(
+            HabitTag.habit_id.in_(habit_ids)
+        ).order_by(HabitTag.habit_id, Tag.name))
+        for habit_id, name in rows:
+            result[habit_id].append(name)
+    return result
+
+def tag_counts(db: Session, user_id: int) -> List[dict]:
+    """The user's tags with the number of habits carrying each"""
+    rows = db.execute(select(Tag.name, func.count(HabitTag.habit_id)).join(
+        HabitTag, HabitTag.tag_id == Tag.id
+    ).where(Tag.user_id == user_id).group_by(Tag.id, Tag.name).order_by(Tag.name))
+    return [{"tag": name, "habits": count} for name, count in rows]
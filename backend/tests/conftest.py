@@ -0,0 +1,49 @@
+"""Shared test setup: a throwaway database, fast password hashing and the offline chat model.
+
+config.py reads the environment when it is first imported, so the settings are made
+here, before any test module imports the app.
+"""
+import itertools
+import os
+import sys
+import tempfile
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="habit-tracker-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_workdir}/habits.db",
+    "CHECKPOINT_DB": os.path.join(_workdir, "checkpoints.db"),
+    "DB_MODE": "sync",
+    "BCRYPT_ROUNDS": "4",
+    "LLM_PROVIDER": "scripted",
+    "LLM_CACHE_SIZE": "0",
+    "CHECKPOINT_COMPACT_INTERVAL_SECONDS": "0",
+    "SNAPSHOT_INTERVAL_SECONDS": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_emails = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    """The app behind a TestClient, started up and shut down once per test run"""
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+def _register(client) -> dict:
+    email = f"user{next(_emails)}@test"
+    client.post("/api/auth/register", json={"email": email, "password": "secret"}).raise_for_status()
+    token = client.post("/api/auth/login", json={"email": email, "password": "secret"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization headers of a newly registered user"""
+    return _register(client)
+
+@pytest.fixture
+def other_auth_headers(client):
+    """Authorization headers of a second new user, for checks across users"""
+    return _register(client)
@@ -0,0 +1,43 @@
+from fastapi import Request
+from services.analytics_cache import AnalyticsCache, MemoryBackend
+
+def _request(etag: str = None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/api/analytics/summary", "query_string": b"", "headers": headers})
+
+def test_not_modified_needs_a_cached_entry():
+    backend = MemoryBackend(max_entries=10, ttl=60)
+    cache = AnalyticsCache(backend)
+    response = cache.response(_request(), 1, lambda: {"total": 1})
+    etag = response.headers["ETag"]
+    assert cache.response(_request(etag), 1, lambda: {"total": 1}).status_code == 304
+
+    # The entry expired, e.g. while another worker handled a write: the body is sent again
+    backend._entries.clear()
+    response = cache.response(_request(etag), 1, lambda: {"total": 2})
+    assert response.status_code == 200
+    assert response.body == b'{"total": 2}'
+
+def test_user_versions_are_bounded_and_never_repeat():
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    history = {}
+    for user_id in ("1", "2", "3", "1", "4", "5"):
+        history.setdefault(user_id, []).append(backend.version(user_id))
+        backend.bump(user_id)
+        assert backend.version(user_id) not in history[user_id]
+        history[user_id].append(backend.version(user_id))
+    assert list(backend._versions) == ["4", "5"]
+    # Users 1 to 3 were evicted, yet none of them gets back a version it had before
+    for user_id in ("1", "2", "3"):
+        assert backend.version(user_id) not in history[user_id]
+
+def test_writes_invalidate_cached_responses(client, auth_headers):
+    first = client.get("/api/analytics/summary", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert client.get("/api/analytics/summary", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    client.post("/api/habits/", json={"name": "Walk", "repeat_frequency": "MONDAY"}, headers=auth_headers).raise_for_status()
+    second = client.get("/api/analytics/summary", headers={**auth_headers, "If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.json()["total_habits"] == first.json()["total_habits"] + 1
+    assert second.headers["ETag"] != etag
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import date
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from routers import analytics, habits
+from routers.async_routes import asyncify
+from services import bitmaps
+
+@pytest.fixture
+def async_client(client):
+    """The habits and analytics routers as DB_MODE=async serves them"""
+    app = FastAPI()
+    app.include_router(asyncify(habits.router), prefix="/api")
+    app.include_router(asyncify(analytics.router), prefix="/api")
+    with TestClient(app) as async_client:
+        yield async_client
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def test_cpu_bound_work_runs_off_the_event_loop(async_client, auth_headers, monkeypatch):
+    loop_checks = []
+    build_calendar, date_grid = bitmaps._build_calendar, habits._date_grid
+
+    def checked(function):
+        def wrapper(*args):
+            loop_checks.append(_on_event_loop())
+            return function(*args)
+        return wrapper
+
+    monkeypatch.setattr(bitmaps, "_build_calendar", checked(build_calendar))
+    monkeypatch.setattr(habits, "_date_grid", checked(date_grid))
+    habit = async_client.post("/api/habits/", headers=auth_headers, json={
+        "name": "Read", "repeat_frequency": "MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY,SATURDAY,SUNDAY",
+    }).json()
+    today = date.today().isoformat()
+
+    calendar = async_client.get("/api/analytics/calendar", headers=auth_headers,
+                                params={"start": today, "end": today}).json()
+    assert calendar["habits"][0]["habit_id"] == habit["id"]
+    grid = async_client.get(f"/api/habits/date/{today}/{today}", headers=auth_headers).json()
+    assert grid == [{"date": today, "habits": [{**habit, "completed": False}]}]
+    summary = async_client.get("/api/analytics/summary", headers=auth_headers)
+    assert summary.json() == {"total_habits": 1, "total_completions": 0, "completed_today": 0}
+    assert async_client.get("/api/analytics/summary", headers={
+        **auth_headers, "If-None-Match": summary.headers["ETag"],
+    }).status_code == 304
+    assert loop_checks == [False, False]
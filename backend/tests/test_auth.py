@@ -0,0 +1,11 @@
+def test_hashing_metrics_need_a_user(client, auth_headers):
+    assert client.get("/api/auth/hashing-metrics").status_code in (401, 403)
+    metrics = client.get("/api/auth/hashing-metrics", headers=auth_headers).json()
+    # Registering and logging in the user went through the pool
+    assert metrics["completed"] >= 2
+
+def test_hashing_workers_only_load_the_hashing_code(client, auth_headers):
+    from services.password_hashing import hashing_pool
+    modules = hashing_pool._get_executor().submit(eval, "sorted(__import__('sys').modules)").result()
+    assert "services.hashing_worker" in modules
+    assert not {"api", "main", "fastapi", "sqlalchemy", "langgraph", "routers", "services.password_hashing"} & set(modules)
@@ -0,0 +1,53 @@
+import json
+from database import SessionLocal
+from models.habit import HabitStats
+from services import habit_stats
+from services.schedule import WEEKDAYS
+
+def _habit(client, headers) -> int:
+    return client.post("/api/habits/", json={"name": "Read", "repeat_frequency": ",".join(WEEKDAYS)}, headers=headers).json()["id"]
+
+def test_bulk_json_array(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    rows = [{"habit_id": habit_id, "completion_date": f"2024-01-{day:02d}"} for day in range(1, 11)]
+    result = client.post("/api/completions/bulk", json=rows + rows[:3], headers=auth_headers).json()
+    assert (result["received"], result["inserted"], result["duplicates"], result["failed"]) == (13, 10, 3, 0)
+    # Sending the same rows again inserts nothing
+    result = client.post("/api/completions/bulk", json=rows, headers=auth_headers).json()
+    assert (result["inserted"], result["duplicates"]) == (0, 10)
+    assert client.get("/api/analytics/summary", headers=auth_headers).json()["total_completions"] == 10
+
+def test_bulk_ndjson_reports_bad_rows(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    lines = [
+        json.dumps({"habit_id": habit_id, "completion_date": "2024-02-01"}),
+        "not json",
+        json.dumps({"habit_id": habit_id, "completion_date": "2024-02-30"}),
+        json.dumps({"habit_id": 999999, "completion_date": "2024-02-01"}),
+        "",
+        json.dumps({"habit_id": "1", "completion_date": "2024-02-01"}),
+        json.dumps({"habit_id": habit_id, "completion_date": "2024-02-02"}),
+    ]
+    result = client.post("/api/completions/bulk", content="\n".join(lines),
+                         headers={**auth_headers, "Content-Type": "application/x-ndjson"}).json()
+    assert (result["received"], result["inserted"], result["failed"]) == (6, 2, 4)
+    assert [error["row"] for error in result["errors"]] == [2, 3, 4, 6]
+    assert result["errors"][1]["error"] == "Invalid date format. Use YYYY-MM-DD"
+    assert result["errors"][2]["error"] == "Habit not found"
+
+def test_bulk_rejects_other_bodies(client, auth_headers):
+    assert client.post("/api/completions/bulk", json={"habit_id": 1}, headers=auth_headers).status_code == 400
+
+def test_rows_added_concurrently_are_counted_once(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    masks = {habit_id: 127}
+    with SessionLocal() as db:
+        # Another writer inserted one of the rows first
+        assert habit_stats.add_completions(db, user_id, [(habit_id, 738000)], masks) == [(habit_id, 738000)]
+        db.commit()
+        inserted = habit_stats.add_completions(db, user_id, [(habit_id, 738000), (habit_id, 738001)], masks)
+        db.commit()
+        assert inserted == [(habit_id, 738001)]
+        assert db.get(HabitStats, habit_id).total_completions == 2
+        assert habit_stats.check(db) == []
@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+from database import SessionLocal
+from services import bitmaps
+from services.schedule import ALL_DAYS_MASK, WEEKDAYS, weekday_mask
+from services.streaks import run_lengths
+
+MONDAY = date(2024, 3, 4)
+WORKDAYS = "MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY"
+
+def _habit(client, headers, repeat_frequency: str, offsets, name="Habit") -> int:
+    habit_id = client.post("/api/habits/", json={"name": name, "repeat_frequency": repeat_frequency}, headers=headers).json()["id"]
+    for offset in offsets:
+        day = (MONDAY + timedelta(days=offset)).isoformat()
+        client.post("/api/completions/", json={"habit_id": habit_id, "completion_date": day}, headers=headers).raise_for_status()
+    return habit_id
+
+def _calendar(client, headers, days: int, today: date, **kwargs) -> dict:
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    first = MONDAY.toordinal()
+    with SessionLocal() as db:
+        return bitmaps.load_calendar(db, user_id, first, first + days - 1, today=today, **kwargs)
+
+def test_bitmap_helpers():
+    assert bitmaps.decode(bitmaps.encode(0b1011, 12)) == 0b1011
+    assert bitmaps.schedule_bitmap(ALL_DAYS_MASK, MONDAY.toordinal(), 10) == (1 << 10) - 1
+    # Monday to Friday, then the next Monday and Tuesday
+    assert bitmaps.schedule_bitmap(weekday_mask(WORKDAYS), MONDAY.toordinal(), 9) == 0b110011111
+    assert bitmaps.schedule_bitmap(0, MONDAY.toordinal(), 9) == 0
+    assert bitmaps.runs(0b11011, 0b00100, 5) == (2, 2)
+    assert bitmaps.runs(0b00111, 0, 5) == (3, 3)
+
+def test_calendar_matches_run_lengths(client, auth_headers):
+    offsets = [0, 1, 3, 4, 7, 8, 9]
+    habit_id = _habit(client, auth_headers, WORKDAYS, offsets)
+    calendar = _calendar(client, auth_headers, 14, MONDAY + timedelta(days=20), habit_id=habit_id)
+    habit, = calendar["habits"]
+    # Wednesday was missed; Friday's completion carries over the weekend
+    longest = run_lengths([MONDAY.toordinal() + offset for offset in offsets], weekday_mask(WORKDAYS))[1]
+    assert habit["longest_streak"] == longest == 5
+    # Thursday and Friday of the second week were missed
+    assert habit["current_streak"] == 0
+    assert (habit["completed_days"], habit["scheduled_days"]) == (7, 10)
+    assert habit["completion_rate"] == 70.0
+    assert bitmaps.decode(habit["completed"]) == sum(1 << offset for offset in offsets)
+
+def test_future_days_are_neither_missed_nor_counted(client, auth_headers):
+    habit_id = _habit(client, auth_headers, ",".join(WEEKDAYS), range(7))
+    habit, = _calendar(client, auth_headers, 7, MONDAY + timedelta(days=2), habit_id=habit_id)["habits"]
+    assert (habit["current_streak"], habit["longest_streak"]) == (3, 3)
+    assert (habit["completed_days"], habit["scheduled_days"]) == (3, 3)
+    # The completions after today are still in the bitmap
+    assert bitmaps.decode(habit["completed"]) == 0b1111111
+
+def test_habit_without_schedule(client, auth_headers):
+    habit_id = _habit(client, auth_headers, "daily", [0, 1, 3])
+    habit, = _calendar(client, auth_headers, 7, MONDAY + timedelta(days=10), habit_id=habit_id)["habits"]
+    # Nothing is expected of it, but a missed day still breaks its runs
+    assert (habit["scheduled_days"], habit["completion_rate"]) == (0, 0)
+    assert bitmaps.decode(habit["scheduled"]) == 0
+    assert (habit["current_streak"], habit["longest_streak"]) == (0, 2)
+
+def test_all_and_any_done(client, auth_headers):
+    _habit(client, auth_headers, ",".join(WEEKDAYS), [0, 1, 2, 5], name="Daily")
+    _habit(client, auth_headers, WORKDAYS, [0, 2, 3], name="Weekdays")
+    _habit(client, auth_headers, "daily", [], name="Unscheduled")
+    calendar = _calendar(client, auth_headers, 7, MONDAY + timedelta(days=30), per_habit=False)
+    assert "habits" not in calendar
+    # Monday and Wednesday had both done; Saturday only needed the daily habit
+    assert bitmaps.decode(calendar["all_done"]) == 0b0100101
+    assert bitmaps.decode(calendar["any_done"]) == 0b0101111
+    assert (calendar["all_done_days"], calendar["any_done_days"]) == (3, 5)
@@ -0,0 +1,84 @@
+"""POST /api/chat end to end, with the scripted chat model (LLM_PROVIDER=scripted) standing in for the LLM"""
+import json
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import langgraph_setup
+
+def _chat(client, headers, message: str, thread_id: str = "test") -> list:
+    """The (event, data) pairs of the server-sent event stream"""
+    response = client.post("/api/chat", headers=headers, json={"message": message, "thread_id": thread_id})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+def _names(events: list) -> list:
+    """Event names with runs of tokens collapsed into one"""
+    names = []
+    for name, _ in events:
+        if not (name == "token" and names and names[-1] == "token"):
+            names.append(name)
+    return names
+
+def test_tool_call_streams_tool_events_then_reply(client, auth_headers):
+    events = _chat(client, auth_headers, "add a habit for reading on weekdays #books")
+    assert _names(events) == ["tool_start", "tool_end", "token", "done"]
+    assert events[0][1] == {"name": "add_habit_tool", "input": {
+        "name": "reading", "repeat_frequency": [1, 2, 3, 4, 5], "tags": ["books"],
+    }}
+    habit_id = events[1][1]["output"]
+    reply = "".join(data["content"] for name, data in events if name == "token")
+    assert reply == events[-1][1]["content"] == f"Added habit #{habit_id}."
+
+    habits = client.get("/api/habits/", headers=auth_headers).json()
+    assert [(habit["id"], habit["name"], habit["tags"]) for habit in habits] == [(int(habit_id), "reading", "books")]
+
+def test_reply_without_tools_streams_only_tokens(client, auth_headers):
+    events = _chat(client, auth_headers, "hello")
+    assert _names(events) == ["token", "done"]
+    assert "".join(data["content"] for name, data in events if name == "token") == events[-1][1]["content"]
+
+def test_unknown_habit_is_reported_by_the_tool(client, auth_headers):
+    events = _chat(client, auth_headers, "mark habit 999999 done today")
+    assert _names(events) == ["tool_start", "tool_end", "token", "done"]
+    assert events[0][1]["name"] == "complete_habit_tool"
+    assert events[1][1] == {"name": "complete_habit_tool", "output": "Habit 999999 not found"}
+    assert events[-1][1]["content"] == "Habit 999999 not found"
+
+def test_agent_failure_ends_the_stream_with_an_error_event(client, auth_headers, monkeypatch):
+    async def failing_stream(message, user_id, thread_id):
+        yield "token", {"content": "Working"}
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(langgraph_setup, "stream_message", failing_stream)
+    events = _chat(client, auth_headers, "hello")
+    assert events == [("token", {"content": "Working"}), ("error", {"detail": "model unavailable"})]
+
+def test_concurrent_chats_on_separate_threads(client, auth_headers):
+    names = [f"habit {letter}" for letter in "abcdefgh"]
+
+    def add(i: int) -> list:
+        return _chat(client, auth_headers, f"add a habit called '{names[i]}' every monday", thread_id=f"thread-{i}")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(add, range(len(names))))
+    for i, events in enumerate(results):
+        assert _names(events) == ["tool_start", "tool_end", "token", "done"]
+        assert events[0][1]["input"]["name"] == names[i]
+        assert events[-1][1]["content"] == f"Added habit #{events[1][1]['output']}."
+
+    habits = client.get("/api/habits/", headers=auth_headers).json()
+    assert sorted(habit["name"] for habit in habits) == names
+
+def test_checkpoint_metrics_need_a_user(client, auth_headers):
+    assert client.get("/api/chat/checkpoint-metrics").status_code in (401, 403)
+    assert "checkpoints" in client.get("/api/chat/checkpoint-metrics", headers=auth_headers).json()
+
+def test_invalid_date_falls_back_to_today(client, auth_headers):
+    events = _chat(client, auth_headers, "what habits do I have on 2024-02-30?")
+    assert _names(events) == ["tool_start", "tool_end", "token", "done"]
+    today = date.today()
+    assert events[0][1] == {"name": "habits_for_date_tool", "input": {"day": today.day, "month": today.month, "year": today.year}}
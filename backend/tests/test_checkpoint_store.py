@@ -0,0 +1,20 @@
+from services import checkpoint_store
+
+def test_one_worker_compacts_per_interval(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    # Workers start at different times: the first claim wins, the next ones within the interval skip
+    assert checkpoint_store.compact_file(path, interval=3600) is not None
+    assert checkpoint_store.compact_file(path, interval=3600) is None
+    # Claims older than the interval can be taken over
+    conn = checkpoint_store.connect_sqlite(path)
+    with conn:
+        conn.execute("UPDATE compaction_runs SET started_at = started_at - 3600")
+    conn.close()
+    assert checkpoint_store.compact_file(path, interval=3600) is not None
+
+def test_last_compaction_is_shared_between_processes(tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoints.db")
+    report = checkpoint_store.compact_file(path, interval=3600)
+    # A worker that never compacted itself still reports the last run
+    monkeypatch.setattr(checkpoint_store, "last_report", None)
+    assert checkpoint_store.read_metrics(path)["last_compaction"] == report
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+from database import SessionLocal
+from services import habit_stats
+from services.schedule import WEEKDAYS
+
+DAYS = [date(2024, 1, 30), date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 15), date(2024, 2, 29),
+        date(2024, 3, 1), date(2024, 3, 31), date(2024, 4, 1), date(2024, 4, 2)]
+
+def _habit_with_completions(client, headers, repeat_frequency: str, days) -> int:
+    habit_id = client.post("/api/habits/", json={"name": "Stretch", "repeat_frequency": repeat_frequency}, headers=headers).json()["id"]
+    for day in days:
+        client.post("/api/completions/", json={"habit_id": habit_id, "completion_date": day.isoformat()}, headers=headers).raise_for_status()
+    return habit_id
+
+def test_completion_counts_at_month_edges(client, auth_headers):
+    habit_id = _habit_with_completions(client, auth_headers, ",".join(WEEKDAYS), DAYS)
+    windows = [
+        (date(2024, 2, 10), date(2024, 2, 20)),  # Inside one month
+        (date(2024, 1, 31), date(2024, 4, 1)),  # Partial months at both edges
+        (date(2024, 2, 1), date(2024, 3, 31)),  # Whole months only
+        (date(2024, 2, 1), date(2024, 4, 1)),
+        (date(2024, 1, 15), date(2024, 2, 29)),
+        (date(2024, 1, 1), date(2024, 12, 31)),
+        (date(2024, 3, 2), date(2024, 3, 30)),  # Nothing completed
+        (date(2024, 3, 1), date(2024, 2, 1)),  # Empty window
+    ]
+    with SessionLocal() as db:
+        for start, end in windows:
+            expected = sum(start <= day <= end for day in DAYS)
+            assert habit_stats.completion_counts(db, [habit_id], start, end) == {habit_id: expected}, (start, end)
+        assert habit_stats.completion_counts(db, [], DAYS[0], DAYS[-1]) == {}
+
+def test_completion_rate_endpoint(client, auth_headers):
+    today = date.today()
+    monday_to_friday = "MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY"
+    done = [today - timedelta(days=offset) for offset in range(10) if (today - timedelta(days=offset)).weekday() < 5][:4]
+    habit_id = _habit_with_completions(client, auth_headers, monday_to_friday, done)
+    rate, = client.get("/api/analytics/completion-rate", params={"habit_id": habit_id, "days": 13}, headers=auth_headers).json()
+    # 14 days, today included, always hold 10 weekdays
+    assert rate["expected_completions"] == 10
+    assert rate["actual_completions"] == 4
+    assert rate["completion_rate"] == 40.0
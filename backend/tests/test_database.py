@@ -0,0 +1,24 @@
+from sqlalchemy import text
+from database import SessionLocal, SQLITE_PRAGMAS, connect_sqlite, engine
+
+def test_pooled_connections_are_tuned():
+    with SessionLocal() as db:
+        assert db.execute(text("PRAGMA journal_mode")).scalar().upper() == "WAL"
+        assert db.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_PRAGMAS["busy_timeout"]
+        assert db.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert db.execute(text("PRAGMA cache_size")).scalar() == SQLITE_PRAGMAS["cache_size"]
+
+def test_standalone_connections_are_tuned(tmp_path):
+    conn = connect_sqlite(str(tmp_path / "store.db"))
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0].upper() == "WAL"
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+    finally:
+        conn.close()
+
+def test_sessions_share_one_pool():
+    with SessionLocal() as first, SessionLocal() as second:
+        first.execute(text("SELECT 1"))
+        second.execute(text("SELECT 1"))
+        assert first.get_bind() is second.get_bind() is engine
+        assert engine.pool.checkedout() >= 2
@@ -0,0 +1,27 @@
+from services.habit_context import HabitContextCache, habit_context
+
+def test_context_follows_habit_writes(client, auth_headers):
+    user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    assert habit_context.get(user_id) == "No habits yet."
+    habit_id = client.post("/api/habits/", json={"name": "Read", "repeat_frequency": "MONDAY,FRIDAY", "tags": "books"},
+                           headers=auth_headers).json()["id"]
+    assert habit_context.get(user_id) == f"#{habit_id} Read: Mon,Fri [books]"
+    client.put(f"/api/habits/{habit_id}", json={"name": "Read more"}, headers=auth_headers).raise_for_status()
+    assert habit_context.get(user_id) == f"#{habit_id} Read more: Mon,Fri [books]"
+
+def test_user_versions_are_bounded_and_never_repeat(monkeypatch):
+    cache = HabitContextCache(max_size=2, ttl=60)
+    monkeypatch.setattr("services.habit_context.render_habits", lambda db, user_id: f"user {user_id}")
+    history = {}
+    for user_id in (1, 2, 3, 1, 4, 5):
+        cache.get(user_id)
+        cache.invalidate_user(user_id)
+        history.setdefault(user_id, set()).add(cache._versions[user_id])
+    assert list(cache._versions) == [4, 5]
+    # Users 1 to 3 were evicted: their next read must miss instead of matching an old entry
+    for user_id in (1, 2, 3):
+        assert cache._evicted_at not in history[user_id]
+    cache.get(5)
+    hits = cache.hits
+    assert cache.get(5) == "user 5"
+    assert cache.hits == hits + 1
@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+from database import SessionLocal
+from services import habit_stats
+from services.schedule import WEEKDAYS
+
+def _habit(client, headers, name="Run") -> int:
+    response = client.post("/api/habits/", json={"name": name, "repeat_frequency": ",".join(WEEKDAYS)}, headers=headers)
+    return response.json()["id"]
+
+def _complete(client, headers, habit_id: int, day: date):
+    client.post("/api/completions/", json={"habit_id": habit_id, "completion_date": day.isoformat()}, headers=headers).raise_for_status()
+
+def _streak(client, headers, habit_id: int) -> tuple:
+    row, = client.get(f"/api/analytics/streaks?habit_id={habit_id}", headers=headers).json()
+    return row["current_streak"], row["longest_streak"]
+
+def test_future_completions_do_not_count_toward_streaks(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    today = date.today()
+    _complete(client, auth_headers, habit_id, today)
+    for offset in range(1, 8):
+        _complete(client, auth_headers, habit_id, today + timedelta(days=offset))
+    assert _streak(client, auth_headers, habit_id) == (1, 1)
+
+    calendar = client.get("/api/analytics/calendar", params={
+        "start": (today - timedelta(days=6)).isoformat(), "end": today.isoformat(), "habit_id": habit_id
+    }, headers=auth_headers).json()
+    assert (calendar["habits"][0]["current_streak"], calendar["habits"][0]["longest_streak"]) == (1, 1)
+
+def test_only_future_completions(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    _complete(client, auth_headers, habit_id, date.today() + timedelta(days=3))
+    assert _streak(client, auth_headers, habit_id) == (0, 0)
+
+def test_backfill_and_removal_keep_stats_in_step(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    today = date.today()
+    for offset in (0, 1, 3, 4, 5):
+        _complete(client, auth_headers, habit_id, today - timedelta(days=offset))
+    assert _streak(client, auth_headers, habit_id) == (2, 3)
+    # Filling the gap merges both runs
+    _complete(client, auth_headers, habit_id, today - timedelta(days=2))
+    assert _streak(client, auth_headers, habit_id) == (6, 6)
+    client.delete("/api/completions/", params={
+        "habit_id": habit_id, "completion_date": (today - timedelta(days=3)).isoformat()
+    }, headers=auth_headers).raise_for_status()
+    assert _streak(client, auth_headers, habit_id) == (3, 3)
+    with SessionLocal() as db:
+        assert habit_stats.check(db) == []
+
+def test_rebuild_matches_incremental_stats(client, auth_headers):
+    habit_id = _habit(client, auth_headers)
+    today = date.today()
+    for offset in (0, 2, 3, 40):
+        _complete(client, auth_headers, habit_id, today - timedelta(days=offset))
+    before = _streak(client, auth_headers, habit_id)
+    with SessionLocal() as db:
+        habit_stats.rebuild(db)
+        assert habit_stats.check(db) == []
+    assert _streak(client, auth_headers, habit_id) == before == (1, 2)
@@ -0,0 +1,30 @@
+MONDAY, TUESDAY, SUNDAY = "2024-03-04", "2024-03-05", "2024-03-10"
+
+def _habit(client, headers, name: str, repeat_frequency: str) -> int:
+    return client.post("/api/habits/", json={"name": name, "repeat_frequency": repeat_frequency}, headers=headers).json()["id"]
+
+def test_habits_scheduled_on_a_date(client, auth_headers):
+    gym = _habit(client, auth_headers, "Gym", "MONDAY,WEDNESDAY")
+    walk = _habit(client, auth_headers, "Walk", "MONDAY,TUESDAY,SUNDAY")
+    _habit(client, auth_headers, "Nothing scheduled", "")
+    client.post("/api/completions/", json={"habit_id": walk, "completion_date": MONDAY}, headers=auth_headers).raise_for_status()
+
+    habits = client.get(f"/api/habits/date/{MONDAY}", headers=auth_headers).json()
+    assert sorted((habit["id"], habit["completed"]) for habit in habits) == [(gym, False), (walk, True)]
+    habits = client.get(f"/api/habits/date/{TUESDAY}", headers=auth_headers).json()
+    assert [(habit["id"], habit["completed"]) for habit in habits] == [(walk, False)]
+    assert client.get("/api/habits/date/2024-13-01", headers=auth_headers).status_code == 400
+
+def test_habits_for_a_date_range(client, auth_headers):
+    gym = _habit(client, auth_headers, "Gym", "MONDAY")
+    walk = _habit(client, auth_headers, "Walk", "SUNDAY")
+    client.post("/api/completions/", json={"habit_id": walk, "completion_date": SUNDAY}, headers=auth_headers).raise_for_status()
+
+    grid = client.get(f"/api/habits/date/{MONDAY}/2024-03-11", headers=auth_headers).json()
+    assert [day["date"] for day in grid][0::7] == [MONDAY, "2024-03-11"]
+    scheduled = {day["date"]: [(habit["id"], habit["completed"]) for habit in day["habits"]] for day in grid}
+    assert scheduled[MONDAY] == scheduled["2024-03-11"] == [(gym, False)]
+    assert scheduled[SUNDAY] == [(walk, True)]
+    assert scheduled[TUESDAY] == []
+    assert client.get(f"/api/habits/date/{TUESDAY}/{MONDAY}", headers=auth_headers).status_code == 400
+    assert client.get("/api/habits/date/2024-01-01/2025-12-31", headers=auth_headers).status_code == 400
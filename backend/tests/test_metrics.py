@@ -0,0 +1,16 @@
+import os
+from routers import auth
+
+def test_metrics_need_a_user_or_the_metrics_token(client, auth_headers, monkeypatch):
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+    assert client.get("/metrics", headers=auth_headers).status_code == 200
+    monkeypatch.setattr(auth, "METRICS_TOKEN", "scrape-me")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-you"}).status_code == 401
+
+def test_samples_are_labelled_with_the_process(client, auth_headers):
+    client.get("/api/habits/", headers=auth_headers)
+    lines = [line for line in client.get("/metrics", headers=auth_headers).text.splitlines() if not line.startswith("#")]
+    assert lines
+    assert all(f'pid="{os.getpid()}"' in line for line in lines)
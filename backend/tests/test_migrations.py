@@ -0,0 +1,73 @@
+from datetime import date
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+import migrations
+from models.habit import Completion, Habit, HabitStats, Tag, UserStats
+from services import habit_stats
+from services.schedule import weekday_mask
+
+def _legacy_engine(path):
+    """A database as the app created it before migrations: string schedules and dates"""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE habits (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+                             "repeat_frequency VARCHAR NOT NULL, tags VARCHAR, user_id INTEGER)")
+        conn.exec_driver_sql("CREATE TABLE completions (habit_id INTEGER NOT NULL, completion_date VARCHAR NOT NULL, "
+                             "PRIMARY KEY (habit_id, completion_date))")
+        conn.exec_driver_sql("INSERT INTO habits VALUES (1, 'Run', 'monday,Friday', 'Health, morning', 7)")
+        conn.exec_driver_sql("INSERT INTO habits VALUES (2, 'Read', 'SUNDAY', '', 8)")
+        for habit_id, day in [(1, "2024-03-01"), (1, "2024-03-04"), (2, "2024-03-03"), (1, "not a date")]:
+            conn.exec_driver_sql("INSERT INTO completions VALUES (?, ?)", (habit_id, day))
+    return engine
+
+def test_legacy_database_is_migrated_to_the_current_schema(tmp_path):
+    engine = _legacy_engine(tmp_path / "legacy.db")
+    assert migrations.migrate(engine) == migrations.MIGRATIONS[-1][0]
+
+    inspector = inspect(engine)
+    assert {"schema_migrations", "users", "user_stats", "user_daily_counts", "tags", "habit_tags"} <= set(inspector.get_table_names())
+    assert {column["name"] for column in inspector.get_columns("habits")} == {"id", "name", "schedule_mask", "tags", "user_id"}
+    assert {column["name"] for column in inspector.get_columns("completions")} == {"habit_id", "day_number", "user_id"}
+    assert "ix_completions_user_day" in {index["name"] for index in inspector.get_indexes("completions")}
+
+    with Session(engine) as db:
+        assert db.get(Habit, 1).schedule_mask == weekday_mask("MONDAY,FRIDAY")
+        # The unreadable date is dropped, the others become day numbers owned by the habit's user
+        assert sorted((row.habit_id, row.day_number, row.user_id) for row in db.query(Completion)) == [
+            (1, date(2024, 3, 1).toordinal(), 7), (1, date(2024, 3, 4).toordinal(), 7), (2, date(2024, 3, 3).toordinal(), 8)
+        ]
+        assert sorted(tag.name for tag in db.query(Tag).filter(Tag.user_id == 7)) == ["health", "morning"]
+        # Stats and counters are filled from the existing completions
+        assert db.get(HabitStats, 1).longest_streak == 2
+        assert db.get(UserStats, 7).total_completions == 2
+        assert habit_stats.check(db) == []
+
+def test_migrating_again_changes_nothing(tmp_path):
+    engine = _legacy_engine(tmp_path / "legacy.db")
+    version = migrations.migrate(engine)
+    assert migrations.migrate(engine) == version
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == version
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM completions").scalar() == 3
+
+def test_version_is_adopted_from_the_sqlite_header(tmp_path):
+    engine = _legacy_engine(tmp_path / "legacy.db")
+    # Versions 1 and 2 were applied when PRAGMA user_version still tracked them
+    with engine.begin() as conn:
+        migrations.compact_encoding(conn)
+        migrations.schedule_index(conn)
+        conn.exec_driver_sql("PRAGMA user_version = 2")
+    with engine.begin() as conn:
+        assert migrations.current_version(conn) == 2
+    assert migrations.migrate(engine) == migrations.MIGRATIONS[-1][0]
+    with engine.connect() as conn:
+        versions = [row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_migrations ORDER BY version")]
+        assert versions == [number for number, _ in migrations.MIGRATIONS]
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM completions WHERE user_id IS NOT NULL").scalar() == 3
+
+def test_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    assert migrations.migrate(engine) == migrations.MIGRATIONS[-1][0]
+    with Session(engine) as db:
+        assert db.query(Habit).count() == 0
+        assert habit_stats.check(db) == []
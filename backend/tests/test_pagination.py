@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+from services.schedule import WEEKDAYS
+
+def _pages(client, headers, path: str, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=params, headers=headers)
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+def _habits_with_completions(client, headers, count: int, days: int) -> list:
+    ids = []
+    for i in range(count):
+        habit_id = client.post("/api/habits/", json={"name": f"Habit {i}", "repeat_frequency": ",".join(WEEKDAYS)},
+                               headers=headers).json()["id"]
+        ids.append(habit_id)
+        rows = [{"habit_id": habit_id, "completion_date": f"2024-05-{day:02d}"} for day in range(1, days + 1)]
+        client.post("/api/completions/bulk", json=rows, headers=headers).raise_for_status()
+    return ids
+
+def test_habit_pages_cover_every_habit_once(client, auth_headers):
+    ids = _habits_with_completions(client, auth_headers, 7, 0)
+    pages = _pages(client, auth_headers, "/api/habits/", 3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [habit["id"] for page in pages for habit in page] == ids
+    # The old offset parameter still works
+    assert [habit["id"] for habit in client.get("/api/habits/?skip=5", headers=auth_headers).json()] == ids[5:]
+
+def test_completion_pages_follow_date_then_habit(client, auth_headers):
+    ids = _habits_with_completions(client, auth_headers, 3, 4)
+    pages = _pages(client, auth_headers, "/api/completions/", 5)
+    rows = [(row["completion_date"], row["habit_id"]) for page in pages for row in page]
+    assert rows == sorted((f"2024-05-{day:02d}", habit_id) for day in range(1, 5) for habit_id in ids)
+    # A full last page still advertises a cursor, which then yields an empty page
+    assert [len(page) for page in _pages(client, auth_headers, "/api/completions/", 6)] == [6, 6, 0]
+
+    habit_pages = _pages(client, auth_headers, f"/api/completions/habit/{ids[1]}", 3)
+    assert [row["completion_date"] for page in habit_pages for row in page] == [f"2024-05-0{day}" for day in range(1, 5)]
+
+def test_invalid_cursor_and_limit(client, auth_headers):
+    assert client.get("/api/completions/?cursor=abc", headers=auth_headers).status_code == 400
+    assert client.get("/api/completions/?cursor=1", headers=auth_headers).status_code == 400
+    assert client.get("/api/habits/?limit=0", headers=auth_headers).status_code == 400
+
+def test_export_streams_every_completion(client, auth_headers):
+    ids = _habits_with_completions(client, auth_headers, 2, 3)
+    lines = client.get("/api/completions/export", headers=auth_headers).text.splitlines()
+    assert [json.loads(line) for line in lines][:2] == [
+        {"habit_id": ids[0], "completion_date": "2024-05-01"}, {"habit_id": ids[1], "completion_date": "2024-05-01"}
+    ]
+    assert len(lines) == 6
+    rows = list(csv.DictReader(io.StringIO(client.get(f"/api/completions/export?format=csv&habit_id={ids[1]}",
+                                                      headers=auth_headers).text)))
+    assert [row["completion_date"] for row in rows] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    assert client.get("/api/completions/export?format=xml", headers=auth_headers).status_code == 400
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+from services.schedule import (count_scheduled_days, expected_days, schedule_string, weekday_histogram,
+                               weekday_mask, weekday_of)
+
+def test_weekday_mask_round_trip():
+    assert weekday_mask("MONDAY,FRIDAY") == 0b10001
+    assert weekday_mask("sunday, monday") == 0b1000001
+    assert weekday_mask("") == weekday_mask(None) == 0
+    assert schedule_string(0b1000001) == "MONDAY,SUNDAY"
+    for mask in range(128):
+        assert weekday_mask(schedule_string(mask)) == mask
+
+def test_day_numbers_match_dates():
+    start = date(2023, 12, 25)
+    for offset in range(14):
+        day = start + timedelta(days=offset)
+        assert weekday_of(day.toordinal()) == day.weekday()
+
+def test_scheduled_day_counts_match_a_day_by_day_count():
+    first = date(2024, 2, 20).toordinal()
+    for mask in (0, 1, 0b0011111, 0b1100000, 127):
+        for length in range(0, 20):
+            last = first + length - 1
+            brute = sum(mask >> weekday_of(day) & 1 for day in range(first, last + 1))
+            assert count_scheduled_days(mask, first, last) == brute
+            assert expected_days(weekday_histogram(first, last), mask) == brute
+
+def test_schedule_and_dates_through_the_api(client, auth_headers):
+    habit = client.post("/api/habits/", json={"name": "Swim", "repeat_frequency": "friday,Monday"}, headers=auth_headers).json()
+    assert habit["repeat_frequency"] == "MONDAY,FRIDAY"
+    completion = client.post("/api/completions/", json={"habit_id": habit["id"], "completion_date": "2024-02-29"},
+                             headers=auth_headers).json()
+    assert completion == {"habit_id": habit["id"], "completion_date": "2024-02-29"}
+    response = client.post("/api/completions/", json={"habit_id": habit["id"], "completion_date": "2024-02-30"},
+                           headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+from sqlalchemy import create_engine
+import migrations
+from services import snapshot
+from services.offline_analytics import OfflineAnalytics
+
+def _legacy_database(path: str):
+    """A database from before migrations, with completions of a habit deleted long ago"""
+    engine = create_engine(f"sqlite:///{path}")
+    today = date.today()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE habits (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+                             "repeat_frequency VARCHAR NOT NULL, tags VARCHAR, user_id INTEGER)")
+        conn.exec_driver_sql("CREATE TABLE completions (habit_id INTEGER NOT NULL, completion_date VARCHAR NOT NULL, "
+                             "PRIMARY KEY (habit_id, completion_date))")
+        conn.exec_driver_sql("INSERT INTO habits VALUES (1, 'Run', 'MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY,SATURDAY,SUNDAY', "
+                             "'health', 1)")
+        for days_ago in range(3):
+            day = (today - timedelta(days=days_ago)).isoformat()
+            conn.exec_driver_sql("INSERT INTO completions VALUES (1, ?)", (day,))
+            conn.exec_driver_sql("INSERT INTO completions VALUES (99, ?)", (day,))
+    migrations.migrate(engine)
+    return engine
+
+def test_export_skips_orphan_completions(tmp_path):
+    engine = _legacy_database(tmp_path / "legacy.db")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM completions WHERE user_id IS NULL").scalar() == 3
+
+    manifest = snapshot.export(engine, root=str(tmp_path / "snapshots"), format="npy")
+    assert manifest["rows"]["completions"] == 3
+    assert manifest["rows"]["habits"] == 1
+
+    analytics = OfflineAnalytics(snapshot.open_snapshot(str(tmp_path / "snapshots")))
+    assert analytics.summary(1) == {"total_habits": 1, "total_completions": 3, "completed_today": 1}
+    assert analytics.streaks(1) == [{"habit_id": 1, "habit_name": "Run", "current_streak": 3, "longest_streak": 3}]
+    assert analytics.tag_rates(1, days=2)[0]["actual_completions"] == 3
+
+def test_export_keeps_newest_snapshots(tmp_path):
+    engine = _legacy_database(tmp_path / "legacy.db")
+    root = str(tmp_path / "snapshots")
+    names = [snapshot.export(engine, root=root, format="npy", keep=2)["name"] for _ in range(3)]
+    assert snapshot.open_snapshot(root).manifest["name"] == names[-1]
+    assert sorted(entry for entry in (tmp_path / "snapshots").iterdir() if entry.is_dir()) == [
+        tmp_path / "snapshots" / name for name in names[1:]
+    ]
+
+def test_periodic_export_runs_once_per_interval(tmp_path):
+    engine = _legacy_database(tmp_path / "legacy.db")
+    root = str(tmp_path / "snapshots")
+    assert snapshot.export_if_due(3600, root, engine=engine, format="npy") is not None
+    # Another worker waking up within the interval skips the export
+    assert snapshot.export_if_due(3600, root, engine=engine, format="npy") is None
+    assert snapshot.export_if_due(0, root, engine=engine, format="npy") is not None
+
+def test_export_reads_all_tables_in_one_transaction(tmp_path, monkeypatch):
+    engine = _legacy_database(tmp_path / "legacy.db")
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    read_columns = snapshot._read_columns
+
+    def read_then_write(conn, query, dtypes):
+        columns = read_columns(conn, query, dtypes)
+        if "day_number" in dtypes:
+            # Another writer commits a habit while the export is between tables
+            with create_engine(f"sqlite:///{tmp_path / 'legacy.db'}").begin() as writer:
+                writer.exec_driver_sql("INSERT INTO habits (id, name, schedule_mask, user_id) VALUES (2, 'Swim', 1, 1)")
+        return columns
+    monkeypatch.setattr(snapshot, "_read_columns", read_then_write)
+
+    manifest = snapshot.export(engine, root=str(tmp_path / "snapshots"), format="npy")
+    assert manifest["rows"]["habits"] == 1
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM habits").scalar() == 2
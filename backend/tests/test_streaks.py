@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+from services.schedule import ALL_DAYS_MASK, WEEKDAYS, weekday_mask
+from services.streaks import current_streak, run_lengths
+
+MONDAY = date(2024, 3, 4).toordinal()
+WORKDAYS = weekday_mask("MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY")
+
+def test_run_lengths_of_daily_habit():
+    assert run_lengths([], ALL_DAYS_MASK) == (0, 0)
+    days = [MONDAY, MONDAY + 1, MONDAY + 2, MONDAY + 4, MONDAY + 5]
+    assert run_lengths(days, ALL_DAYS_MASK) == (2, 3)
+
+def test_unscheduled_days_do_not_break_a_run():
+    # Friday, then Monday: the weekend in between is not scheduled
+    days = [MONDAY + 3, MONDAY + 4, MONDAY + 7]
+    assert run_lengths(days, WORKDAYS) == (3, 3)
+    # A completion on an unscheduled day still counts
+    assert run_lengths([MONDAY + 4, MONDAY + 5, MONDAY + 7], WORKDAYS) == (3, 3)
+    # Missing Tuesday breaks it
+    assert run_lengths([MONDAY, MONDAY + 2], WORKDAYS) == (1, 1)
+
+def test_empty_schedule_counts_as_daily_for_runs():
+    assert run_lengths([MONDAY, MONDAY + 2], 0) == run_lengths([MONDAY, MONDAY + 2], ALL_DAYS_MASK)
+
+def test_current_streak_is_open_until_a_scheduled_day_is_missed():
+    assert current_streak(0, None, ALL_DAYS_MASK, MONDAY) == 0
+    # Completed yesterday, today is still open
+    assert current_streak(3, MONDAY - 1, ALL_DAYS_MASK, MONDAY) == 3
+    assert current_streak(3, MONDAY, ALL_DAYS_MASK, MONDAY) == 3
+    # Yesterday was missed
+    assert current_streak(3, MONDAY - 2, ALL_DAYS_MASK, MONDAY) == 0
+    # Completed on Friday, and the weekend is not scheduled
+    assert current_streak(5, MONDAY - 3, WORKDAYS, MONDAY) == 5
+    assert current_streak(5, MONDAY - 3, WORKDAYS, MONDAY + 1) == 0
+
+def test_streaks_endpoint(client, auth_headers):
+    habit = client.post("/api/habits/", json={"name": "Read", "repeat_frequency": ",".join(WEEKDAYS)}, headers=auth_headers).json()
+    today = date.today()
+    for offset in (0, 1, 2, 5, 6):
+        client.post("/api/completions/", headers=auth_headers, json={
+            "habit_id": habit["id"], "completion_date": (today - timedelta(days=offset)).isoformat()
+        }).raise_for_status()
+    streaks = client.get("/api/analytics/streaks", headers=auth_headers).json()
+    assert streaks == [{"habit_id": habit["id"], "habit_name": "Read", "current_streak": 3, "longest_streak": 3}]
@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+from database import SessionLocal
+from services import habit_stats
+from services.schedule import WEEKDAYS
+
+def _summary(client, headers) -> dict:
+    return client.get("/api/analytics/summary", headers=headers).json()
+
+def test_summary_counters_follow_every_write(client, auth_headers):
+    assert _summary(client, auth_headers) == {"total_habits": 0, "total_completions": 0, "completed_today": 0}
+    ids = [client.post("/api/habits/", json={"name": name, "repeat_frequency": ",".join(WEEKDAYS)}, headers=auth_headers).json()["id"]
+           for name in ("Read", "Write")]
+    today, yesterday = date.today().isoformat(), (date.today() - timedelta(days=1)).isoformat()
+    for habit_id in ids:
+        client.post("/api/completions/", json={"habit_id": habit_id, "completion_date": today}, headers=auth_headers)
+    client.post("/api/completions/bulk", json=[{"habit_id": ids[0], "completion_date": yesterday}], headers=auth_headers)
+    assert _summary(client, auth_headers) == {"total_habits": 2, "total_completions": 3, "completed_today": 2}
+
+    client.delete("/api/completions/", params={"habit_id": ids[1], "completion_date": today}, headers=auth_headers)
+    assert _summary(client, auth_headers) == {"total_habits": 2, "total_completions": 2, "completed_today": 1}
+    # Deleting a habit takes its completions out of the counters too
+    client.delete(f"/api/habits/{ids[0]}", headers=auth_headers).raise_for_status()
+    assert _summary(client, auth_headers) == {"total_habits": 1, "total_completions": 0, "completed_today": 0}
+    with SessionLocal() as db:
+        assert habit_stats.check(db) == []
@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+from services.schedule import WEEKDAYS
+
+DAILY = ",".join(WEEKDAYS)
+WORKDAYS = "MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY"
+
+def _habit(client, headers, name: str, tags: str, repeat_frequency: str = DAILY) -> int:
+    response = client.post("/api/habits/", json={"name": name, "repeat_frequency": repeat_frequency, "tags": tags}, headers=headers)
+    return response.json()["id"]
+
+def _names(rows) -> list:
+    return sorted(row["name"] for row in rows)
+
+def test_habits_filtered_by_every_tag(client, auth_headers):
+    _habit(client, auth_headers, "Run", "Health, outdoor")
+    _habit(client, auth_headers, "Read", "mind")
+    _habit(client, auth_headers, "Walk", "health,OUTDOOR,mind")
+    get = lambda **params: client.get("/api/habits/", params=params, headers=auth_headers).json()
+    assert _names(get()) == ["Read", "Run", "Walk"]
+    assert _names(get(tag="health")) == ["Run", "Walk"]
+    # Names are matched trimmed and case-insensitively, and every tag must be present
+    assert _names(get(tag=[" Outdoor", "MIND"])) == ["Walk"]
+    assert get(tag="unknown") == []
+
+def test_habits_for_date_filtered_by_tag(client, auth_headers):
+    _habit(client, auth_headers, "Gym", "health", WORKDAYS)
+    _habit(client, auth_headers, "Journal", "mind")
+    saturday, monday = date(2024, 3, 2), date(2024, 3, 4)
+    for_date = lambda day, tag: client.get(f"/api/habits/date/{day}", params={"tag": tag}, headers=auth_headers).json()
+    assert _names(for_date(monday, "health")) == ["Gym"]
+    assert for_date(saturday, "health") == []
+    grid = client.get(f"/api/habits/date/{saturday}/{monday}", params={"tag": "mind"}, headers=auth_headers).json()
+    assert [_names(day["habits"]) for day in grid] == [["Journal"]] * 3
+
+def test_tag_edits_follow_the_habit(client, auth_headers):
+    habit_id = _habit(client, auth_headers, "Swim", "health,sport")
+    _habit(client, auth_headers, "Cycle", "sport")
+    tags = lambda: client.get("/api/habits/tags", headers=auth_headers).json()
+    assert tags() == [{"tag": "health", "habits": 1}, {"tag": "sport", "habits": 2}]
+    client.put(f"/api/habits/{habit_id}", json={"tags": "water"}, headers=auth_headers).raise_for_status()
+    assert tags() == [{"tag": "sport", "habits": 1}, {"tag": "water", "habits": 1}]
+    client.delete(f"/api/habits/{habit_id}", headers=auth_headers).raise_for_status()
+    assert tags() == [{"tag": "sport", "habits": 1}]
+
+def test_analytics_filtered_by_tag(client, auth_headers):
+    run = _habit(client, auth_headers, "Run", "health")
+    _habit(client, auth_headers, "Read", "mind")
+    today = date.today()
+    client.post("/api/completions/", json={"habit_id": run, "completion_date": today.isoformat()}, headers=auth_headers).raise_for_status()
+    rates = client.get("/api/analytics/completion-rate", params={"tag": "health"}, headers=auth_headers).json()
+    assert [rate["habit_id"] for rate in rates] == [run]
+    streaks = client.get("/api/analytics/streaks", params={"tag": "health"}, headers=auth_headers).json()
+    assert [(row["habit_id"], row["current_streak"]) for row in streaks] == [(run, 1)]
+    assert client.get("/api/analytics/streaks", params={"tag": "nothing"}, headers=auth_headers).json() == []
+
+def test_tag_completion_rate(client, auth_headers, other_auth_headers):
+    run = _habit(client, auth_headers, "Run", "health,outdoor")
+    gym = _habit(client, auth_headers, "Gym", "health", WORKDAYS)
+    _habit(client, auth_headers, "Read", "mind")
+    _habit(client, other_auth_headers, "Other", "health")
+    today = date.today()
+    for offset in range(3):
+        day = (today - timedelta(days=offset)).isoformat()
+        client.post("/api/completions/", json={"habit_id": run, "completion_date": day}, headers=auth_headers).raise_for_status()
+    client.post("/api/completions/", json={"habit_id": gym, "completion_date": today.isoformat()}, headers=auth_headers).raise_for_status()
+    # 7 days with today: 7 for the daily habits, 5 weekdays for Gym
+    rates = client.get("/api/analytics/tags", params={"days": 6}, headers=auth_headers).json()
+    assert rates == [
+        {"tag": "health", "habits": 2, "expected_completions": 12, "actual_completions": 4, "completion_rate": 33.33},
+        {"tag": "mind", "habits": 1, "expected_completions": 7, "actual_completions": 0, "completion_rate": 0.0},
+        {"tag": "outdoor", "habits": 1, "expected_completions": 7, "actual_completions": 3, "completion_rate": 42.86},
+    ]
@@ -0,0 +1,44 @@
+import time
+from database import SessionLocal
+from models.user import User
+from services.token_cache import Principal, TokenCache, token_cache
+
+def _principal(user_id: int) -> Principal:
+    return Principal(id=user_id, email=f"{user_id}@test", full_name=None, is_active=True)
+
+def test_entries_are_bounded_and_expire():
+    cache = TokenCache(max_size=2, ttl=60)
+    for token, user_id in (("a", 1), ("b", 2), ("c", 1)):
+        cache.put(token, _principal(user_id))
+    assert cache.get("a") is None
+    assert cache.get("c").id == 1
+    cache.put("d", _principal(3), token_expires_at=time.time() - 1)
+    assert cache.get("d") is None
+    assert len(cache) == 1
+
+def test_invalidate_user_drops_all_of_their_tokens():
+    cache = TokenCache(max_size=10, ttl=60)
+    for token, user_id in (("a", 1), ("b", 1), ("c", 2)):
+        cache.put(token, _principal(user_id))
+    cache.invalidate_user(1)
+    assert (cache.get("a"), cache.get("b")) == (None, None)
+    assert cache.get("c").id == 2
+
+def test_deactivating_a_user_revokes_cached_tokens(client, auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    assert token_cache.get(token).id == user_id
+
+    with SessionLocal() as db:
+        db.get(User, user_id).is_active = False
+        db.commit()
+    assert token_cache.get(token) is None
+    assert client.get("/api/auth/me", headers=auth_headers).status_code == 401
+
+def test_updated_user_is_reloaded(client, auth_headers):
+    assert client.get("/api/auth/me", headers=auth_headers).json()["full_name"] is None
+    user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+    with SessionLocal() as db:
+        db.get(User, user_id).full_name = "Renamed"
+        db.commit()
+    assert client.get("/api/auth/me", headers=auth_headers).json()["full_name"] == "Renamed"
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from datetime import date
+from langchain_core.messages import AIMessage
+from tools import habit_tools
+from tools.habit_tools import tools
+from tools.tool_node import HabitToolNode
+
+DAY = date(2024, 3, 4)
+
+def _run(user_id: int, calls: list, asynchronous: bool = False) -> list:
+    message = AIMessage("", tool_calls=[
+        {"name": name, "args": args, "id": f"call-{i}"} for i, (name, args) in enumerate(calls)
+    ])
+    node = HabitToolNode(tools)
+    config = {"configurable": {"user_id": user_id}}
+    if asynchronous:
+        result = asyncio.run(node.ainvoke({"messages": [message]}, config))
+    else:
+        result = node.invoke({"messages": [message]}, config)
+    assert [m.tool_call_id for m in result["messages"]] == [f"call-{i}" for i in range(len(calls))]
+    return [m.content for m in result["messages"]]
+
+def _setup(client, headers):
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    habit_id = client.post("/api/habits/", json={"name": "Read", "repeat_frequency": "MONDAY"}, headers=headers).json()["id"]
+    return user_id, habit_id
+
+def _habits(content) -> list:
+    # Empty lists are passed on as they are, other results as JSON
+    return json.loads(content) if isinstance(content, str) else content
+
+def _completed(content) -> bool:
+    habit, = _habits(content)
+    return habit["completed"]
+
+def test_reads_before_a_write_see_the_state_before_the_step(client, auth_headers):
+    user_id, habit_id = _setup(client, auth_headers)
+    read = ("habits_for_date_tool", {"day": DAY.day, "month": DAY.month, "year": DAY.year})
+    write = ("complete_habit_tool", {"habit_id": habit_id, "day": DAY.day, "month": DAY.month, "year": DAY.year})
+    before, result, after = _run(user_id, [read, write, read])
+    assert (_completed(before), _completed(after)) == (False, True)
+    assert result == f"Habit {habit_id} completed for {DAY}"
+
+def test_reads_in_async_steps(client, auth_headers):
+    user_id, habit_id = _setup(client, auth_headers)
+    read = ("habits_for_date_tool", {"day": DAY.day, "month": DAY.month, "year": DAY.year})
+    delete = ("delete_habit_tool", {"habit_id": habit_id})
+    before, _, after = _run(user_id, [read, delete, read], asynchronous=True)
+    assert len(_habits(before)) == 1
+    assert _habits(after) == []
+
+def test_writes_of_a_step_are_one_transaction(client, auth_headers, monkeypatch):
+    user_id, habit_id = _setup(client, auth_headers)
+
+    def failing_delete(db, user_id, calls):
+        raise RuntimeError("disk full")
+    monkeypatch.setitem(habit_tools.write_batches, "delete_habit_tool", failing_delete)
+    complete = ("complete_habit_tool", {"habit_id": habit_id, "day": DAY.day, "month": DAY.month, "year": DAY.year})
+    delete = ("delete_habit_tool", {"habit_id": 999999})
+    completed, deleted = _run(user_id, [complete, delete])
+    assert "disk full" in completed and "disk full" in deleted
+    # The completion was rolled back with the failed habit
+    assert client.get("/api/completions/", headers=auth_headers).json() == []
+
+def test_batched_completions_count_once(client, auth_headers):
+    user_id, habit_id = _setup(client, auth_headers)
+    call = ("complete_habit_tool", {"habit_id": habit_id, "day": DAY.day, "month": DAY.month, "year": DAY.year})
+    missing = ("complete_habit_tool", {"habit_id": 999999, "day": DAY.day, "month": DAY.month, "year": DAY.year})
+    results = _run(user_id, [call, call, missing])
+    assert results[2] == "Habit 999999 not found"
+    _run(user_id, [call])
+    assert client.get("/api/analytics/summary", headers=auth_headers).json()["total_completions"] == 1
@@ -0,0 +1,36 @@
+from services.schedule import WEEKDAYS
+
+def test_other_users_habits_are_not_found(client, auth_headers, other_auth_headers):
+    habit_id = client.post("/api/habits/", json={"name": "Mine", "repeat_frequency": ",".join(WEEKDAYS), "tags": "private"},
+                           headers=auth_headers).json()["id"]
+    completion = {"habit_id": habit_id, "completion_date": "2024-03-04"}
+    client.post("/api/completions/", json=completion, headers=auth_headers).raise_for_status()
+
+    other = other_auth_headers
+    assert client.get(f"/api/habits/{habit_id}", headers=other).status_code == 404
+    assert client.put(f"/api/habits/{habit_id}", json={"name": "Taken"}, headers=other).status_code == 404
+    assert client.delete(f"/api/habits/{habit_id}", headers=other).status_code == 404
+    assert client.post("/api/completions/", json=completion, headers=other).status_code == 404
+    assert client.delete("/api/completions/", params=completion, headers=other).status_code == 404
+    assert client.get(f"/api/completions/habit/{habit_id}", headers=other).status_code == 404
+    result = client.post("/api/completions/bulk", json=[completion], headers=other).json()
+    assert (result["inserted"], result["errors"][0]["error"]) == (0, "Habit not found")
+
+    # Nothing of the first user shows up in the second user's listings and analytics
+    assert client.get("/api/habits/", headers=other).json() == []
+    assert client.get("/api/habits/tags", headers=other).json() == []
+    assert client.get("/api/habits/date/2024-03-04", headers=other).json() == []
+    assert client.get("/api/completions/", headers=other).json() == []
+    assert client.get("/api/completions/export", headers=other).text == ""
+    assert client.get("/api/analytics/streaks", headers=other).json() == []
+    assert client.get("/api/analytics/summary", headers=other).json()["total_completions"] == 0
+    assert client.get(f"/api/analytics/completion-rate?habit_id={habit_id}", headers=other).json() == []
+
+    # And the first user's data is untouched
+    assert client.get(f"/api/habits/{habit_id}", headers=auth_headers).json()["name"] == "Mine"
+    assert len(client.get("/api/completions/", headers=auth_headers).json()) == 1
+
+def test_requests_need_a_token(client):
+    for path in ("/api/habits/", "/api/completions/", "/api/analytics/summary"):
+        assert client.get(path).status_code == 403
+    assert client.get("/api/habits/", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
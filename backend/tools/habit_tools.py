@@ -1,9 +1,15 @@
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import BaseModel, Field
 from datetime import date
 from typing import Set, List, Optional
 from enum import Enum, auto
-import sqlite3
+from sqlalchemy import and_
+from database import SessionLocal
+from models.habit import Habit, Completion
+from services import habit_stats, tags as habit_tags
+from services.analytics_cache import analytics_cache
+from services.schedule import weekday_bit, weekday_mask
 
 class DayOfWeek(Enum):
     MONDAY = auto()
@@ -14,10 +20,15 @@ class DayOfWeek(Enum):
     SATURDAY = auto()
     SUNDAY = auto()
 
-DB_NAME = "habits.db"
+def get_user_id(config: RunnableConfig) -> int:
+    """Id of the user the agent acts for, passed as configurable["user_id"] when invoking the graph"""
+    user_id = (config or {}).get("configurable", {}).get("user_id")
+    if user_id is None:
+        raise ValueError("Habit tools need configurable['user_id'] in the run config")
+    return user_id
 
-def get_connection():
-    return sqlite3.connect(DB_NAME)
+def get_user_habit(db, habit_id: int, user_id: int) -> Optional[Habit]:
+    return db.query(Habit).filter(Habit.id == habit_id, Habit.user_id == user_id).first()
 
 class CompleteHabitParams(BaseModel):
     habit_id: int = Field(description="Id (number) of the habit e.g. 2")
@@ -25,21 +36,45 @@ class CompleteHabitParams(BaseModel):
     month: int = Field(description="Month of the year (1-12) e.g. 3")
     year: int = Field(description="Year for which to complete the habit e.g. 2024")
 
+def complete_habits(db, user_id: int, calls: List[CompleteHabitParams]) -> List[str]:
+    """Complete habits on dates in the caller's transaction, with one habit lookup and
+    one insert for all calls. Returns a result per call.
+    """
+    results = []
+    wanted = {}
+    for i, call in enumerate(calls):
+        try:
+            completion_date = date(call.year, call.month, call.day)
+        except ValueError:
+            results.append(f"Invalid date {call.year}-{call.month}-{call.day}")
+            continue
+        results.append(f"Habit {call.habit_id} completed for {completion_date}")
+        wanted[i] = (call.habit_id, completion_date.toordinal())
+    if not wanted:
+        return results
+
+    masks = dict(db.query(Habit.id, Habit.schedule_mask).filter(
+        Habit.user_id == user_id,
+        Habit.id.in_({habit_id for habit_id, _ in wanted.values()})
+    ))
+    for i, (habit_id, _) in list(wanted.items()):
+        if habit_id not in masks:
+            results[i] = f"Habit {habit_id} not found"
+            del wanted[i]
+
+    # Rows that exist already are skipped, so only new ones are counted in the stats
+    habit_stats.add_completions(db, user_id, set(wanted.values()), masks)
+    return results
+
 @tool(args_schema=CompleteHabitParams)
-def complete_habit_tool(habit_id: int, day: int, month: int, year: int):
+def complete_habit_tool(habit_id: int, day: int, month: int, year: int, config: RunnableConfig):
     """Completes a habit for a specific date"""
-    completion_date = date(year, month, day)
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO completions (habit_id, completion_date)
-            VALUES (?, ?)
-        """,
-            (habit_id, completion_date.isoformat()),
-        )
-        conn.commit()
-    return f"Habit {habit_id} completed for {completion_date}"
+    user_id = get_user_id(config)
+    with SessionLocal() as db:
+        result, = complete_habits(db, user_id, [CompleteHabitParams(habit_id=habit_id, day=day, month=month, year=year)])
+        db.commit()
+    analytics_cache.invalidate_user(user_id)
+    return result
 
 class HabitsForDateParams(BaseModel):
     day: int = Field(description="Day of the month (1-31) e.g. 18")
@@ -47,30 +82,29 @@ class HabitsForDateParams(BaseModel):
     year: int = Field(description="Year for which to get habits e.g. 2024")
 
 @tool(args_schema=HabitsForDateParams)
-def habits_for_date_tool(day: int, month: int, year: int):
+def habits_for_date_tool(day: int, month: int, year: int, config: RunnableConfig):
     """Returns a list of habits for a given date"""
+    user_id = get_user_id(config)
     target_date = date(year, month, day)
-    weekday = DayOfWeek(target_date.weekday() + 1).name
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT h.id, h.name, h.tags, c.completion_date IS NOT NULL as completed
-            FROM habits h
-            LEFT JOIN completions c ON h.id = c.habit_id AND c.completion_date = ?
-            WHERE instr(h.repeat_frequency, ?) > 0
-        """,
-            (target_date.isoformat(), weekday),
-        )
-        results = cursor.fetchall()
+    with SessionLocal() as db:
+        results = db.query(
+            Habit.id, Habit.name, Completion.day_number.isnot(None)
+        ).outerjoin(Completion, and_(
+            Completion.habit_id == Habit.id,
+            Completion.day_number == target_date.toordinal()
+        )).filter(
+            Habit.user_id == user_id,
+            Habit.schedule_mask.op("&")(weekday_bit(target_date)) != 0
+        ).all()
+        tags = habit_tags.tags_by_habit(db, [habit_id for habit_id, _, _ in results])
         
     habits = []
-    for habit_id, name, tags, completed in results:
+    for habit_id, name, completed in results:
         habits.append({
             "id": habit_id,
             "name": name,
-            "tags": tags.split(",") if tags else [],
+            "tags": tags[habit_id],
             "completed": bool(completed)
         })
     
@@ -85,37 +119,66 @@ class AddHabitParams(BaseModel):
         description="Optional list of tags for this habit"
     )
 
+def add_habit(db, user_id: int, params: AddHabitParams) -> int:
+    """Add a habit in the caller's transaction and return its id"""
+    habit = Habit(
+        user_id=user_id,
+        name=params.name,
+        schedule_mask=weekday_mask(",".join(day.name for day in params.repeat_frequency)),
+        tags=",".join(params.tags or [])
+    )
+    db.add(habit)
+    habit_stats.record_habit(db, user_id)
+    db.flush()
+    habit_tags.set_habit_tags(db, user_id, habit.id, params.tags)
+    return habit.id
+
 @tool(args_schema=AddHabitParams)
 def add_habit_tool(
-    name: str, repeat_frequency: Set[DayOfWeek], tags: List[str] = []
+    name: str, repeat_frequency: Set[DayOfWeek], config: RunnableConfig, tags: List[str] = []
 ) -> int:
     """Adds a new habit with specific repeat frequency. Returns the ID of the habit."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO habits (name, repeat_frequency, tags)
-            VALUES (?, ?, ?)
-        """,
-            (name, ",".join(day.name for day in repeat_frequency), ",".join(tags)),
-        )
-        conn.commit()
-        return cursor.lastrowid
+    user_id = get_user_id(config)
+    with SessionLocal() as db:
+        habit_id = add_habit(db, user_id, AddHabitParams(name=name, repeat_frequency=repeat_frequency, tags=tags))
+        db.commit()
+    analytics_cache.invalidate_user(user_id)
+    return habit_id
 
 class DeleteHabitParams(BaseModel):
     habit_id: int = Field(description="Id of the habit to delete")
 
+def delete_habit(db, user_id: int, habit_id: int) -> str:
+    """Delete a habit with its completions in the caller's transaction"""
+    habit = get_user_habit(db, habit_id, user_id)
+    if habit is None:
+        return f"Habit {habit_id} not found"
+    # Delete completions and their stats first
+    habit_stats.remove_habit(db, user_id, habit_id)
+    habit_tags.remove_habit_tags(db, habit_id)
+    # Delete habit through the session so its delete events fire
+    db.delete(habit)
+    db.flush()
+    return f"Habit {habit_id} deleted successfully"
+
 @tool(args_schema=DeleteHabitParams)
-def delete_habit_tool(habit_id: int):
+def delete_habit_tool(habit_id: int, config: RunnableConfig):
     """Deletes a habit by its ID"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        # Delete completions first
-        cursor.execute("DELETE FROM completions WHERE habit_id = ?", (habit_id,))
-        # Delete habit
-        cursor.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
-        conn.commit()
-    return f"Habit {habit_id} deleted successfully"
+    user_id = get_user_id(config)
+    with SessionLocal() as db:
+        result = delete_habit(db, user_id, habit_id)
+        db.commit()
+    analytics_cache.invalidate_user(user_id)
+    return result
 
 # Export all tools
-tools = [complete_habit_tool, habits_for_date_tool, add_habit_tool, delete_habit_tool]
\ No newline at end of file
+tools = [complete_habit_tool, habits_for_date_tool, add_habit_tool, delete_habit_tool]
+
+# Session-level implementations of the tools that write, by tool name. Each takes the
+# parsed arguments of all calls to that tool in one agent step and returns a result
+# per call, leaving the commit to the caller (see tools/tool_node.py).
+write_batches = {
+    complete_habit_tool.name: complete_habits,
+    add_habit_tool.name: lambda db, user_id, calls: [str(add_habit(db, user_id, call)) for call in calls],
+    delete_habit_tool.name: lambda db, user_id, calls: [delete_habit(db, user_id, call.habit_id) for call in calls],
+}
\ No newline at end of file
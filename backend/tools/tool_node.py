@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_config_list, get_executor_for_config, run_in_executor
+from langgraph.prebuilt import ToolNode
+from langgraph.prebuilt.tool_node import TOOL_CALL_ERROR_TEMPLATE
+from database import SessionLocal
+from services.analytics_cache import analytics_cache
+from services import metrics
+from tools.habit_tools import get_user_id, write_batches
+
+class HabitToolNode(ToolNode):
+    """ToolNode for agent steps with several tool calls.
+
+    The stock node runs every call on its own thread, so five completions meant five
+    sessions and five commits competing for the database. Here the write calls of a
+    step run together, in one transaction through write_batches (completions become a
+    single insert), and the read calls run concurrently as before: those the model
+    placed before the first write run first and see the state before the step, the
+    others run after the writes and see all of them. Results are returned in the order
+    the model made the calls. The writes commit or fail together, so one failing write
+    rolls back the other write calls of the step, which all report the error.
+    """
+
+    def _split(self, tool_calls: list) -> Tuple[List[int], List[int], List[int]]:
+        """Indexes of the reads before the first write, of the writes and of the other reads"""
+        writes = [i for i, call in enumerate(tool_calls) if call["name"] in write_batches]
+        first_write = writes[0] if writes else len(tool_calls)
+        reads = [i for i, call in enumerate(tool_calls) if call["name"] not in write_batches]
+        return [i for i in reads if i < first_write], writes, [i for i in reads if i > first_write]
+
+    def _func(self, input, config: RunnableConfig):
+        tool_calls, output_type = self._parse_input(input)
+        reads_before, writes, reads_after = self._split(tool_calls)
+        outputs = {}
+        with get_executor_for_config(config) as executor:
+            outputs.update(self._run_reads(executor, tool_calls, reads_before, config))
+            outputs.update(zip(writes, self._run_writes([tool_calls[i] for i in writes], config)))
+            outputs.update(self._run_reads(executor, tool_calls, reads_after, config))
+        messages = [outputs[i] for i in range(len(tool_calls))]
+        return messages if output_type == "list" else {"messages": messages}
+
+    def _run_reads(self, executor, tool_calls: list, reads: List[int], config: RunnableConfig) -> Dict[int, ToolMessage]:
+        if not reads:
+            return {}
+        config_list = get_config_list(config, len(reads))
+        return dict(zip(reads, executor.map(self._run_one, [tool_calls[i] for i in reads], config_list)))
+
+    async def _afunc(self, input, config: RunnableConfig):
+        tool_calls, output_type = self._parse_input(input)
+        reads_before, writes, reads_after = self._split(tool_calls)
+        outputs = {}
+        results = await asyncio.gather(*(self._arun_one(tool_calls[i], config) for i in reads_before))
+        outputs.update(zip(reads_before, results))
+        if writes:
+            results = await run_in_executor(config, self._run_writes, [tool_calls[i] for i in writes], config)
+            outputs.update(zip(writes, results))
+        results = await asyncio.gather(*(self._arun_one(tool_calls[i], config) for i in reads_after))
+        outputs.update(zip(reads_after, results))
+        messages = [outputs[i] for i in range(len(tool_calls))]
+        return messages if output_type == "list" else {"messages": messages}
+
+    def _run_writes(self, calls: list, config: RunnableConfig) -> List[ToolMessage]:
+        """Run write calls grouped by tool, in order of first appearance, and commit once"""
+        if not calls:
+            return []
+        messages: List[ToolMessage] = [None] * len(calls)
+        batches: Dict[str, List[Tuple[int, object]]] = {}
+        for i, call in enumerate(calls):
+            try:
+                params = self.tools_by_name[call["name"]].args_schema.parse_obj(call["args"])
+            except Exception as e:
+                if not self.handle_tool_errors:
+                    raise
+                messages[i] = self._error(call, e)
+                continue
+            batches.setdefault(call["name"], []).append((i, params))
+
+        user_id = get_user_id(config)
+        try:
+            with SessionLocal() as db:
+                for name, entries in batches.items():
+                    started = time.perf_counter()
+                    results = write_batches[name](db, user_id, [params for _, params in entries])
+                    metrics.agent_tools.observe(time.perf_counter() - started, name)
+                    metrics.agent_tool_calls.inc(name, amount=len(entries))
+                    for (i, _), content in zip(entries, results):
+                        messages[i] = ToolMessage(content, name=name, tool_call_id=calls[i]["id"])
+                db.commit()
+        except Exception as e:
+            # Nothing was committed, so every call of the batch failed
+            if not self.handle_tool_errors:
+                raise
+            for entries in batches.values():
+                for i, _ in entries:
+                    messages[i] = self._error(calls[i], e)
+        analytics_cache.invalidate_user(user_id)
+        return messages
+
+    def _error(self, call: dict, error: Exception) -> ToolMessage:
+        return ToolMessage(TOOL_CALL_ERROR_TEMPLATE.format(error=repr(error)), name=call["name"], tool_call_id=call["id"])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Latency of agent turns whose model response carries N tool calls.
+
+A stub LLM answers every user message with N complete_habit_tool calls for new dates
+(optionally mixed with habits_for_date_tool reads) and then with a plain reply, so
+only the graph, the tools and the database are measured. Each turn is run through
+the graph once with LangGraph's stock ToolNode (one session and commit per call) and
+once with HabitToolNode (writes batched into one transaction, reads concurrent).
+
+    python benchmarks/agent_tools.py --calls 1,5,20 --turns 50
+"""
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+class StubLLM:
+    """Answers a user message with tool calls and a tool result with a short reply"""
+
+    def __init__(self, habit_ids: list, calls: int, reads: int):
+        self.habit_ids = habit_ids
+        self.calls = calls
+        self.reads = reads
+        self.days = itertools.count()
+        self.call_ids = itertools.count()
+
+    def invoke(self, messages, config=None):
+        from langchain_core.messages import AIMessage
+        if messages[-1].type == "tool":
+            return AIMessage("Done.")
+        tool_calls = []
+        for i in range(self.calls):
+            day = date(2020, 1, 1) + timedelta(days=next(self.days))
+            tool_calls.append({
+                "name": "complete_habit_tool", "id": f"call_{next(self.call_ids)}",
+                "args": {"habit_id": self.habit_ids[i % len(self.habit_ids)], "day": day.day, "month": day.month, "year": day.year},
+            })
+        for _ in range(self.reads):
+            tool_calls.append({
+                "name": "habits_for_date_tool", "id": f"call_{next(self.call_ids)}",
+                "args": {"day": 1, "month": 1, "year": 2020},
+            })
+        return AIMessage("", tool_calls=tool_calls)
+
+def seed(user_id: int, habits: int) -> list:
+    from database import SessionLocal
+    from tools.habit_tools import AddHabitParams, add_habit
+    with SessionLocal() as db:
+        ids = [add_habit(db, user_id, AddHabitParams(name=f"habit {i}", repeat_frequency=[1, 3, 5], tags=[])) for i in range(habits)]
+        db.commit()
+    return ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", default="1,5,20", help="Comma separated tool calls per turn")
+    parser.add_argument("--reads", type=int, default=1, help="habits_for_date_tool calls added to each turn")
+    parser.add_argument("--turns", type=int, default=50, help="Timed turns per configuration")
+    parser.add_argument("--habits", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/habits.db"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.prebuilt import ToolNode
+    import main as app_module  # Runs the migrations
+    import langgraph_setup
+    from tools.habit_tools import tools
+    from tools.tool_node import HabitToolNode
+
+    habit_ids = seed(1, args.habits)
+    nodes = {"ToolNode": ToolNode(tools), "HabitToolNode": HabitToolNode(tools)}
+
+    print(f"{'calls':>6} {'node':<14} {'p50 ms':>8} {'p95 ms':>8} {'turns/s':>8}")
+    for calls in (int(value) for value in args.calls.split(",")):
+        for name, node in nodes.items():
+            langgraph_setup.llm = StubLLM(habit_ids, calls, args.reads)
+            agent = langgraph_setup.build_graph(langgraph_setup.call_model, node).compile(checkpointer=MemorySaver())
+            samples = []
+            for turn in range(args.turns + 5):
+                config = langgraph_setup.thread_config(1, f"{name}-{calls}-{turn}")
+                started = time.perf_counter()
+                agent.invoke({"messages": [HumanMessage("Complete my habits")]}, config=config)
+                if turn >= 5:  # The first turns warm up caches and connections
+                    samples.append(time.perf_counter() - started)
+            quantiles = statistics.quantiles(samples, n=100)
+            print(f"{calls:>6} {name:<14} {quantiles[49] * 1000:>8.2f} {quantiles[94] * 1000:>8.2f} {len(samples) / sum(samples):>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Per-request authentication overhead with and without the token cache.
+
+Runs in-process against a fresh SQLite database in a temporary directory. The
+get_current_user rows time the dependency alone (a miss is verify_token's signature
+check and user lookup); the /api/auth/me rows time a full request through the ASGI
+app on the same event loop, next to the unauthenticated "/" route as a floor.
+
+    python benchmarks/auth_cache.py --iterations 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+def timed(fn, iterations: int, before=None) -> dict:
+    samples = []
+    for _ in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    quantiles = statistics.quantiles(samples, n=100)
+    return {"mean_us": statistics.fmean(samples) * 1e6, "p50_us": quantiles[49] * 1e6, "p99_us": quantiles[98] * 1e6}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/habits.db"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import asyncio
+    import httpx
+    from fastapi.security import HTTPAuthorizationCredentials
+    import main as app_module
+    from routers.auth import get_current_user
+    from services.token_cache import token_cache
+
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(app=app_module.app, base_url="http://bench")
+
+    def request(method: str, path: str, **kwargs) -> httpx.Response:
+        return loop.run_until_complete(client.request(method, path, **kwargs))
+
+    request("POST", "/api/auth/register", json={"email": "bench@example.com", "password": "secret"})
+    token = request("POST", "/api/auth/login", json={"email": "bench@example.com", "password": "secret"}).json()["access_token"]
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def dependency():
+        loop.run_until_complete(get_current_user(credentials))
+
+    results = {
+        "get_current_user, uncached": timed(dependency, args.iterations, before=token_cache.clear),
+        "get_current_user, cached": timed(dependency, args.iterations),
+        "GET / (no auth)": timed(lambda: request("GET", "/"), args.iterations),
+        "GET /api/auth/me, uncached": timed(lambda: request("GET", "/api/auth/me", headers=headers), args.iterations, before=token_cache.clear),
+        "GET /api/auth/me, cached": timed(lambda: request("GET", "/api/auth/me", headers=headers), args.iterations),
+    }
+
+    print(f"{'':<28} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+    for name, result in results.items():
+        print(f"{name:<28} {result['mean_us']:>9.1f} {result['p50_us']:>9.1f} {result['p99_us']:>9.1f}")
+    print(f"cache hits {token_cache.hits}, misses {token_cache.misses}")
+
+if __name__ == "__main__":
+    main()
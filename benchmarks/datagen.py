@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic data for benchmarks: users, habits and years of completions.
+
+Habits get a realistic mix of schedules (daily, weekdays, three times a week,
+weekends, a random pick of days) and of 0-3 tags from a small vocabulary. Each
+habit has its own adherence rate, and completions come in runs: a scheduled day is
+more likely done when the previous one was, with the odd unscheduled extra day. The
+same seed always produces the same rows, so runs on different commits compare.
+
+    python benchmarks/datagen.py --users 100 --habits 8 --years 2 --database habits.db
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# (weight, weekday mask) with bit 0 = Monday
+SCHEDULES = [
+    (30, 0b1111111),  # Daily
+    (20, 0b0011111),  # Weekdays
+    (15, 0b0010101),  # Monday, Wednesday, Friday
+    (10, 0b0001010),  # Tuesday, Thursday
+    (10, 0b1100000),  # Weekends
+    (15, None),       # 1-4 random days
+]
+HABIT_NAMES = ["Read", "Run", "Meditate", "Stretch", "Journal", "Practice guitar", "Drink water",
+               "Walk", "Study Spanish", "Floss", "Cook dinner", "Call family", "Plan the day", "Yoga"]
+TAGS = ["health", "fitness", "mind", "learning", "social", "home", "work", "morning", "evening"]
+
+# Rows per executemany
+CHUNK_SIZE = 10000
+
+def _schedule(rng: random.Random) -> int:
+    mask = rng.choices([mask for _, mask in SCHEDULES], weights=[weight for weight, _ in SCHEDULES])[0]
+    if mask is None:
+        mask = sum(1 << day for day in rng.sample(range(7), rng.randint(1, 4)))
+    return mask
+
+def _completion_days(rng: random.Random, mask: int, first: int, last: int) -> list:
+    adherence = rng.uniform(0.35, 0.95)
+    days = []
+    done = False
+    for day in range(first, last + 1):
+        if mask >> ((day - 1) % 7) & 1:
+            # Streaky: a kept habit tends to stay kept, a dropped one to stay dropped
+            done = rng.random() < (min(adherence + 0.15, 0.99) if done else adherence - 0.15)
+            if done:
+                days.append(day)
+        elif rng.random() < 0.03:
+            days.append(day)
+    return days
+
+def generate(users: int, habits_per_user: int, years: float, seed: int = 42, today: Optional[date] = None) -> dict:
+    """Insert the users, habits and completions into the configured database and
+    rebuild the derived counters. Users are user{N}@bench with ids 1..users.
+    """
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models.habit import Habit, Completion, HabitTag, Tag
+    from models.user import User
+    from services import habit_stats
+
+    rng = random.Random(seed)
+    last = (today or date.today()).toordinal()
+    first = last - int(years * 365)
+    counts = {"users": users, "habits": 0, "completions": 0}
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"id": user_id, "email": f"user{user_id}@bench", "hashed_password": "-", "is_active": True}
+            for user_id in range(1, users + 1)
+        ])
+        habits = []
+        tag_ids = {}  # (user_id, name) -> tags.id
+        habit_tags = []
+        for user_id in range(1, users + 1):
+            for n in range(max(1, round(rng.gauss(habits_per_user, habits_per_user / 4)))):
+                tags = rng.sample(TAGS, rng.choices([0, 1, 2, 3], weights=[15, 45, 30, 10])[0])
+                habits.append({
+                    "id": len(habits) + 1, "user_id": user_id, "name": f"{rng.choice(HABIT_NAMES)} {n + 1}",
+                    "schedule_mask": _schedule(rng), "tags": ",".join(tags),
+                })
+                for name in tags:
+                    tag_id = tag_ids.setdefault((user_id, name), len(tag_ids) + 1)
+                    habit_tags.append({"habit_id": len(habits), "tag_id": tag_id})
+        db.execute(insert(Habit), habits)
+        if tag_ids:
+            db.execute(insert(Tag), [{"id": tag_id, "user_id": user_id, "name": name} for (user_id, name), tag_id in tag_ids.items()])
+            db.execute(insert(HabitTag), habit_tags)
+        counts["habits"] = len(habits)
+
+        rows = []
+        for habit in habits:
+            # Habits start at different points of the history
+            start = rng.randint(first, first + (last - first) // 2)
+            rows.extend(
+                {"habit_id": habit["id"], "user_id": habit["user_id"], "day_number": day}
+                for day in _completion_days(rng, habit["schedule_mask"], start, last)
+            )
+            if len(rows) >= CHUNK_SIZE:
+                db.execute(insert(Completion), rows)
+                counts["completions"] += len(rows)
+                rows = []
+        if rows:
+            db.execute(insert(Completion), rows)
+            counts["completions"] += len(rows)
+        db.commit()
+        habit_stats.rebuild(db)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--habits", type=int, default=8, help="Mean habits per user")
+    parser.add_argument("--years", type=float, default=2, help="Years of completion history")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default="habits.db", help="SQLite file to create (must not exist)")
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f"{args.database} already exists")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(args.database).resolve()}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    import migrations
+    from database import engine
+    migrations.migrate(engine)
+    counts = generate(args.users, args.habits, args.years, args.seed)
+    print(f"{counts['users']} users, {counts['habits']} habits, {counts['completions']} completions")
+
+if __name__ == "__main__":
+    main()
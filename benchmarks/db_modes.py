@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Load benchmark comparing the sync and async database modes.
+
+For each DB_MODE a uvicorn worker is started against a fresh, seeded database
+in a temporary directory, then a fixed number of GET requests spread over the
+habit, completion and analytics endpoints is fired at it with N concurrent clients.
+
+    python benchmarks/db_modes.py --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+ENDPOINTS = [
+    "/api/habits/",
+    "/api/habits/date/{today}",
+    "/api/completions/?limit=100",
+    "/api/analytics/streaks",
+    "/api/analytics/completion-rate?days=90",
+    "/api/analytics/summary",
+]
+
+def start_server(mode: str, port: int, workdir: str) -> subprocess.Popen:
+    env = dict(os.environ, DB_MODE=mode)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(BACKEND_DIR),
+         "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+async def seed(client: httpx.AsyncClient, habits: int, days: int):
+    credentials = {"email": "bench@example.com", "password": "bench"}
+    await client.post("/api/auth/register", json=credentials)
+    token = (await client.post("/api/auth/login", json=credentials)).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+
+    ids = []
+    for i in range(habits):
+        response = await client.post("/api/habits/", json={
+            "name": f"habit {i}",
+            "repeat_frequency": "MONDAY,WEDNESDAY,FRIDAY" if i % 2 else "MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY,SATURDAY,SUNDAY",
+        })
+        ids.append(response.json()["id"])
+    start = date.today() - timedelta(days=days)
+    rows = [
+        {"habit_id": habit_id, "completion_date": (start + timedelta(days=d)).isoformat()}
+        for habit_id in ids for d in range(days) if (habit_id + d) % 3
+    ]
+    await client.post("/api/completions/bulk", json=rows, timeout=300)
+
+async def run_load(client: httpx.AsyncClient, requests: int, concurrency: int) -> dict:
+    paths = [endpoint.format(today=date.today().isoformat()) for endpoint in ENDPOINTS]
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.get(paths[i % len(paths)])
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests_per_second": requests / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "errors": errors,
+    }
+
+async def bench_mode(mode: str, port: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(mode, port, workdir)
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                await wait_until_ready(client)
+                await seed(client, args.habits, args.days)
+                await run_load(client, min(200, args.requests), args.concurrency)  # Warm up
+                return await run_load(client, args.requests, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--habits", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for offset, mode in enumerate(("sync", "async")):
+        result = asyncio.run(bench_mode(mode, args.port + offset, args))
+        print(f"{mode:<6} {result['requests_per_second']:>9.1f} {result['p50_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['errors']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Scenario benchmarks for the API, run in-process against seeded synthetic data.
+
+A fresh database in a temporary directory is filled by datagen.py (same seed, same
+data), then each scenario is driven through the ASGI app by --concurrency clients:
+
+    daily_view     GET /api/habits/date/{today}
+    dashboard      habits list, summary, streaks and 30-day completion rate at once
+    write_burst    POST /api/completions/ for new days
+    bulk_backfill  POST /api/completions/bulk with BACKFILL_ROWS older completions
+    agent_turn     POST /api/chat with the scripted model (LLM_PROVIDER=scripted)
+
+Latency percentiles and throughput per scenario are printed and can be saved as
+JSON. Given a previous result as --baseline, the changes are listed and the exit
+status is 1 when a scenario got slower than --tolerance allows.
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --output after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parent / "backend"
+
+# Operations per scenario at --scale 1
+SCENARIO_OPS = {
+    "daily_view": 1000,
+    "dashboard": 300,
+    "write_burst": 1000,
+    "bulk_backfill": 40,
+    "agent_turn": 100,
+}
+BACKFILL_ROWS = 500
+
+class Context:
+    """Users, tokens and habit ids the scenarios pick from"""
+
+    def __init__(self, habits_by_user: dict, seed: int):
+        from routers.auth import create_access_token
+        self.rng = random.Random(seed)
+        self.habits_by_user = habits_by_user
+        self.headers = {
+            user_id: {"Authorization": f"Bearer {create_access_token({'sub': f'user{user_id}@bench'}, timedelta(hours=2))}"}
+            for user_id in habits_by_user
+        }
+        self.users = sorted(habits_by_user)
+        self.today = date.today()
+        self.first_day = None  # Oldest seeded completion, set by main()
+
+    def user(self) -> int:
+        return self.rng.choice(self.users)
+
+async def daily_view(client, ctx: Context, i: int):
+    return [await client.get(f"/api/habits/date/{ctx.today.isoformat()}", headers=ctx.headers[ctx.user()])]
+
+async def dashboard(client, ctx: Context, i: int):
+    headers = ctx.headers[ctx.user()]
+    paths = ["/api/habits/", "/api/analytics/summary", "/api/analytics/streaks", "/api/analytics/completion-rate?days=30"]
+    return await asyncio.gather(*(client.get(path, headers=headers) for path in paths))
+
+async def write_burst(client, ctx: Context, i: int):
+    user_id = ctx.user()
+    # A day of its own per operation, so every write inserts
+    day = ctx.today + timedelta(days=1 + i)
+    return [await client.post("/api/completions/", headers=ctx.headers[user_id], json={
+        "habit_id": ctx.rng.choice(ctx.habits_by_user[user_id]), "completion_date": day.isoformat(),
+    })]
+
+async def bulk_backfill(client, ctx: Context, i: int):
+    user_id = ctx.user()
+    habit_ids = ctx.habits_by_user[user_id]
+    days = -(-BACKFILL_ROWS // len(habit_ids))
+    # Days before the seeded history, a separate range per operation
+    end = ctx.first_day - 1 - i * days
+    rows = [
+        {"habit_id": habit_id, "completion_date": date.fromordinal(end - d).isoformat()}
+        for d in range(days) for habit_id in habit_ids
+    ][:BACKFILL_ROWS]
+    return [await client.post("/api/completions/bulk", headers=ctx.headers[user_id], json=rows)]
+
+async def agent_turn(client, ctx: Context, i: int):
+    user_id = ctx.user()
+    if i % 2:
+        day = ctx.today + timedelta(days=1 + i)
+        message = f"mark habit {ctx.rng.choice(ctx.habits_by_user[user_id])} done on {day.isoformat()}"
+    else:
+        message = "what habits do I have today?"
+    response = await client.post("/api/chat", headers=ctx.headers[user_id],
+                                 json={"message": message, "thread_id": f"bench-{i % 10}"})
+    if "event: done" not in response.text:
+        raise RuntimeError(f"agent turn failed: {response.text[-300:]}")
+    return [response]
+
+SCENARIOS = {
+    "daily_view": daily_view,
+    "dashboard": dashboard,
+    "write_burst": write_burst,
+    "bulk_backfill": bulk_backfill,
+    "agent_turn": agent_turn,
+}
+
+async def run_scenario(client, ctx: Context, scenario, ops: int, concurrency: int, first_op: int = 0) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(first_op, first_op + ops))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                responses = await scenario(client, ctx, i)
+                failed = any(response.status_code >= 400 for response in responses)
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "ops": ops,
+        "errors": errors,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "ops_per_second": ops / elapsed,
+    }
+
+def load_ids() -> tuple:
+    from database import SessionLocal
+    from models.habit import Completion, Habit
+    from sqlalchemy import func
+    with SessionLocal() as db:
+        habits_by_user = {}
+        for habit_id, user_id in db.query(Habit.id, Habit.user_id).order_by(Habit.id):
+            habits_by_user.setdefault(user_id, []).append(habit_id)
+        first_day = db.query(func.min(Completion.day_number)).scalar()
+    return habits_by_user, first_day
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Print the change of every scenario against the baseline; return the regressed ones"""
+    regressions = []
+    print(f"\nvs baseline {baseline['meta'].get('commit', '?')} ({baseline['meta'].get('started_at', '?')})")
+    print(f"{'scenario':<14} {'p50':>9} {'p95':>9} {'p99':>9} {'ops/s':>9}")
+    for name, current in result["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if previous is None:
+            print(f"{name:<14} {'(not in baseline)':>9}")
+            continue
+        changes = {key: (current[key] - previous[key]) / previous[key] if previous[key] else 0.0
+                   for key in ("p50_ms", "p95_ms", "p99_ms", "ops_per_second")}
+        print(f"{name:<14} " + " ".join(f"{changes[key]:>+9.1%}" for key in ("p50_ms", "p95_ms", "p99_ms", "ops_per_second")))
+        if changes["p95_ms"] > tolerance or changes["ops_per_second"] < -tolerance:
+            regressions.append(name)
+    if regressions:
+        print(f"Slower than the baseline by more than {tolerance:.0%}: {', '.join(regressions)}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated scenarios to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed operations before each scenario")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--habits", type=int, default=8, help="Mean habits per user")
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed p95 and throughput change")
+    args = parser.parse_args()
+    names = args.scenarios.split(",")
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    output = Path(args.output).resolve() if args.output else None
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/habits.db"
+    os.environ["LLM_PROVIDER"] = "scripted"
+    os.environ["LLM_CACHE_SIZE"] = "0"
+    sys.path.insert(0, str(BACKEND_DIR))
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+
+    import httpx
+    import main as app_module  # Runs the migrations
+    import langgraph_setup
+    import datagen
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    seeding = time.perf_counter()
+    counts = datagen.generate(args.users, args.habits, args.years, args.seed)
+    print(f"Seeded {counts['users']} users, {counts['habits']} habits and {counts['completions']} completions "
+          f"in {time.perf_counter() - seeding:.1f}s")
+    habits_by_user, first_day = load_ids()
+    ctx = Context(habits_by_user, args.seed)
+    ctx.first_day = first_day
+
+    async def run() -> dict:
+        results = {}
+        async with httpx.AsyncClient(app=app_module.app, base_url="http://bench", timeout=300) as client:
+            for name in names:
+                ops = max(2, round(SCENARIO_OPS[name] * args.scale))
+                # Warm-up operations get their own indices, so they never collide with timed writes
+                await run_scenario(client, ctx, SCENARIOS[name], args.warmup, args.concurrency, first_op=ops)
+                results[name] = await run_scenario(client, ctx, SCENARIOS[name], ops, args.concurrency)
+                if name == "bulk_backfill":
+                    results[name]["rows_per_second"] = results[name]["ops_per_second"] * BACKFILL_ROWS
+        await langgraph_setup.close_async_app()
+        return results
+
+    scenarios = asyncio.run(run())
+    print(f"{'scenario':<14} {'ops':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for name, stats in scenarios.items():
+        print(f"{name:<14} {stats['ops']:>6} {stats['errors']:>6} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['ops_per_second']:>9.1f}")
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": started_at,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db_mode": os.getenv("DB_MODE", "sync"),
+            **{key: getattr(args, key) for key in ("users", "habits", "years", "seed", "scale", "concurrency", "warmup")},
+        },
+        "data": counts,
+        "scenarios": scenarios,
+    }
+    if output:
+        output.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Results written to {output}")
+    if baseline and compare(result, baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
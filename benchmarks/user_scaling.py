@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Per-request latency as the number of users grows.
+
+Every user gets the same amount of data, so with user-scoped queries the latency of
+a request should stay flat while the tables grow. The database in a temporary
+directory is grown stage by stage (e.g. 100, 1000, then 10000 users), and at each
+stage the user-facing GET endpoints are timed in-process for a random sample of users.
+
+    python benchmarks/user_scaling.py --stages 100,1000,10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+ENDPOINTS = [
+    "/api/habits/",
+    "/api/habits/date/{today}",
+    "/api/completions/?limit=100",
+    "/api/analytics/streaks",
+    "/api/analytics/completion-rate?days=30",
+    "/api/analytics/summary",
+]
+
+def seed_users(first_id: int, count: int, habits_per_user: int, days: int):
+    """Insert users first_id.. with identical amounts of habits and completions"""
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models.habit import Habit, Completion
+    from models.user import User
+    from services.schedule import ALL_DAYS_MASK
+
+    today = date.today().toordinal()
+    with SessionLocal() as db:
+        user_ids = range(first_id, first_id + count)
+        db.execute(insert(User), [
+            {"id": user_id, "email": f"user{user_id}@bench", "hashed_password": "-", "is_active": True}
+            for user_id in user_ids
+        ])
+        habits = [
+            {"id": (user_id - 1) * habits_per_user + n + 1, "user_id": user_id, "name": f"habit {n}",
+             "schedule_mask": ALL_DAYS_MASK if n % 2 else 0b0010101, "tags": ""}
+            for user_id in user_ids for n in range(habits_per_user)
+        ]
+        db.execute(insert(Habit), habits)
+        db.execute(insert(Completion), [
+            {"habit_id": habit["id"], "user_id": habit["user_id"], "day_number": today - d}
+            for habit in habits for d in range(days) if (habit["id"] + d) % 3
+        ])
+        db.commit()
+
+def rebuild_stats():
+    from database import SessionLocal
+    from services import habit_stats
+    with SessionLocal() as db:
+        habit_stats.rebuild(db)
+
+async def time_requests(client, tokens: list, requests: int) -> dict:
+    today = date.today().isoformat()
+    samples = {endpoint: [] for endpoint in ENDPOINTS}
+    for i in range(requests):
+        endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+        headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+        started = time.perf_counter()
+        response = await client.get(endpoint.format(today=today), headers=headers)
+        samples[endpoint].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{endpoint}: {response.status_code} {response.text}")
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", default="100,1000,10000", help="Comma separated user counts")
+    parser.add_argument("--habits", type=int, default=5, help="Habits per user")
+    parser.add_argument("--days", type=int, default=30, help="Days of history per habit")
+    parser.add_argument("--sample", type=int, default=50, help="Users whose requests are timed at each stage")
+    parser.add_argument("--requests", type=int, default=1200, help="Requests per stage")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/habits.db"
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import httpx
+    import main as app_module
+    from routers.auth import create_access_token
+
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(app=app_module.app, base_url="http://bench")
+    rng = random.Random(42)
+
+    print(f"{'users':>7} {'endpoint':<40} {'p50 ms':>8} {'p95 ms':>8}")
+    users = 0
+    for stage in (int(value) for value in args.stages.split(",")):
+        seed_users(users + 1, stage - users, args.habits, args.days)
+        rebuild_stats()
+        users = stage
+
+        sample = rng.sample(range(1, users + 1), min(args.sample, users))
+        tokens = [create_access_token({"sub": f"user{user_id}@bench"}, timedelta(hours=1)) for user_id in sample]
+        loop.run_until_complete(time_requests(client, tokens, len(tokens)))  # Warm up caches
+        samples = loop.run_until_complete(time_requests(client, tokens, args.requests))
+        for endpoint, values in samples.items():
+            quantiles = statistics.quantiles(values, n=100)
+            print(f"{users:>7} {endpoint:<40} {quantiles[49] * 1000:>8.2f} {quantiles[94] * 1000:>8.2f}")
+
+if __name__ == "__main__":
+    main()
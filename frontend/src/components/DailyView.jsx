@@ -11,17 +11,10 @@ const DailyView = () => {
   const loadHabitsForDate = async () => {
     setLoading(true);
     try {
+      // Habits for the date already carry their completion status
       const habits = await apiService.getHabitsForDate(selectedDate);
       setHabitsForDate(habits);
-      
-      // Load completions to show current status
-      const allCompletions = await apiService.getCompletions();
-      const completionsForDate = new Set(
-        allCompletions
-          .filter(c => c.completion_date === selectedDate)
-          .map(c => c.habit_id)
-      );
-      setCompletions(completionsForDate);
+      setCompletions(new Set(habits.filter(h => h.completed).map(h => h.id)));
     } catch (error) {
       console.error('Error loading habits for date:', error);
     } finally {
@@ -30,8 +30,7 @@ const HabitForm = ({ habit, onSave, onCancel }) => {
       const habitData = {
         name: name.trim(),
         repeat_frequency: selectedDays.join(','),
-        tags: tags.trim(),
-        user_id: 1 // Default user for now
+        tags: tags.trim()
       };
 
       await onSave(habitData);
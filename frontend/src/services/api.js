@@ -72,6 +72,11 @@ class ApiService {
     return response.data;
   }
 
+  async getHabitsForDateRange(startDate, endDate) {
+    const response = await axios.get(`/habits/date/${startDate}/${endDate}`);
+    return response.data;
+  }
+
   // Completion endpoints
   async completeHabit(habitId, date) {
     const response = await axios.post('/completions/', {
@@ -4,51 +4,14 @@ Startup script for the Habit Tracker backend
 """
 import os
 import sys
-import sqlite3
 from pathlib import Path
 
 def create_database():
-    """Create the database and tables if they don't exist"""
-    db_path = "habits.db"
-    # Create database connection
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create habits table (compatible with existing structure)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS habits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            repeat_frequency TEXT NOT NULL,
-            tags TEXT,
-            user_id INTEGER DEFAULT 1
-        )
-    ''')
-    
-    # Create completions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS completions (
-            habit_id INTEGER,
-            completion_date TEXT,
-            PRIMARY KEY (habit_id, completion_date),
-            FOREIGN KEY (habit_id) REFERENCES habits (id)
-        )
-    ''')
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            hashed_password TEXT NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            full_name TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print("✅ Database created successfully!")
+    """Create the database or bring its schema up to date"""
+    import migrations
+    from database import engine
+    version = migrations.migrate(engine)
+    print(f"✅ Database ready (schema version {version})")
 
 def main():
     print("🚀 Starting Habit Tracker Backend...")
@@ -58,13 +21,13 @@ def main():
         print("❌ Error: backend directory not found. Please run this script from the project root.")
         sys.exit(1)
     
-    # Create database
-    create_database()
-    
     # Add backend directory to Python path
     backend_path = Path("backend").resolve()
     sys.path.insert(0, str(backend_path))
     
+    # Create database
+    create_database()
+    
     # Start the server
     print("🌟 Starting FastAPI server on http://localhost:8000")
     print("📖 API docs available at http://localhost:8000/docs")